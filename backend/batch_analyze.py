@@ -0,0 +1,248 @@
+# backend/batch_analyze.py
+"""Offline batch analysis of a recordings directory or manifest, without the API.
+
+Run from backend/:
+    python -m batch_analyze /recordings --output results.jsonl --workers 2
+    python -m batch_analyze manifest.txt --output results_parquet --format parquet   # needs pyarrow
+
+Files fan out to N spawned worker processes that each load the models once. Results are
+buffered and flushed every --flush-every results / --flush-seconds; each flush appends to
+the output and then records the flushed files in a checkpoint (<output>.checkpoint.db), so
+re-running the same command after a crash skips everything already written. A crash between
+the two steps can repeat at most one flush worth of rows (each row carries its file `key`).
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+import multiprocessing as mp
+
+from utils.db import SQLiteDatabase
+
+AUDIO_EXTENSIONS = ('.wav', '.mp3', '.ogg', '.flac', '.m4a', '.aac')
+CHECKPOINT_SCHEMA = """
+CREATE TABLE IF NOT EXISTS analyzed (
+    key TEXT PRIMARY KEY, -- sha1 of path, size and mtime: edited files are analyzed again
+    path TEXT NOT NULL,
+    status TEXT NOT NULL, -- 'complete' | 'error'
+    finished_at REAL NOT NULL
+);
+"""
+# Flat columns for Parquet output; the full nested result is kept alongside as JSON
+PARQUET_COLUMNS = ("key", "path", "fileName", "status", "error", "audioDuration", "transcription",
+                   "satisfaction", "satisfactionLabel", "textSentiment", "speechEmotion", "totalSeconds", "realTimeFactor")
+
+
+# --- Inputs ---
+def file_key(path):
+    stat = os.stat(path)
+    return hashlib.sha1(f"{os.path.abspath(path)}:{stat.st_size}:{stat.st_mtime_ns}".encode("utf-8")).hexdigest()
+
+
+def iter_input_files(source):
+    """Audio files under a directory (sorted, recursive) or listed in a manifest.
+
+    Manifests are text files with one path per line (# comments allowed) or JSONL with a
+    "path" field; relative paths are resolved against the manifest's directory.
+    """
+    if os.path.isdir(source):
+        for root, dirs, files in os.walk(source):
+            dirs.sort()
+            for name in sorted(files):
+                if name.lower().endswith(AUDIO_EXTENSIONS) and not name.startswith("."):
+                    yield os.path.join(root, name)
+        return
+    base = os.path.dirname(os.path.abspath(source))
+    with open(source) as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"): continue
+            path = json.loads(line)["path"] if line.startswith("{") else line
+            yield path if os.path.isabs(path) else os.path.join(base, path)
+
+
+# --- Workers ---
+def init_worker(threads):
+    # Runs once per worker process, before anything imports torch
+    if threads:
+        os.environ["OMP_NUM_THREADS"] = str(threads)
+        os.environ["MKL_NUM_THREADS"] = str(threads)
+    from models.analysis_pipeline import load_models
+    if not load_models():
+        raise RuntimeError("Model loading failed in batch worker")
+
+
+def analyze_file(path, key):
+    from models.analysis_pipeline import analyze_audio
+    task_id = f"batch-{key[:16]}"
+    try:
+        results = analyze_audio(path, task_id, os.path.basename(path), persist=False)
+    except Exception as e:
+        results = {"taskId": task_id, "fileName": os.path.basename(path), "error": f"{type(e).__name__}: {e}"}
+    return path, key, results
+
+
+# --- Outputs ---
+class JSONLWriter:
+    def __init__(self, path):
+        self.path = path
+
+    def write(self, rows):
+        with open(self.path, "a", encoding="utf-8") as f:
+            for row in rows:
+                f.write(json.dumps(row, separators=(",", ":")) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+
+class ParquetWriter:
+    """One part file per flush in the output directory, so a crash never leaves a truncated file."""
+
+    def __init__(self, path):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise SystemExit("ERROR: Parquet output needs pyarrow (pip install pyarrow), or use --format jsonl.")
+        self.pa, self.pq = pyarrow, pyarrow.parquet
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+
+    def write(self, rows):
+        columns = {name: [row.get(name) for row in rows] for name in PARQUET_COLUMNS}
+        columns["result"] = [json.dumps(row["result"], separators=(",", ":")) for row in rows]
+        part = os.path.join(self.path, f"part-{time.strftime('%Y%m%dT%H%M%S')}-{os.getpid()}-{time.monotonic_ns()}.parquet")
+        self.pq.write_table(self.pa.table(columns), part + ".tmp")
+        os.replace(part + ".tmp", part)
+
+
+def to_row(path, key, results, keep_word_cloud=False):
+    results.pop("storeRecords", None)
+    if not keep_word_cloud: results.pop("wordCloudData", None) # base64 PNGs dominate the output size otherwise
+    metrics = results.get("metrics") or {}
+    satisfaction = results.get("satisfactionPrediction") or {}
+    speech_emotion = results.get("speechEmotionOverall") or {}
+    return {
+        "key": key, "path": path, "fileName": results.get("fileName"),
+        "status": "error" if results.get("error") else "complete", "error": results.get("error"),
+        "audioDuration": results.get("audioDuration"), "transcription": results.get("transcription"),
+        "satisfaction": satisfaction.get("value"), "satisfactionLabel": satisfaction.get("label"),
+        "textSentiment": (results.get("textSentimentOverall") or {}).get("dominant"),
+        "speechEmotion": max(speech_emotion, key=speech_emotion.get) if speech_emotion else None,
+        "totalSeconds": metrics.get("totalSeconds"), "realTimeFactor": metrics.get("realTimeFactor"),
+        "result": results,
+    }
+
+
+# --- Driver ---
+def run(args):
+    checkpoint = SQLiteDatabase(args.checkpoint or f"{args.output.rstrip(os.sep)}.checkpoint.db", CHECKPOINT_SCHEMA)
+    done = {row["key"]: row["status"] for row in checkpoint.query("SELECT key, status FROM analyzed")}
+    pending, skipped = [], 0
+    for path in iter_input_files(args.source):
+        if not os.path.isfile(path):
+            print(f"Warning: {path} does not exist, skipping.", file=sys.stderr)
+            continue
+        key = file_key(path)
+        status = done.get(key)
+        if status == "complete" or (status == "error" and not args.retry_errors):
+            skipped += 1
+            continue
+        pending.append((path, key))
+    if args.limit: pending = pending[:args.limit]
+    print(f"INFO: {len(pending)} file(s) to analyze, {skipped} already in the checkpoint.", file=sys.stderr)
+    if not pending: return 0
+
+    writer = ParquetWriter(args.output) if args.format == "parquet" else JSONLWriter(args.output)
+    call_store_writer = None
+    if args.persist:
+        from utils.call_store import CallStoreBatchWriter, get_call_store
+        # Only flushed together with the output, never on its own
+        call_store_writer = CallStoreBatchWriter(get_call_store(), batch_size=float("inf"), max_delay_s=float("inf"))
+    buffer, analyzed, errors = [], 0, 0
+    started = last_flush = time.monotonic()
+
+    def flush():
+        nonlocal buffer, last_flush
+        if buffer:
+            writer.write([row for row, _ in buffer])
+            if call_store_writer:
+                for _, store_records in buffer:
+                    if store_records: call_store_writer.add(store_records["call"], store_records["transcription"], store_records["call"]["timestamp"])
+                call_store_writer.flush()
+            conn = checkpoint.connection()
+            with conn:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO analyzed (key, path, status, finished_at) VALUES (?, ?, ?, ?)",
+                    [(row["key"], row["path"], row["status"], time.time()) for row, _ in buffer],
+                )
+            buffer = []
+        last_flush = time.monotonic()
+        elapsed = last_flush - started
+        rate = analyzed / elapsed if elapsed else 0
+        eta = (len(pending) - analyzed) / rate if rate else 0
+        print(f"INFO: {analyzed}/{len(pending)} analyzed ({errors} errors), {rate * 60:.1f} files/min, ETA {eta / 60:.0f} min", file=sys.stderr)
+
+    spawn = mp.get_context("spawn") # fork is unsafe with torch/tokenizer threads
+    queue = iter(pending)
+    try:
+        with ProcessPoolExecutor(max_workers=args.workers, mp_context=spawn, initializer=init_worker,
+                                 initargs=(args.threads_per_worker,)) as pool:
+            # Keep only a couple of files per worker in flight, so huge directories don't become huge future lists
+            in_flight = set()
+            for path, key in queue:
+                in_flight.add(pool.submit(analyze_file, path, key))
+                if len(in_flight) >= args.workers * 2: break
+            while in_flight:
+                finished, in_flight = wait(in_flight, timeout=args.flush_seconds, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    path, key, results = future.result()
+                    store_records = results.get("storeRecords")
+                    row = to_row(path, key, results, args.keep_word_cloud)
+                    buffer.append((row, store_records))
+                    analyzed += 1
+                    errors += row["status"] == "error"
+                    if row["status"] == "error": print(f"Warning: {path}: {row['error']}", file=sys.stderr)
+                    next_item = next(queue, None)
+                    if next_item: in_flight.add(pool.submit(analyze_file, *next_item))
+                if len(buffer) >= args.flush_every or time.monotonic() - last_flush >= args.flush_seconds:
+                    flush()
+    except BrokenProcessPool as e:
+        # A worker died (OOM, segfault) or failed to load models: keep what finished, resume later
+        flush()
+        print(f"ERROR: Worker pool broke ({e}); re-run the same command to resume.", file=sys.stderr)
+        return 1
+    except KeyboardInterrupt:
+        flush()
+        print("INFO: Interrupted; re-run the same command to resume.", file=sys.stderr)
+        return 130
+    flush()
+    return 1 if errors else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Analyze a directory or manifest of recordings offline.")
+    parser.add_argument("source", help="Directory to walk, or a manifest (one path per line, or JSONL with a \"path\" field)")
+    parser.add_argument("--output", required=True, help="JSONL file, or directory of part files for --format parquet")
+    parser.add_argument("--format", choices=("jsonl", "parquet"), default="jsonl")
+    parser.add_argument("--workers", type=int, default=1, help="Worker processes, each with its own copy of the models")
+    parser.add_argument("--threads-per-worker", type=int, help="torch/OpenMP threads per worker (default: CPUs / workers)")
+    parser.add_argument("--flush-every", type=int, default=20, help="Flush after this many results")
+    parser.add_argument("--flush-seconds", type=float, default=60.0, help="...or after this long since the last flush")
+    parser.add_argument("--checkpoint", help="Checkpoint database (default: <output>.checkpoint.db)")
+    parser.add_argument("--retry-errors", action="store_true", help="Analyze files that failed in an earlier run again")
+    parser.add_argument("--persist", action="store_true", help="Also append results to the call store, like the API does")
+    parser.add_argument("--keep-word-cloud", action="store_true", help="Keep the per-call word cloud PNG in the output")
+    parser.add_argument("--limit", type=int, help="Analyze at most this many files in this run")
+    args = parser.parse_args(argv)
+    args.workers = max(1, args.workers)
+    args.threads_per_worker = args.threads_per_worker or max(1, (os.cpu_count() or 1) // args.workers)
+    return run(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,168 @@
+# backend/benchmarks/pipeline_benchmark.py
+"""Offline benchmark for models/analysis_pipeline.py on synthetic calls with stub models.
+
+Run from backend/:
+    python -m benchmarks.pipeline_benchmark --preset quick                  # print results
+    python -m benchmarks.pipeline_benchmark --preset full --save-baseline   # record benchmarks/baseline.json
+    python -m benchmarks.pipeline_benchmark --preset full --check           # exit 1 on regressions
+
+Every case runs in a fresh spawned process so peak RSS and allocations aren't polluted by
+earlier cases. The pipeline's call store goes to a temporary directory, never data/.
+"""
+import argparse
+import json
+import multiprocessing as mp
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "baseline.json")
+PRESETS = {
+    "quick": (60, 300),
+    "full": (60, 600, 1800, 3600, 7200), # 1 minute to 2 hours
+}
+# Checked against the baseline; stage timings below MIN_CHECKED_SECONDS are too noisy to compare
+CHECKED_CASE_METRICS = ("totalSeconds", "peakRssBytes", "tracedPeakBytes")
+MIN_CHECKED_SECONDS = 0.25
+DEFAULT_TOLERANCE = 0.25
+
+
+def write_synthetic_call(workdir, duration_s, num_speakers, seed):
+    import soundfile as sf
+    from benchmarks.stubs import synthesize_call, SAMPLE_RATE
+    audio, turns = synthesize_call(duration_s, num_speakers=num_speakers, seed=seed)
+    audio_path = os.path.join(workdir, f"call_{duration_s}s.wav")
+    sf.write(audio_path, audio, SAMPLE_RATE, subtype="PCM_16")
+    return audio_path, turns
+
+
+def run_case(audio_path, turns, duration_s, num_speakers, seed, trace_allocations, workdir):
+    # Runs in the child process: configure the environment before the pipeline module is imported
+    os.environ["CUDA_VISIBLE_DEVICES"] = ""
+    os.environ["CALL_STORE_DB_PATH"] = os.path.join(workdir, "calls.db")
+    from benchmarks.stubs import install_stub_models
+    from models import analysis_pipeline as pipeline
+    from utils.metrics import peak_rss_bytes
+
+    install_stub_models(pipeline, turns)
+
+    rss_before = peak_rss_bytes()
+    if trace_allocations: tracemalloc.start()
+    start = time.perf_counter()
+    results = pipeline.analyze_audio(audio_path, f"bench-{duration_s}s", os.path.basename(audio_path))
+    elapsed = time.perf_counter() - start
+    case = {
+        "durationS": duration_s, "speakers": num_speakers, "turns": len(turns), "seed": seed,
+        "error": results.get("error"),
+        "totalSeconds": round(elapsed, 3),
+        "realTimeFactor": round(elapsed / duration_s, 5),
+        "audioSecondsPerSecond": round(duration_s / elapsed, 2) if elapsed else None,
+        "stageSeconds": results["metrics"].get("stageSeconds", {}),
+        "speechEmotion": results["metrics"].get("speechEmotion", {}),
+        "words": len(results.get("wordTimestamps") or []),
+        "peakRssBytes": peak_rss_bytes(),
+        "peakRssBeforeBytes": rss_before,
+    }
+    if trace_allocations:
+        _, traced_peak = tracemalloc.get_traced_memory()
+        del results # what is still allocated after this is retained by the pipeline module
+        snapshot = tracemalloc.take_snapshot()
+        tracemalloc.stop()
+        stats = snapshot.statistics("lineno")
+        case["tracedPeakBytes"] = traced_peak
+        case["retainedBytes"] = sum(stat.size for stat in stats)
+        case["retainedBlocks"] = sum(stat.count for stat in stats)
+        case["topRetained"] = [{"where": str(stat.traceback), "bytes": stat.size, "blocks": stat.count} for stat in stats[:5]]
+    case["stageAudioSecondsPerSecond"] = {
+        stage: round(duration_s / seconds, 1) for stage, seconds in case["stageSeconds"].items() if seconds
+    }
+    return case
+
+
+def environment_info():
+    import torch
+    return {
+        "python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count(),
+        "torch": torch.__version__, "torchThreads": torch.get_num_threads(),
+        "pipelineWorkers": os.environ.get("PIPELINE_WORKERS", "3"), "asrMode": os.environ.get("ASR_MODE", "full"),
+    }
+
+
+def run_benchmark(durations, num_speakers=2, seed=0, trace_allocations=True):
+    spawn = mp.get_context("spawn")
+    cases = []
+    for duration_s in durations:
+        print(f"INFO: Benchmarking a {duration_s}s synthetic call ({num_speakers} speakers)...", file=sys.stderr)
+        with tempfile.TemporaryDirectory(prefix="pipeline-bench-") as workdir:
+            audio_path, turns = write_synthetic_call(workdir, duration_s, num_speakers, seed)
+            with ProcessPoolExecutor(max_workers=1, mp_context=spawn) as pool:
+                case = pool.submit(run_case, audio_path, turns, duration_s, num_speakers, seed, trace_allocations, workdir).result()
+        print(f"INFO:   {case['totalSeconds']}s total, RTF {case['realTimeFactor']}, "
+              f"peak RSS {case['peakRssBytes'] / 2**20:.0f} MiB", file=sys.stderr)
+        cases.append(case)
+    return {"createdAt": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()), "traceAllocations": trace_allocations,
+            "environment": environment_info(), "cases": cases}
+
+
+def check_regressions(report, baseline, tolerance=DEFAULT_TOLERANCE):
+    """Returns human-readable regressions of `report` against `baseline` (empty when within tolerance)."""
+    problems = []
+    if report["traceAllocations"] != baseline.get("traceAllocations"):
+        return ["allocation tracing differs from the baseline run; timings are not comparable"]
+    baseline_cases = {(c["durationS"], c["speakers"]): c for c in baseline.get("cases", [])}
+    for case in report["cases"]:
+        label = f"{case['durationS']}s/{case['speakers']} speakers"
+        if case.get("error"): problems.append(f"{label}: analysis failed: {case['error']}")
+        old = baseline_cases.get((case["durationS"], case["speakers"]))
+        if old is None: continue
+        pairs = [(name, old.get(name), case.get(name)) for name in CHECKED_CASE_METRICS]
+        pairs += [(f"stage {stage}", seconds, case["stageSeconds"].get(stage))
+                  for stage, seconds in old.get("stageSeconds", {}).items() if seconds >= MIN_CHECKED_SECONDS]
+        for name, before, after in pairs:
+            if not before or after is None: continue
+            if after > before * (1 + tolerance):
+                problems.append(f"{label}: {name} {before} -> {after} (+{(after / before - 1) * 100:.0f}%)")
+    return problems
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline analysis pipeline benchmark (synthetic audio, stub models).")
+    parser.add_argument("--preset", choices=sorted(PRESETS), default="quick")
+    parser.add_argument("--durations", type=int, nargs="+", help="Call lengths in seconds (overrides --preset)")
+    parser.add_argument("--speakers", type=int, default=2)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-allocations", action="store_true", help="Skip tracemalloc (faster, no allocation stats)")
+    parser.add_argument("--output", help="Write the JSON report here")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true", help="Record this run as the baseline")
+    parser.add_argument("--check", action="store_true", help="Compare against the baseline, exit 1 on regressions")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE, help="Allowed slowdown/growth (0.25 = 25%%)")
+    args = parser.parse_args(argv)
+
+    report = run_benchmark(args.durations or PRESETS[args.preset], args.speakers, args.seed, not args.no_allocations)
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f: f.write(text)
+    else:
+        print(text)
+    if args.save_baseline:
+        with open(args.baseline, "w") as f: f.write(text)
+        print(f"INFO: Baseline written to {args.baseline}", file=sys.stderr)
+    if args.check:
+        if not os.path.exists(args.baseline):
+            print(f"ERROR: No baseline at {args.baseline}; run with --save-baseline first.", file=sys.stderr)
+            return 2
+        with open(args.baseline) as f: baseline = json.load(f)
+        problems = check_regressions(report, baseline, args.tolerance)
+        for problem in problems: print(f"REGRESSION: {problem}", file=sys.stderr)
+        if problems: return 1
+        print("INFO: No regressions against the baseline.", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
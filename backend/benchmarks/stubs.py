@@ -0,0 +1,223 @@
+# backend/benchmarks/stubs.py
+"""Synthetic calls and lightweight stand-ins for the pipeline's models.
+
+The stubs expose the same call signatures and return shapes as the Hugging Face / pyannote
+objects load_models puts in the pipeline globals, and do real work proportional to their
+input (framing, convolution, pooling), so stage timings scale the way the real ones do.
+Everything is deterministic for a given seed and runs on CPU without network access.
+"""
+import time
+import zlib
+from types import SimpleNamespace
+
+import numpy as np
+import torch
+
+SAMPLE_RATE = 16000
+SPEAKER_F0_HZ = (110.0, 205.0, 160.0, 250.0) # one voice per speaker, cycled
+VOCABULARY = (
+    "hello thanks calling support account billing refund order delivery problem issue sorry "
+    "please help today number payment card charge again waiting manager happy angry great "
+    "terrible cancel subscription service internet slow working fixed check email address"
+).split()
+GO_EMOTIONS_LABELS = (
+    "admiration amusement anger annoyance approval caring confusion curiosity desire disappointment "
+    "disapproval disgust embarrassment excitement fear gratitude grief joy love nervousness optimism "
+    "pride realization relief remorse sadness surprise neutral"
+).split()
+SPEECH_EMOTION_LABELS = ("angry", "calm", "disgust", "fearful", "happy", "neutral", "sad", "surprised")
+
+
+# --- Synthetic audio ---
+def synthesize_call(duration_s, num_speakers=2, sr=SAMPLE_RATE, seed=0):
+    """Returns (mono float32 audio, turns as [(start_s, end_s, speaker)]) for an alternating conversation.
+
+    Turns are 0.4-15 s long (some micro-turns), words are 0.25-0.6 s harmonic tones at the
+    speaker's pitch separated by short pauses, over a low noise floor.
+    """
+    rng = np.random.default_rng(seed)
+    total = int(duration_s * sr)
+    audio = rng.standard_normal(total, dtype=np.float32) * np.float32(0.003)
+    turns = []
+    t, speaker = 0.2, 0
+    while t < duration_s - 0.5:
+        turn_len = rng.uniform(0.4, 1.0) if rng.random() < 0.15 else rng.uniform(1.5, 15.0)
+        end = min(duration_s - 0.1, t + turn_len)
+        f0 = SPEAKER_F0_HZ[speaker % len(SPEAKER_F0_HZ)]
+        word_t = t
+        while word_t < end - 0.2:
+            word_len = min(rng.uniform(0.25, 0.6), end - word_t)
+            start_i, end_i = int(word_t * sr), int((word_t + word_len) * sr)
+            n = end_i - start_i
+            phase = 2 * np.pi * f0 * (1 + 0.02 * np.sin(np.linspace(0, 6, n))) * np.arange(n) / sr
+            tone = np.sin(phase) + 0.5 * np.sin(2 * phase) + 0.25 * np.sin(3 * phase)
+            envelope = np.hanning(n) * rng.uniform(0.15, 0.35)
+            audio[start_i:end_i] += (tone * envelope).astype(np.float32)
+            word_t += word_len + rng.uniform(0.08, 0.3)
+        turns.append((round(t, 3), round(end, 3), f"SPEAKER_{speaker:02d}"))
+        t = end + rng.uniform(0.1, 0.8)
+        speaker = (speaker + 1) % num_speakers
+    return audio, turns
+
+
+def _frame_energy(audio, sr, frame_s=0.02):
+    frame = int(sr * frame_s)
+    n = len(audio) // frame
+    return np.sqrt((audio[:n * frame].reshape(n, frame) ** 2).mean(axis=1)), frame_s
+
+
+# --- ASR ---
+class StubASRPipeline:
+    """Callable like a transformers ASR pipeline with return_timestamps="word".
+
+    Voiced runs in 20 ms frame energy become words, named from a fixed vocabulary.
+    """
+
+    def __call__(self, inputs, chunk_length_s=None, stride_length_s=None, batch_size=None, return_timestamps=None):
+        audio, sr = np.asarray(inputs["raw"], dtype=np.float32), inputs["sampling_rate"]
+        energy, frame_s = _frame_energy(audio, sr)
+        voiced = energy > 0.02
+        edges = np.flatnonzero(np.diff(np.concatenate(([0], voiced.astype(np.int8), [0]))))
+        chunks = []
+        for start, end in zip(edges[::2], edges[1::2]):
+            if end - start < 3: continue # shorter than 60 ms
+            word = VOCABULARY[zlib.crc32(f"{start}".encode()) % len(VOCABULARY)].upper()
+            chunks.append({"text": word, "timestamp": (round(start * frame_s, 2), round(end * frame_s, 2))})
+        return {"text": " ".join(chunk["text"] for chunk in chunks), "chunks": chunks}
+
+
+# --- Diarization ---
+class _Segment:
+    def __init__(self, start, end):
+        self.start = start
+        self.end = end
+
+
+class StubDiarization:
+    def __init__(self, turns):
+        self._turns = turns
+
+    def labels(self):
+        return sorted({speaker for _, _, speaker in self._turns})
+
+    def itertracks(self, yield_label=False):
+        for i, (start, end, speaker) in enumerate(self._turns):
+            yield (_Segment(start, end), i, speaker) if yield_label else (_Segment(start, end), i)
+
+
+class StubDiarizationPipeline:
+    """Returns the synthetic call's scripted turns, after an energy pass over the waveform."""
+
+    def __init__(self, turns):
+        self.turns = turns
+
+    def __call__(self, file):
+        waveform = file["waveform"]
+        _frame_energy(waveform[0].numpy(), file["sample_rate"]) # stands in for the segmentation model's pass
+        duration = waveform.shape[-1] / file["sample_rate"]
+        return StubDiarization([(start, min(end, duration), speaker) for start, end, speaker in self.turns if start < duration])
+
+
+# --- Audio classifiers (speech emotion, gender) ---
+class StubFeatureExtractor:
+    """Zero-mean/unit-variance normalization and padding, like Wav2Vec2FeatureExtractor."""
+
+    def __init__(self, sampling_rate=SAMPLE_RATE):
+        self.sampling_rate = sampling_rate
+
+    def __call__(self, raw, sampling_rate=None, return_tensors="pt", padding=True, return_attention_mask=False):
+        waveforms = [raw] if isinstance(raw, np.ndarray) and raw.ndim == 1 else list(raw)
+        longest = max(len(w) for w in waveforms)
+        values = np.zeros((len(waveforms), longest), dtype=np.float32)
+        mask = np.zeros((len(waveforms), longest), dtype=np.int64)
+        for i, w in enumerate(waveforms):
+            values[i, :len(w)] = (w - w.mean()) / np.sqrt(w.var() + 1e-7)
+            mask[i, :len(w)] = 1
+        inputs = {"input_values": torch.from_numpy(values)}
+        if return_attention_mask: inputs["attention_mask"] = torch.from_numpy(mask)
+        return inputs
+
+
+class StubAudioClassifier(torch.nn.Module):
+    """Strided conv feature encoder (wav2vec2's 20 ms hop), masked mean pooling and a linear head."""
+
+    def __init__(self, labels, seed=0):
+        super().__init__()
+        torch.manual_seed(seed)
+        self.encoder = torch.nn.Conv1d(1, 64, kernel_size=400, stride=320)
+        self.head = torch.nn.Linear(64, len(labels))
+        self.config = SimpleNamespace(id2label=dict(enumerate(labels)))
+        self.eval()
+
+    def forward(self, input_values, attention_mask=None):
+        features = torch.relu(self.encoder(input_values.unsqueeze(1))) # (batch, 64, frames)
+        if attention_mask is not None:
+            frame_mask = attention_mask[:, ::320][:, :features.shape[-1]].unsqueeze(1).float()
+            pooled = (features * frame_mask).sum(-1) / frame_mask.sum(-1).clamp_min(1)
+        else:
+            pooled = features.mean(-1)
+        return SimpleNamespace(logits=self.head(pooled))
+
+
+# --- Text sentiment ---
+class _BatchEncoding(dict):
+    def to(self, device):
+        return _BatchEncoding({key: value.to(device) for key, value in self.items()})
+
+
+class StubTokenizer:
+    """Whitespace tokenizer with hashed ids; supports the tokenize-then-pad flow of get_text_sentiment_batch."""
+
+    vocab_size = 30522
+
+    def __call__(self, texts, truncation=True, max_length=512):
+        input_ids = [[101] + [zlib.crc32(w.encode()) % (self.vocab_size - 1000) + 1000 for w in text.split()][:max_length - 2] + [102]
+                     for text in texts]
+        return {"input_ids": input_ids, "attention_mask": [[1] * len(ids) for ids in input_ids]}
+
+    def pad(self, features, return_tensors="pt"):
+        longest = max(len(f["input_ids"]) for f in features)
+        ids = torch.zeros((len(features), longest), dtype=torch.long)
+        mask = torch.zeros((len(features), longest), dtype=torch.long)
+        for i, f in enumerate(features):
+            ids[i, :len(f["input_ids"])] = torch.tensor(f["input_ids"])
+            mask[i, :len(f["input_ids"])] = 1
+        return _BatchEncoding({"input_ids": ids, "attention_mask": mask})
+
+
+class StubTextClassifier(torch.nn.Module):
+    def __init__(self, labels=GO_EMOTIONS_LABELS, seed=0):
+        super().__init__()
+        torch.manual_seed(seed)
+        self.embedding = torch.nn.Embedding(StubTokenizer.vocab_size, 64)
+        self.head = torch.nn.Linear(64, len(labels))
+        self.config = SimpleNamespace(id2label=dict(enumerate(labels)))
+        self.eval()
+
+    def forward(self, input_ids, attention_mask):
+        mask = attention_mask.unsqueeze(-1).float()
+        pooled = (self.embedding(input_ids) * mask).sum(1) / mask.sum(1).clamp_min(1)
+        return SimpleNamespace(logits=self.head(pooled))
+
+
+def install_stub_models(pipeline, turns):
+    """Puts stub models into the pipeline module's globals, as load_models would with the real ones."""
+    timings = {}
+    start = time.perf_counter()
+    pipeline.asr_pipeline_global = StubASRPipeline()
+    timings["asr"] = time.perf_counter() - start; start = time.perf_counter()
+    pipeline.sentiment_tokenizer = StubTokenizer()
+    pipeline.sentiment_model = StubTextClassifier().to(pipeline.DEVICE)
+    pipeline.GO_ID2LABEL = pipeline.sentiment_model.config.id2label
+    pipeline.GO_TO_8_MATRIX = pipeline.build_go_to_8_matrix(pipeline.GO_ID2LABEL)
+    timings["textSentiment"] = time.perf_counter() - start; start = time.perf_counter()
+    pipeline.ehcalabres_emotion_feature_extractor = StubFeatureExtractor()
+    pipeline.ehcalabres_emotion_model = StubAudioClassifier(SPEECH_EMOTION_LABELS, seed=1).to(pipeline.DEVICE)
+    timings["speechEmotion"] = time.perf_counter() - start; start = time.perf_counter()
+    pipeline.gender_feature_extractor_new = StubFeatureExtractor()
+    pipeline.gender_model_new = StubAudioClassifier(("female", "male"), seed=2).to(pipeline.DEVICE)
+    timings["gender"] = time.perf_counter() - start; start = time.perf_counter()
+    pipeline.diarization_pipeline_global = StubDiarizationPipeline(turns)
+    timings["diarization"] = time.perf_counter() - start
+    pipeline.MODEL_LOAD_SECONDS.update({key: round(value, 4) for key, value in timings.items()})
+    pipeline.models_loaded_successfully = True
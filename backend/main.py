@@ -1,34 +1,57 @@
 # backend/main.py
-from fastapi import FastAPI, File, UploadFile, BackgroundTasks, HTTPException, Request
-from fastapi.responses import FileResponse
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import FileResponse, StreamingResponse, PlainTextResponse
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
 import os
+import asyncio
 import uuid
+import socket
 import logging
 import traceback
 from contextlib import asynccontextmanager
 import shutil
+import tempfile
+import tarfile
+import zipfile
 import mimetypes
 from datetime import datetime, timedelta, timezone
 from pathlib import Path
+from typing import Optional
+import threading
 import json
 from pydantic import BaseModel
-from groq import Groq
 from dotenv import load_dotenv
+from utils.segment_audio import SegmentAudioCache, parse_segment_filename
+from utils.job_queue import AnalysisJobQueue, QueueFullError, PRIORITIES
+from utils.task_store import TaskStore, TERMINAL_STATUSES
+from utils.storage import StorageIndex, StorageJanitor
+from utils.call_store import get_call_store, resolve_time_range, CallStoreBatchWriter, DEFAULT_TIMEFRAME
+from utils.lru_cache import LRUCache
+from utils.intervals import EmotionTimelineIndex
+from utils.result_cache import ResultCache, result_cache_key, retarget_result
+from utils.metrics import MetricsRegistry, process_rss_bytes
+from utils.chat import build_chat_messages, get_chat_client, normalize_question
+from utils.upload_ingest import (
+    MultipartFileReceiver, StreamingUpload, UploadRejected, UploadSessionStore, UploadSizeLimitMiddleware,
+    is_archive, iter_archive_members,
+)
 
+# Legacy JSON history, imported once into the call store (utils/call_store.py) at startup
 HISTORY_FILE = Path("historical_transcriptions.json")
 DATA_FILE = Path("call_data.json")
 
 # Load API key from .env
 load_dotenv()
-groq_client = Groq(api_key=os.environ.get("GROQ_API_KEY"))
+chat_client = get_chat_client() # CHAT_LLM_BACKEND=stub answers locally, without network
 
-# Attempt to import analysis functions and load models early
+# Attempt to import analysis functions early
 try:
-    # Import necessary functions from the pipeline module
-    from models.analysis_pipeline import analyze_audio, generate_word_cloud_base64, load_models
-    # Attempt to load models on startup
-    models_loaded = load_models()
+    # Import necessary functions from the pipeline module.
+    # Models themselves are loaded once per analysis worker process (see utils/job_queue.py),
+    # not in the API process.
+    from models.analysis_pipeline import analyze_audio, generate_word_cloud_base64, generate_word_cloud_from_frequencies, load_models, analysis_fingerprint
+    models_loaded = True
 except ImportError as ie:
      print(f"FATAL: Import Error: {ie}. Check file paths and dependencies.")
      models_loaded = False
@@ -40,32 +63,181 @@ except Exception as e:
 
 # Define dummy functions if loading failed (allows API to start but analysis will fail)
 if not models_loaded:
-    def analyze_audio(original_audio_path: str, task_id: str, original_filename: str):
+    def load_models():
+        return False
+    def analyze_audio(original_audio_path: str, task_id: str, original_filename: str, event_db_path=None, persist=True):
         print("WARNING: analyze_audio - Models not loaded. Returning error state.")
         return { "error": "Backend models failed to load. Analysis not possible.", "taskId": task_id, "fileName": original_filename }
     def generate_word_cloud_base64(text):
          print("WARNING: generate_word_cloud_base64 - Models likely not loaded. Returning None.")
          return None
+    def generate_word_cloud_from_frequencies(frequencies):
+         print("WARNING: generate_word_cloud_from_frequencies - Models likely not loaded. Returning None.")
+         return None
+    def analysis_fingerprint():
+        return None
 
 # --- Configuration ---
 UPLOAD_DIR = os.path.join("data", "uploads")
 SEGMENT_BASE_DIR = os.path.join("data", "speaker_segments")
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 os.makedirs(SEGMENT_BASE_DIR, exist_ok=True)
+# Rendered speaker segments are kept in an LRU directory bounded by this many bytes
+SEGMENT_CACHE_MAX_BYTES = int(os.environ.get("SEGMENT_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+segment_cache = SegmentAudioCache(SEGMENT_BASE_DIR, SEGMENT_CACHE_MAX_BYTES)
+mimetypes.add_type("audio/flac", ".flac")
+mimetypes.add_type("audio/ogg", ".opus")
+# Uploads and rendered segments are evicted STORAGE_RETENTION_S after their last use (or once their task has
+# expired), and least recently used first while together they exceed STORAGE_QUOTA_BYTES; swept periodically
+STORAGE_RETENTION_S = int(os.environ.get("STORAGE_RETENTION_S", str(30 * 24 * 3600)))
+STORAGE_QUOTA_BYTES = int(os.environ.get("STORAGE_QUOTA_BYTES", str(50 * 1024 * 1024 * 1024)))
+STORAGE_SWEEP_INTERVAL_S = int(os.environ.get("STORAGE_SWEEP_INTERVAL_S", "900"))
+# Analysis runs in this many worker processes; at most ANALYSIS_QUEUE_DEPTH uploads wait for a free worker. Both are
+# per API process: every uvicorn worker starts its own queue and workers, each loading all models, so run a single
+# API process per host (--workers 1) unless the host has memory for N x ANALYSIS_WORKERS model copies
+ANALYSIS_WORKERS = int(os.environ.get("ANALYSIS_WORKERS", "1"))
+ANALYSIS_QUEUE_DEPTH = int(os.environ.get("ANALYSIS_QUEUE_DEPTH", "32"))
+# Task status/results live in SQLite so every uvicorn worker sees the same tasks; results expire after the TTL
+TASK_DB_PATH = os.environ.get("TASK_DB_PATH", os.path.join("data", "tasks.db"))
+TASK_RESULT_TTL_S = int(os.environ.get("TASK_RESULT_TTL_S", str(7 * 24 * 3600)))
+# /events streams read new task events every TASK_EVENT_POLL_S, backing off to TASK_EVENT_MAX_POLL_S while nothing
+# happens, and send a keep-alive comment when idle; a finished task's events are purged after TASK_EVENT_TTL_S
+TASK_EVENT_POLL_S = float(os.environ.get("TASK_EVENT_POLL_S", "0.5"))
+TASK_EVENT_MAX_POLL_S = float(os.environ.get("TASK_EVENT_MAX_POLL_S", "4"))
+TASK_EVENT_TTL_S = int(os.environ.get("TASK_EVENT_TTL_S", "600"))
+TASK_EVENT_KEEPALIVE_S = 15
+# Processes running an analysis queue heartbeat every QUEUE_HEARTBEAT_S in the task store; pending/processing tasks
+# queued by a process silent for QUEUE_OWNER_STALE_S (or gone at restart) lost their job with it and are failed
+QUEUE_HEARTBEAT_S = int(os.environ.get("QUEUE_HEARTBEAT_S", "15"))
+QUEUE_OWNER_STALE_S = int(os.environ.get("QUEUE_OWNER_STALE_S", "120"))
+
+# Rendered /historical word clouds keyed by (window, version of the calls inside it)
+historical_word_cloud_cache = LRUCache(int(os.environ.get("HISTORICAL_WORD_CLOUD_CACHE_SIZE", "64")))
+
+# Interval indexes over finished tasks' emotion timelines, for /analysis/{task_id}/emotions window queries
+emotion_index_cache = LRUCache(int(os.environ.get("EMOTION_INDEX_CACHE_SIZE", "64")))
+
+# At most CHAT_MAX_CONCURRENCY LLM calls run at once; further chats wait their turn without blocking the event loop
+CHAT_MAX_CONCURRENCY = int(os.environ.get("CHAT_MAX_CONCURRENCY", "4"))
+chat_semaphore = asyncio.Semaphore(CHAT_MAX_CONCURRENCY)
+# Replies keyed by (normalized question, call-set version), so a new call invalidates them; expire after the TTL
+CHAT_CACHE_TTL_S = int(os.environ.get("CHAT_CACHE_TTL_S", "600"))
+chat_reply_cache = LRUCache(int(os.environ.get("CHAT_CACHE_SIZE", "256")), ttl_s=CHAT_CACHE_TTL_S)
+
+# Finished analyses keyed by upload content + models/options, so re-uploads of a recording skip the models
+RESULT_CACHE_DB_PATH = os.environ.get("RESULT_CACHE_DB_PATH", os.path.join("data", "results.db"))
+RESULT_CACHE_MAX_BYTES = int(os.environ.get("RESULT_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+UPLOAD_CHUNK_BYTES = 1024 * 1024
+
+# Uploads are streamed to disk, hashed and header-probed as they arrive; oversized or non-audio bodies are
+# rejected without writing the rest. Large recordings can use resumable sessions (/uploads) instead of /upload.
+UPLOAD_MAX_BYTES = int(os.environ.get("UPLOAD_MAX_BYTES", str(1024 * 1024 * 1024)))
+UPLOAD_MAX_DURATION_S = int(os.environ.get("UPLOAD_MAX_DURATION_S", str(4 * 3600)))
+UPLOAD_SESSION_TTL_S = int(os.environ.get("UPLOAD_SESSION_TTL_S", str(24 * 3600)))
+ALLOWED_EXTENSIONS = ['.wav', '.mp3', '.ogg', '.flac', '.m4a', '.aac']
+
+# Bulk uploads (/batches): archives or many files, one task per recording under a batch id. Batch tasks wait
+# in the task store and only fill BULK_QUEUE_SLOTS queue slots, the rest stay free for interactive uploads.
+BULK_UPLOAD_MAX_BYTES = int(os.environ.get("BULK_UPLOAD_MAX_BYTES", str(20 * 1024 * 1024 * 1024)))
+BULK_MAX_FILES = int(os.environ.get("BULK_MAX_FILES", "5000"))
+BULK_QUEUE_SLOTS = int(os.environ.get("BULK_QUEUE_SLOTS", str(max(1, ANALYSIS_QUEUE_DEPTH // 2))))
+# Call records of bulk analyses are committed to the call store this many at a time
+BULK_COMMIT_SIZE = int(os.environ.get("BULK_COMMIT_SIZE", "50"))
+
+# --- Application State (Persistent) ---
+# task_id -> status ("pending" | "processing" | "complete" | "error" | "cancelled"), file name, result, timestamps
+task_store = TaskStore(TASK_DB_PATH, result_ttl_s=TASK_RESULT_TTL_S, event_ttl_s=TASK_EVENT_TTL_S)
+# This process's analysis queue, as recorded on the tasks it holds in memory
+QUEUE_OWNER = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+result_cache = ResultCache(RESULT_CACHE_DB_PATH, RESULT_CACHE_MAX_BYTES)
+ANALYSIS_FINGERPRINT = analysis_fingerprint()
+# task_id -> result cache key for analyses queued by this process, stored once they complete
+pending_cache_keys = {}
+# In-progress chunked uploads; their writers (and running hashes) stay open in the process that received the last chunk
+upload_sessions = UploadSessionStore(TASK_DB_PATH)
+upload_writers = {}
+upload_locks = {}
+storage_index = StorageIndex(TASK_DB_PATH)
+call_store_writer = CallStoreBatchWriter(get_call_store(), batch_size=BULK_COMMIT_SIZE)
+batch_feed_lock = threading.Lock()
+
+# --- Metrics (Prometheus text format on /metrics) ---
+# Stage timings arrive with each finished result from the worker processes; gauges are sampled per scrape
+metrics = MetricsRegistry(TASK_DB_PATH) # counters/histograms shared by every API worker; gauges are per process
+stage_seconds_metric = metrics.histogram("analysis_stage_seconds", "Wall time of each analysis pipeline stage.", ("stage",))
+analysis_seconds_metric = metrics.histogram("analysis_seconds", "Wall time of a whole analysis in the worker.")
+queue_seconds_metric = metrics.histogram("analysis_queue_wait_seconds", "Time from upload to a worker picking the task up.")
+real_time_factor_metric = metrics.histogram(
+    "analysis_real_time_factor", "Analysis seconds per second of audio.",
+    buckets=(0.05, 0.1, 0.25, 0.5, 0.75, 1, 1.5, 2, 4, 8),
+)
+analysis_audio_seconds_metric = metrics.counter("analysis_audio_seconds_total", "Seconds of audio analyzed.")
+analysis_speech_seconds_metric = metrics.counter("analysis_speech_seconds_total", "Seconds of analyzed audio the VAD kept as speech.")
+vad_skipped_metric = metrics.histogram(
+    "analysis_vad_skipped_ratio", "Share of each call's audio skipped by ASR and the audio classifiers.",
+    buckets=(0.05, 0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 1),
+)
+tasks_metric = metrics.counter("analysis_tasks_total", "Finished analysis tasks by outcome.", ("outcome",))
+queue_depth_metric = metrics.gauge("analysis_queue_depth", "Uploads waiting for an analysis worker.")
+in_flight_metric = metrics.gauge("analysis_in_flight", "Analyses currently running in worker processes.")
+workers_ready_metric = metrics.gauge("analysis_workers_ready", "Analysis worker processes with models loaded.")
+model_load_metric = metrics.gauge("model_load_seconds", "Model load time in the most recently reporting worker.", ("model",))
+worker_rss_metric = metrics.gauge("analysis_worker_peak_rss_bytes", "Peak RSS of the most recently reporting analysis worker.")
+api_rss_metric = metrics.gauge("process_resident_memory_bytes", "Resident memory of this API process.")
+cache_hit_rate_metric = metrics.gauge("cache_hit_ratio", "Hit rate of the in-process and shared caches.", ("cache",))
 
-# --- Application State (In-Memory) ---
-analysis_status_store = {} # task_id -> "pending" | "processing" | "complete" | "error"
-analysis_results_store = {} # task_id -> results_dict
+def record_analysis_metrics(task_id, results):
+    # Observes a finished result's timings and attaches the queue wait to its metrics
+    task_metrics = results.setdefault("metrics", {})
+    task = task_store.get(task_id)
+    if task and task["started_at"]:
+        task_metrics["queueSeconds"] = round(task["started_at"] - task["created_at"], 3)
+        queue_seconds_metric.observe(task_metrics["queueSeconds"])
+    for stage, seconds in (task_metrics.get("stageSeconds") or {}).items():
+        stage_seconds_metric.observe(seconds, stage=stage)
+    if task_metrics.get("totalSeconds") is not None: analysis_seconds_metric.observe(task_metrics["totalSeconds"])
+    if task_metrics.get("realTimeFactor") is not None: real_time_factor_metric.observe(task_metrics["realTimeFactor"])
+    analysis_audio_seconds_metric.inc(results.get("audioDuration") or 0)
+    vad = task_metrics.get("vad")
+    if vad:
+        analysis_speech_seconds_metric.inc(vad["speechSeconds"])
+        vad_skipped_metric.observe(vad["skippedFraction"])
+    for model, seconds in (task_metrics.get("modelLoadSeconds") or {}).items():
+        model_load_metric.set(seconds, model=model)
+    if task_metrics.get("workerPeakRssBytes"): worker_rss_metric.set(task_metrics["workerPeakRssBytes"])
 
 # --- FastAPI App Setup ---
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     print("FastAPI application startup...")
+    migrated = get_call_store().migrate_json(HISTORY_FILE, DATA_FILE)
+    if migrated: print(f"INFO: Imported {migrated} legacy JSON record(s) into the call store.")
+    indexed = storage_index.backfill(UPLOAD_DIR)
+    if indexed: print(f"INFO: Indexed {indexed} existing upload(s) for storage management.")
+    janitor_task = asyncio.create_task(storage_janitor_loop()) # also purges expired tasks and upload sessions, now and every interval
     if models_loaded:
-        print("INFO: Models seem to have loaded based on import/load call.")
+        print(f"INFO: Starting {ANALYSIS_WORKERS} analysis worker process(es); models load inside each worker.")
+        task_store.register_owner(QUEUE_OWNER)
+        siblings = [o for o in task_store.live_owners(QUEUE_OWNER_STALE_S, socket.gethostname()) if o["owner"] != QUEUE_OWNER]
+        if siblings:
+            print(f"Warning: {len(siblings)} other API process(es) on this host (pid {', '.join(str(o['pid']) for o in siblings)}) "
+                  f"also run an analysis queue. Each starts its own {ANALYSIS_WORKERS} worker(s) with every model loaded and "
+                  f"enforces its own ANALYSIS_QUEUE_DEPTH; run one API process per host to share one queue.")
+        analysis_queue.start()
     else:
-        print("CRITICAL WARNING: Model loading failed during startup. Analysis endpoints will return errors.")
+        print("CRITICAL WARNING: Analysis pipeline import failed during startup. Analysis endpoints will return errors.")
+    # Jobs held in the memory of an earlier run are gone: batch tasks go back to the backlog, the rest fail
+    reconciled = task_store.reconcile_orphans(QUEUE_OWNER_STALE_S)
+    if reconciled["failed"]: print(f"Warning: {reconciled['failed']} task(s) interrupted by a restart were marked as failed.")
+    if reconciled["requeued"]: print(f"INFO: {reconciled['requeued']} interrupted batch task(s) returned to the backlog.")
+    if models_loaded: feed_batch_backlog() # batch tasks still waiting from an earlier run
+    owner_task = asyncio.create_task(queue_owner_loop())
     yield
+    janitor_task.cancel()
+    owner_task.cancel()
+    analysis_queue.close()
+    if models_loaded: task_store.remove_owner(QUEUE_OWNER) # jobs still queued here are settled by the next reconcile
+    call_store_writer.flush()
     print("FastAPI application shutdown.")
 
 app = FastAPI(lifespan=lifespan, title="Customer Call Analyzer API")
@@ -83,115 +255,479 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# /upload and /batches parse their bodies as they stream and cap them there; this answers 413 from the
+# Content-Length alone, before a single byte of a declared-oversized body is read
+app.add_middleware(UploadSizeLimitMiddleware, max_bytes=UPLOAD_MAX_BYTES + UPLOAD_CHUNK_BYTES, paths=("/upload",))
+app.add_middleware(UploadSizeLimitMiddleware, max_bytes=BULK_UPLOAD_MAX_BYTES, paths=("/batches",))
+
+# --- Analysis Queue ---
+# Callbacks run in the API process when a worker picks up, finishes or drops a job
+def on_analysis_start(task_id: str):
+    print(f"Analysis task {task_id} picked up by a worker.")
+    task_store.transition(task_id, "processing")
+
+def on_analysis_done(task_id: str, results, error):
+    cache_key = pending_cache_keys.pop(task_id, None)
+    if error:
+        print(f"Unhandled exception in analysis worker for task {task_id}: {error}")
+        task = task_store.get(task_id)
+        original_filename = task["file_name"] if task else None
+        task_store.transition(task_id, "error", {"error": f"Unhandled analysis worker exception: {error}", "taskId": task_id, "fileName": original_filename})
+        tasks_metric.inc(outcome="error")
+        after_analysis()
+        return
+    store_records = results.pop("storeRecords", None)
+    if store_records:
+        # Bulk analyses leave the call-store writes to this process, which commits them in batches; the task
+        # only completes once its records are committed, so a crash before the flush can't lose them silently
+        try:
+            call_store_writer.add(store_records["call"], store_records["transcription"], store_records["call"]["timestamp"],
+                                  on_commit=lambda: finish_analysis(task_id, results, cache_key))
+        except Exception as e:
+            print(f"Warning: could not save call records of task {task_id}: {e}")
+    else:
+        finish_analysis(task_id, results, cache_key)
+    after_analysis()
+
+def finish_analysis(task_id, results, cache_key):
+    record_analysis_metrics(task_id, results)
+    tasks_metric.inc(outcome="error" if results.get("error") else "complete")
+    if results.get("error"):
+         task_store.transition(task_id, "error", results)
+         print(f"Analysis task {task_id} completed with error: {results['error']}")
+    else:
+        task_store.transition(task_id, "complete", results)
+        print(f"Analysis task {task_id} completed successfully.")
+        if cache_key:
+            try:
+                result_cache.put(cache_key, task_id, results)
+            except Exception as e:
+                print(f"Warning: could not cache result of task {task_id}: {e}")
 
-# --- Background Task Runner ---
-def run_analysis_background(task_id: str, file_path: str, original_filename: str):
-    global analysis_status_store, analysis_results_store
-    print(f"Background task started for task_id: {task_id}, file: {original_filename}")
-    if not models_loaded:
-        print(f"Error: Cannot run analysis for task {task_id}, models not loaded.")
-        analysis_status_store[task_id] = "error"
-        analysis_results_store[task_id] = {"error": "Backend models unavailable.", "taskId": task_id, "fileName": original_filename}
-        return # Exit early if models aren't ready
-
-    analysis_status_store[task_id] = "processing"
+def on_analysis_cancelled(task_id: str):
+    print(f"Analysis task {task_id} cancelled.")
+    tasks_metric.inc(outcome="cancelled")
+    pending_cache_keys.pop(task_id, None)
+    task_store.transition(task_id, "cancelled")
+    after_analysis()
+
+def feed_batch_backlog():
+    # Tops the job queue up with waiting batch tasks (shared backlog in the task store, any API process may claim)
+    with batch_feed_lock:
+        room = BULK_QUEUE_SLOTS - analysis_queue.stats()["queueDepth"]
+        if room <= 0 or not analysis_queue.healthy(): return
+        for job in task_store.claim_batch_tasks(room, QUEUE_OWNER):
+            try:
+                analysis_queue.submit(job["task_id"], args=tuple(job["args"]), kwargs=job["kwargs"], priority=job["priority"])
+            except QueueFullError:
+                task_store.release_batch_task(job["task_id"])
+                break
+            if job.get("cacheKey"): pending_cache_keys[job["task_id"]] = job["cacheKey"]
+
+def after_analysis():
+    # Runs on the queue's dispatcher thread once a worker slot frees up
     try:
-        # Call the main analysis function, passing the path to the saved file
-        results = analyze_audio(file_path, task_id, original_filename)
-        analysis_results_store[task_id] = results
-        if results.get("error"):
-             analysis_status_store[task_id] = "error"
-             print(f"Analysis task {task_id} completed with error: {results['error']}")
-        else:
-            analysis_status_store[task_id] = "complete"
-            print(f"Analysis task {task_id} completed successfully.")
+        feed_batch_backlog()
+        queue_stats = analysis_queue.stats()
+        if queue_stats["queueDepth"] == 0 and queue_stats["inFlight"] == 0:
+            call_store_writer.flush() # idle: don't leave bulk records waiting for a full batch
     except Exception as e:
-        print(f"Unhandled exception in background task {task_id}: {e}")
-        traceback.print_exc()
-        analysis_status_store[task_id] = "error"
-        analysis_results_store[task_id] = {"error": f"Unhandled background task exception: {e}", "taskId": task_id, "fileName": original_filename}
-    # Consider cleanup of original file here or via separate mechanism
+        print(f"Warning: batch bookkeeping failed: {e}")
+
+analysis_queue = AnalysisJobQueue(
+    load_models, analyze_audio,
+    num_workers=ANALYSIS_WORKERS, max_depth=ANALYSIS_QUEUE_DEPTH,
+    on_start=on_analysis_start, on_done=on_analysis_done, on_cancel=on_analysis_cancelled,
+    # Cancels recorded by another API worker process reach this queue through the shared store
+    is_cancelled=lambda task_id: task_store.get_status(task_id) == "cancelled",
+)
 
 # --- Historical Data ---
-def load_historical_data(timeframe="last_7_days"):
-    if not HISTORY_FILE.exists():
-        return []
-    with open(HISTORY_FILE, "r") as f:
-        history = json.load(f)
-    cutoff = {
-        "last_24_hours": datetime.now(timezone.utc) - timedelta(days=1),
-        "last_7_days": datetime.now(timezone.utc) - timedelta(days=7),
-        "last_30_days": datetime.now(timezone.utc) - timedelta(days=30),
-        "last_90_days": datetime.now(timezone.utc) - timedelta(days=90),
-        "all_time": datetime.min
-    }.get(timeframe, datetime.now(timezone.utc) - timedelta(days=7))
-    # Filter by timeframe
-    filtered = [
-        entry["transcription"]
-        for entry in history
-        if datetime.fromisoformat(entry["timestamp"]) >= cutoff
-    ]
-    return filtered
+def load_historical_data(timeframe=DEFAULT_TIMEFRAME, start=None, end=None):
+    # Range query on the call store's timestamp index; cost depends on the window, not on total history
+    start_ms, end_ms = resolve_time_range(timeframe, start, end)
+    return get_call_store().load_transcriptions(start_ms, end_ms)
+
+def get_historical_word_cloud(timeframe, start, end, start_ms, end_ms):
+    # Rolling windows are keyed by name, explicit ranges by their bounds; the version only changes
+    # when a call lands in (or ages out of) the window, so repeated requests reuse the rendered PNG
+    store = get_call_store()
+    window_key = (start_ms, end_ms) if (start or end) else timeframe
+    cache_key = (window_key, store.transcriptions_version(start_ms, end_ms))
+    cached = historical_word_cloud_cache.get(cache_key)
+    if cached is not None: return cached
+    image = generate_word_cloud_from_frequencies(store.word_frequencies(start_ms, end_ms))
+    historical_word_cloud_cache.put(cache_key, image)
+    return image
 
 class UserMessage(BaseModel):
     message: str
 
 def load_call_data():
-    with open(DATA_FILE, "r") as f:
-        return json.load(f)
+    return get_call_store().load_calls()
+
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
 
 # --- API Endpoints ---
 @app.get("/")
 async def read_root():
     return {"message": "Welcome to the Customer Call Analyzer API"}
 
-@app.post("/upload")
-async def upload_audio_for_analysis(
-    background_tasks: BackgroundTasks,
-    file: UploadFile = File(...)
-):
-    if not models_loaded:
+def check_analysis_available(priority):
+    if priority not in PRIORITIES:
+         raise HTTPException(status_code=400, detail=f"Invalid priority. Allowed: {', '.join(PRIORITIES)}")
+    if not models_loaded or not analysis_queue.healthy():
          # Return 503 Service Unavailable if models aren't ready
          raise HTTPException(status_code=503, detail="Backend models unavailable. Cannot process uploads.")
 
+def check_upload_request(filename, priority):
+    # Returns the lower-case extension of an acceptable upload, or raises the matching HTTP error
+    check_analysis_available(priority)
+    file_extension = os.path.splitext(filename)[1].lower() # Use lower case extension
+    if file_extension not in ALLOWED_EXTENSIONS:
+         raise HTTPException(status_code=400, detail=f"Invalid file type. Allowed types: {', '.join(ALLOWED_EXTENSIONS)}")
+    return file_extension
+
+def start_analysis_sync(task_id, file_path, original_filename, upload_info, priority, batch_id=None):
+    # Answers from the result cache when the same content was analyzed before, otherwise queues the analysis
+    # (batch tasks go to the batch backlog instead, see feed_batch_backlog)
+    saved_filename = os.path.basename(file_path)
+    cache_key = result_cache_key(upload_info["sha256"], ANALYSIS_FINGERPRINT) if ANALYSIS_FINGERPRINT else None
+    cached = result_cache.get(cache_key) if cache_key else None
+    task_store.create(task_id, original_filename, owner=QUEUE_OWNER)
+    storage_index.register(task_id, file_path, upload_info["bytes"])
+    if cached:
+        # Same audio, same models and options: reuse the result; segments render lazily from this task's upload
+        source_task_id, result = cached
+        result = retarget_result(result, source_task_id, task_id, original_filename, saved_filename)
+        result["metrics"] = {"resultCache": {"hit": True, "sourceTaskId": source_task_id}}
+        task_store.transition(task_id, "processing")
+        task_store.transition(task_id, "complete", result)
+        tasks_metric.inc(outcome="cached")
+        if batch_id: task_store.add_batch_task(batch_id, task_id)
+        print(f"Analysis task {task_id} answered from the result cache (same content as task {source_task_id}).")
+        return {"message": "File uploaded successfully, analysis reused from an identical upload.", "task_id": task_id,
+                "filename": original_filename, "audio": upload_info["audio"], "cached": True}
+
+    if batch_id:
+        # Bulk analyses hand their call records back for batched commits (see on_analysis_done)
+        job = {"args": [file_path, task_id, original_filename], "kwargs": {"event_db_path": TASK_DB_PATH, "persist": False},
+               "priority": priority, "cacheKey": cache_key}
+        task_store.add_batch_task(batch_id, task_id, job)
+        return {"task_id": task_id, "filename": original_filename, "audio": upload_info["audio"]}
+
+    if cache_key: pending_cache_keys[task_id] = cache_key
+    try:
+        analysis_queue.submit(task_id, args=(file_path, task_id, original_filename),
+                              kwargs={"event_db_path": TASK_DB_PATH}, priority=priority)
+    except QueueFullError as e:
+        pending_cache_keys.pop(task_id, None)
+        task_store.delete(task_id)
+        storage_index.remove(task_id)
+        os.remove(file_path)
+        raise HTTPException(status_code=429, detail="Analysis queue is full. Try again later.", headers={"Retry-After": str(e.retry_after)})
+    print(f"Analysis task {task_id} queued ({priority}) for file: {original_filename}")
+
+    return {"message": "File uploaded successfully, analysis started.", "task_id": task_id,
+            "filename": original_filename, "audio": upload_info["audio"]}
+
+async def start_analysis(task_id, file_path, original_filename, upload_info, priority):
+    return await run_in_threadpool(start_analysis_sync, task_id, file_path, original_filename, upload_info, priority)
+
+@app.post("/upload", openapi_extra={"requestBody": {"required": True, "content": {"multipart/form-data": {"schema": {
+    "type": "object", "required": ["file"], "properties": {"file": {"type": "string", "format": "binary"}}}}}}})
+async def upload_audio_for_analysis(request: Request, priority: str = "interactive"):
+    # The multipart body is parsed as it streams in (no spooled temp copy), so the size cap and the
+    # format probe apply from the first chunk even when the client sent no Content-Length
+    check_analysis_available(priority)
     task_id = str(uuid.uuid4())
-    original_filename = file.filename if file.filename else "audio_upload"
-    file_extension = os.path.splitext(original_filename)[1].lower() # Use lower case extension
-    # Basic check for common audio extensions (can be improved)
-    allowed_extensions = ['.wav', '.mp3', '.ogg', '.flac', '.m4a', '.aac']
-    if file_extension not in allowed_extensions:
-         raise HTTPException(status_code=400, detail=f"Invalid file type. Allowed types: {', '.join(allowed_extensions)}")
+    original_filename = None
 
-    saved_filename = f"{task_id}{file_extension}" # File saved on disk
-    file_path = os.path.join(UPLOAD_DIR, saved_filename)
+    def open_writer(filename):
+        nonlocal original_filename
+        original_filename = filename or "audio_upload"
+        file_extension = check_upload_request(original_filename, priority)
+        return StreamingUpload(os.path.join(UPLOAD_DIR, f"{task_id}{file_extension}"), UPLOAD_MAX_BYTES, UPLOAD_MAX_DURATION_S)
 
+    receiver = None
     try:
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-        print(f"File '{original_filename}' saved as '{saved_filename}'")
+        receiver = MultipartFileReceiver(request.headers.get("content-type"), open_writer)
+        # Hash and probe while copying, so duplicate detection and validation cost no second pass over the file
+        async for chunk in request.stream():
+            if chunk: receiver.feed(chunk)
+        upload = receiver.finish()
+        upload_info = upload.finish()
+        print(f"File '{original_filename}' saved as '{os.path.basename(upload.path)}' ({upload_info['bytes']} bytes, {upload_info['audio']})")
+    except UploadRejected as e:
+        if receiver and receiver.writer: receiver.writer.abort()
+        print(f"Warning: rejected upload '{original_filename}': {e.detail}")
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    except HTTPException:
+        if receiver and receiver.writer: receiver.writer.abort()
+        raise
     except Exception as e:
+        if receiver and receiver.writer: receiver.writer.abort()
         raise HTTPException(status_code=500, detail=f"Could not save uploaded file: {e}")
-    finally:
-        await file.close()
 
-    analysis_status_store[task_id] = "pending"
-    analysis_results_store[task_id] = None
-    background_tasks.add_task(run_analysis_background, task_id, file_path, original_filename)
-    print(f"Analysis task {task_id} queued for file: {original_filename}")
+    return await start_analysis(task_id, upload.path, original_filename, upload_info, priority)
+
+# --- Resumable Uploads ---
+# POST /uploads opens a session, PUT /uploads/{id}?offset=N appends the raw request body at N,
+# GET /uploads/{id} reports the offset to resume from, POST /uploads/{id}/complete starts the analysis.
+class UploadSessionRequest(BaseModel):
+    fileName: str
+    size: Optional[int] = None # total bytes, if known up front
+    priority: str = "interactive"
+
+def upload_session_path(upload_id, extension):
+    return os.path.join(UPLOAD_DIR, f"{upload_id}{extension}")
+
+def get_upload_session(upload_id):
+    session = upload_sessions.get(upload_id)
+    if not session: raise HTTPException(status_code=404, detail="Upload session not found")
+    return session
+
+def upload_session_offset(session):
+    part_path = upload_session_path(session["upload_id"], session["extension"]) + ".part"
+    return os.path.getsize(part_path) if os.path.exists(part_path) else 0
+
+async def get_upload_writer(session):
+    # Reuses this process's open writer; rebuilds it from the .part file when another process wrote since
+    # (off the event loop: resuming rehashes everything received so far)
+    upload_id = session["upload_id"]
+    writer = upload_writers.get(upload_id)
+    if writer is None or writer.received != upload_session_offset(session):
+        if writer: writer.close()
+        writer = await run_in_threadpool(StreamingUpload, upload_session_path(upload_id, session["extension"]), UPLOAD_MAX_BYTES,
+                                         UPLOAD_MAX_DURATION_S, expected_bytes=session["expected_bytes"], resume=True)
+        upload_writers[upload_id] = writer
+    return writer
+
+def discard_upload_session(upload_id, extension):
+    writer = upload_writers.pop(upload_id, None)
+    upload_locks.pop(upload_id, None)
+    if writer: writer.abort()
+    else:
+        part_path = upload_session_path(upload_id, extension) + ".part"
+        if os.path.exists(part_path): os.remove(part_path)
+    upload_sessions.delete(upload_id)
+
+def purge_stale_upload_sessions():
+    stale = upload_sessions.stale(UPLOAD_SESSION_TTL_S)
+    for session in stale:
+        discard_upload_session(session["upload_id"], session["extension"])
+    # Writers of sessions another process already purged, completed or aborted
+    for upload_id in [upload_id for upload_id in upload_writers if not upload_sessions.get(upload_id)]:
+        upload_writers.pop(upload_id).close()
+        upload_locks.pop(upload_id, None)
+    return len(stale)
+
+def upload_session_status(session, writer=None):
+    offset = writer.received if writer else upload_session_offset(session)
+    return {"upload_id": session["upload_id"], "fileName": session["file_name"], "offset": offset,
+            "size": session["expected_bytes"], "audio": writer.audio if writer else None,
+            "expiresAt": session["updated_at"] + UPLOAD_SESSION_TTL_S}
+
+@app.post("/uploads", status_code=201)
+async def create_upload_session(request: UploadSessionRequest):
+    extension = check_upload_request(request.fileName, request.priority)
+    if request.size is not None and not 0 < request.size <= UPLOAD_MAX_BYTES:
+        raise HTTPException(status_code=413, detail=f"File exceeds the {UPLOAD_MAX_BYTES // (1024 * 1024)} MB upload limit.")
+    upload_id = str(uuid.uuid4())
+    upload_sessions.create(upload_id, request.fileName, extension, request.size, {"priority": request.priority})
+    print(f"Upload session {upload_id} opened for '{request.fileName}' ({request.size or 'unknown'} bytes)")
+    return {**upload_session_status(get_upload_session(upload_id)), "chunkSize": UPLOAD_CHUNK_BYTES * 8}
+
+@app.get("/uploads/{upload_id}")
+async def get_upload_session_status(upload_id: str):
+    session = get_upload_session(upload_id)
+    return upload_session_status(session, upload_writers.get(upload_id))
+
+@app.put("/uploads/{upload_id}")
+async def append_upload_chunk(upload_id: str, offset: int, request: Request):
+    session = get_upload_session(upload_id)
+    async with upload_locks.setdefault(upload_id, asyncio.Lock()):
+        writer = await get_upload_writer(session)
+        if offset != writer.received:
+            # Client and server disagree (lost response, retried chunk): tell the client where to resume
+            raise HTTPException(status_code=409, detail=f"Upload is at offset {writer.received}", headers={"Upload-Offset": str(writer.received)})
+        try:
+            async for chunk in request.stream():
+                if chunk: writer.write(chunk)
+        except UploadRejected as e:
+            discard_upload_session(upload_id, session["extension"])
+            print(f"Warning: rejected upload session {upload_id} ('{session['file_name']}'): {e.detail}")
+            raise HTTPException(status_code=e.status_code, detail=e.detail)
+        finally:
+            writer.flush()
+        upload_sessions.touch(upload_id)
+        return {"upload_id": upload_id, "offset": writer.received, "audio": writer.audio}
+
+@app.post("/uploads/{upload_id}/complete")
+async def complete_upload_session(upload_id: str):
+    session = get_upload_session(upload_id)
+    check_upload_request(session["file_name"], session["options"]["priority"])
+    async with upload_locks.setdefault(upload_id, asyncio.Lock()):
+        writer = await get_upload_writer(session)
+        try:
+            upload_info = writer.finish()
+        except UploadRejected as e:
+            if e.status_code != 400: discard_upload_session(upload_id, session["extension"]) # 400: incomplete, can resume
+            raise HTTPException(status_code=e.status_code, detail=e.detail)
+        upload_writers.pop(upload_id, None)
+        upload_locks.pop(upload_id, None)
+        upload_sessions.delete(upload_id)
+    print(f"Upload session {upload_id} complete: '{session['file_name']}' ({upload_info['bytes']} bytes, {upload_info['audio']})")
+    # The session id becomes the task id, so the upload is already saved as <task_id><ext>
+    return await start_analysis(upload_id, writer.path, session["file_name"], upload_info, session["options"]["priority"])
 
-    return {"message": "File uploaded successfully, analysis started.", "task_id": task_id, "filename": original_filename}
+@app.delete("/uploads/{upload_id}")
+async def abort_upload_session(upload_id: str):
+    session = get_upload_session(upload_id)
+    discard_upload_session(upload_id, session["extension"])
+    return {"upload_id": upload_id, "status": "aborted"}
+
+# --- Bulk Uploads ---
+def open_batch_recording(name, state):
+    # (task_id, StreamingUpload) for the next recording of a batch; None once the batch is full
+    if state["accepted"] >= BULK_MAX_FILES:
+        if not state["limitReached"]:
+            state["rejected"].append({"file": name, "error": f"Batch limit of {BULK_MAX_FILES} recordings reached; remaining files skipped."})
+            state["limitReached"] = True
+        return None
+    file_extension = os.path.splitext(name)[1].lower()
+    if file_extension not in ALLOWED_EXTENSIONS: raise UploadRejected(400, "Not an audio file type")
+    task_id = str(uuid.uuid4())
+    return task_id, StreamingUpload(os.path.join(UPLOAD_DIR, f"{task_id}{file_extension}"), UPLOAD_MAX_BYTES, UPLOAD_MAX_DURATION_S)
+
+def finish_batch_recording(batch_id, task_id, name, upload, priority, state):
+    upload_info = upload.finish()
+    response = start_analysis_sync(task_id, upload.path, os.path.basename(name), upload_info, priority, batch_id=batch_id)
+    state["accepted"] += 1
+    state["cached"] += bool(response.get("cached"))
+    if state["accepted"] % 10 == 0: feed_batch_backlog() # start analyzing while the body is still arriving
+
+def ingest_archive(batch_id, name, fileobj, priority, state):
+    # Expands a zip/tar archive member by member (streamed, never fully extracted to disk), one task per recording
+    try:
+        for member_name, stream in iter_archive_members(fileobj, name):
+            recording_name = f"{name}/{member_name}"
+            try:
+                opened = open_batch_recording(recording_name, state)
+            except UploadRejected as e:
+                state["rejected"].append({"file": recording_name, "error": e.detail})
+                continue
+            if opened is None: break
+            task_id, upload = opened
+            try:
+                while chunk := stream.read(UPLOAD_CHUNK_BYTES):
+                    upload.write(chunk)
+                finish_batch_recording(batch_id, task_id, recording_name, upload, priority, state)
+            except UploadRejected as e:
+                upload.abort()
+                state["rejected"].append({"file": recording_name, "error": e.detail})
+            except Exception as e:
+                upload.abort()
+                state["rejected"].append({"file": recording_name, "error": f"Could not save file: {e}"})
+    except (zipfile.BadZipFile, tarfile.TarError, EOFError) as e:
+        state["rejected"].append({"file": name, "error": f"Unreadable archive: {e}"})
+
+def batch_receiver(batch_id, content_type, priority, state):
+    # Multipart receiver for /batches: plain recordings stream straight into their StreamingUpload (per-file cap and
+    # probing from the first chunk) and are queued as their part ends; archives are spooled to a temporary file,
+    # since zip keeps its index at the end, and expanded as soon as their part is complete
+    parts = {} # id(writer) -> (recording name, task_id or None for archives)
+
+    def open_writer(filename):
+        name = filename or "audio_upload"
+        state["sources"].append(name)
+        if is_archive(name):
+            spool = tempfile.TemporaryFile(dir=UPLOAD_DIR)
+            parts[id(spool)] = (name, None)
+            return spool
+        opened = open_batch_recording(name, state)
+        if opened is None: return None
+        task_id, upload = opened
+        parts[id(upload)] = (name, task_id)
+        return upload
+
+    def on_file_end(writer):
+        name, task_id = parts.pop(id(writer))
+        if task_id is None:
+            with writer:
+                writer.seek(0)
+                ingest_archive(batch_id, name, writer, priority, state)
+        else:
+            finish_batch_recording(batch_id, task_id, name, writer, priority, state)
+
+    return MultipartFileReceiver(content_type, open_writer, field="files", on_file_end=on_file_end)
+
+@app.post("/batches", status_code=202, openapi_extra={"requestBody": {"required": True, "content": {"multipart/form-data": {"schema": {
+    "type": "object", "required": ["files"],
+    "properties": {"files": {"type": "array", "items": {"type": "string", "format": "binary"}}}}}}}})
+async def upload_batch_for_analysis(request: Request, priority: str = "bulk"):
+    # The body is parsed as it streams in (no spooled copy of the whole request): recordings are capped and probed
+    # while written, and the request as a whole is held to BULK_UPLOAD_MAX_BYTES even without a Content-Length
+    check_analysis_available(priority)
+    batch_id = str(uuid.uuid4())
+    state = {"accepted": 0, "cached": 0, "rejected": [], "sources": [], "limitReached": False}
+    try:
+        receiver = batch_receiver(batch_id, request.headers.get("content-type"), priority, state)
+    except UploadRejected as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    await run_in_threadpool(task_store.create_batch, batch_id)
+    received, buffered = 0, bytearray()
+    try:
+        # Parsing (and the ingest work it triggers) runs off the event loop, a megabyte at a time
+        async for chunk in request.stream():
+            received += len(chunk)
+            if received > BULK_UPLOAD_MAX_BYTES:
+                raise UploadRejected(413, f"Request exceeds the {BULK_UPLOAD_MAX_BYTES // (1024 * 1024)} MB upload limit.")
+            buffered += chunk
+            if len(buffered) >= UPLOAD_CHUNK_BYTES:
+                await run_in_threadpool(receiver.feed, bytes(buffered))
+                buffered.clear()
+        if buffered: await run_in_threadpool(receiver.feed, bytes(buffered))
+        await run_in_threadpool(receiver.finish)
+    except Exception as e:
+        # Recordings queued so far keep running; the batch must still leave the ingesting state
+        for writer in receiver.writers:
+            if hasattr(writer, "abort"): writer.abort() # no-op for recordings already finished
+            else: writer.close()
+        detail = e.detail if isinstance(e, UploadRejected) else f"{type(e).__name__}: {e}"
+        source = ", ".join(state["sources"]) or None
+        rejected = state["rejected"] + receiver.rejected + [{"file": source, "error": f"Batch ingestion failed: {detail}"}]
+        await run_in_threadpool(task_store.finish_batch_ingest, batch_id, rejected, source)
+        print(f"ERROR: Batch {batch_id} ingestion failed: {detail}")
+        await run_in_threadpool(feed_batch_backlog)
+        queued = f"; {state['accepted']} recording(s) were queued before the failure, see /batches/{batch_id}" if state["accepted"] else ""
+        raise HTTPException(status_code=e.status_code if isinstance(e, UploadRejected) else 500, detail=f"Batch ingestion failed: {detail}{queued}")
+    source = ", ".join(state["sources"])
+    rejected = state["rejected"] + receiver.rejected
+    await run_in_threadpool(task_store.finish_batch_ingest, batch_id, rejected, source)
+    await run_in_threadpool(feed_batch_backlog)
+    print(f"Batch {batch_id}: {state['accepted']} recording(s) accepted ({state['cached']} from the result cache), {len(rejected)} rejected, from {source}")
+    return {"batch_id": batch_id, "accepted": state["accepted"], "cached": state["cached"], "rejected": rejected,
+            "status_url": f"/batches/{batch_id}"}
+
+@app.get("/batches/{batch_id}")
+async def get_batch_progress(batch_id: str, tasks: bool = True):
+    progress = await run_in_threadpool(task_store.batch_progress, batch_id, tasks)
+    if not progress: raise HTTPException(status_code=404, detail="Batch ID not found")
+    return progress
 
 @app.get("/status/{task_id}")
 async def get_analysis_status(task_id: str):
-    status = analysis_status_store.get(task_id)
+    status = await run_in_threadpool(task_store.get_status, task_id)
     if not status: raise HTTPException(status_code=404, detail="Task ID not found")
     return {"task_id": task_id, "status": status}
 
 @app.get("/analysis/{task_id}")
 async def get_analysis_result(task_id: str):
-    status = analysis_status_store.get(task_id)
-    result = analysis_results_store.get(task_id)
-    if not status: raise HTTPException(status_code=404, detail="Task ID not found")
+    task = task_store.get(task_id)
+    if not task: raise HTTPException(status_code=404, detail="Task ID not found")
+    status, result = task["status"], task["result"] or {}
 
     if status == "complete":
         if result and not result.get("error"): return result
@@ -201,96 +737,277 @@ async def get_analysis_result(task_id: str):
     elif status in ["pending", "processing"]:
         # Return 200 OK with status, frontend handles polling
         return {"task_id": task_id, "status": status, "message": "Analysis in progress."}
+    elif status == "cancelled":
+        raise HTTPException(status_code=410, detail="Analysis was cancelled.")
     else:
          raise HTTPException(status_code=500, detail=f"Internal error: Invalid status '{status}'")
 
+@app.get("/analysis/{task_id}/emotions")
+async def get_emotions_in_window(task_id: str, start: float = 0.0, end: float = None, speaker: str = None):
+    # Each speaker's speech/text emotion between start and end (seconds), without sending the full timelines;
+    # end == start asks for the emotions at that instant
+    index = emotion_index_cache.get(task_id)
+    if index is None:
+        task = await run_in_threadpool(task_store.get, task_id)
+        if not task: raise HTTPException(status_code=404, detail="Task ID not found")
+        if task["status"] != "complete":
+            raise HTTPException(status_code=409, detail=f"Task {task_id} is '{task['status']}'; emotions are available once it is complete")
+        result = task["result"] or {}
+        index = EmotionTimelineIndex(result.get("speechEmotionTimeline"), result.get("textEmotionTimeline"), result.get("audioDuration") or 0.0)
+        emotion_index_cache.put(task_id, index)
+    end = index.duration if end is None else end
+    if start < 0 or end < start:
+        raise HTTPException(status_code=400, detail="Expected 0 <= start <= end")
+    return {"task_id": task_id, "start": start, "end": end, "speaker": speaker, **index.window(start, end, speaker)}
+
+@app.get("/events/{task_id}")
+async def stream_analysis_events(task_id: str, request: Request):
+    """Server-Sent Events for a task: `status`, `stage`, `progress` and `partial` events as they happen.
+
+    Replays the task's history first (or resumes after the Last-Event-ID header) and ends after
+    the terminal status event, at which point the full result is available from /analysis.
+    """
+    if not await run_in_threadpool(task_store.get_status, task_id):
+        raise HTTPException(status_code=404, detail="Task ID not found")
+    try:
+        last_id = int(request.headers.get("last-event-id", "0"))
+    except ValueError:
+        last_id = 0
+
+    async def events():
+        nonlocal last_id
+        idle_s, poll_s, finished = 0.0, TASK_EVENT_POLL_S, False
+        while not await request.is_disconnected():
+            batch = await run_in_threadpool(task_store.events_since, task_id, last_id)
+            for event in batch:
+                last_id = event["id"]
+                yield f"id: {event['id']}\nevent: {event['event']}\ndata: {json.dumps(event['data'])}\n\n"
+                if event["event"] == "status" and event["data"]["status"] in TERMINAL_STATUSES: return
+            if batch:
+                idle_s, poll_s = 0.0, TASK_EVENT_POLL_S
+                continue
+            status = await run_in_threadpool(task_store.get_status, task_id)
+            if status in TERMINAL_STATUSES and not finished:
+                finished = True # read once more: the terminal event may have landed after the read above
+                continue
+            if not status or status in TERMINAL_STATUSES:
+                # Expired, or finished long enough ago that its events were purged
+                yield sse_event("status", {"status": status or "expired"})
+                return
+            await asyncio.sleep(poll_s)
+            idle_s += poll_s
+            poll_s = min(poll_s * 1.5, TASK_EVENT_MAX_POLL_S) # long stages (ASR, diarization) emit rarely
+            if idle_s >= TASK_EVENT_KEEPALIVE_S:
+                idle_s = 0.0
+                yield ": keep-alive\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.post("/cancel/{task_id}")
+async def cancel_analysis(task_id: str):
+    status = await run_in_threadpool(task_store.get_status, task_id)
+    if not status: raise HTTPException(status_code=404, detail="Task ID not found")
+    if status not in ["pending", "processing"]:
+        raise HTTPException(status_code=409, detail=f"Task {task_id} is '{status}' and can no longer be cancelled")
+    if not await run_in_threadpool(analysis_queue.cancel, task_id): # its on_cancel writes the store
+        # Queued by another API worker process: record the cancel, its queue picks it up from the store
+        await run_in_threadpool(task_store.transition, task_id, "cancelled")
+    return {"task_id": task_id, "status": "cancelled"}
+
+def find_upload_path(task_id: str):
+    # Original upload (<task_id><ext>) from the storage index instead of scanning the upload directory
+    path = storage_index.path(task_id)
+    return path if path and os.path.exists(path) else None
+
+def evict_task_artifacts(task_id, upload_path):
+    # Rendered segments and the original upload; the task's result stays until its own TTL
+    segment_cache.drop_task(task_id)
+    segment_dir = os.path.join(SEGMENT_BASE_DIR, task_id)
+    if os.path.isdir(segment_dir): shutil.rmtree(segment_dir)
+    if upload_path and os.path.exists(upload_path): os.remove(upload_path)
+    print(f"Evicted stored audio of task {task_id}")
+
+storage_janitor = StorageJanitor(
+    storage_index, STORAGE_RETENTION_S, STORAGE_QUOTA_BYTES,
+    segment_bytes=segment_cache.task_bytes, task_statuses=task_store.statuses, evict=evict_task_artifacts,
+)
+
+async def storage_janitor_loop():
+    while True:
+        try:
+            # Expired tasks first, so the sweep below reclaims their files right away
+            purged = await run_in_threadpool(task_store.purge_expired)
+            if purged: print(f"INFO: Purged {purged} expired task(s) from the task store.")
+        except Exception as e:
+            print(f"Warning: task store purge failed: {e}")
+        try:
+            # On the event loop: it closes writers the upload endpoints share
+            abandoned = purge_stale_upload_sessions()
+            if abandoned: print(f"INFO: Removed {abandoned} abandoned upload session(s).")
+        except Exception as e:
+            print(f"Warning: upload session purge failed: {e}")
+        try:
+            sweep = await run_in_threadpool(storage_janitor.sweep)
+            if sweep["evictedTasks"]:
+                print(f"INFO: Storage janitor evicted {sweep['evictedTasks']} task(s), freed {sweep['freedBytes'] / 2**20:.1f} MiB.")
+        except Exception as e:
+            print(f"Warning: storage sweep failed: {e}")
+        await asyncio.sleep(STORAGE_SWEEP_INTERVAL_S)
+
+async def queue_owner_loop():
+    while True:
+        await asyncio.sleep(QUEUE_HEARTBEAT_S)
+        try:
+            if models_loaded: await run_in_threadpool(task_store.heartbeat, QUEUE_OWNER)
+            reconciled = await run_in_threadpool(task_store.reconcile_orphans, QUEUE_OWNER_STALE_S)
+            if reconciled["failed"]:
+                print(f"Warning: {reconciled['failed']} task(s) lost their analysis job with a stopped server process; marked as failed.")
+            if reconciled["requeued"]:
+                print(f"INFO: {reconciled['requeued']} batch task(s) of a stopped server process returned to the backlog.")
+                if models_loaded: await run_in_threadpool(feed_batch_backlog)
+        except Exception as e:
+            print(f"Warning: queue owner heartbeat failed: {e}")
 
 @app.get("/api/audio/{task_id}/{filename}")
 async def get_audio_file(task_id: str, filename: str):
     # Basic security check
     if ".." in task_id or "/" in task_id or "\\" in task_id or \
-       ".." in filename or filename.startswith(("/", "\\")) :
+       ".." in filename or "/" in filename or "\\" in filename:
          raise HTTPException(status_code=400, detail="Invalid characters in task_id or filename")
 
-    segment_path = os.path.abspath(os.path.join(SEGMENT_BASE_DIR, task_id, filename))
     original_path = os.path.abspath(os.path.join(UPLOAD_DIR, filename)) # Original file saved as task_id.ext
-
     file_to_serve = None
 
-    # Check segment path first (more specific check)
-    if filename.startswith("SPEAKER_") and os.path.commonpath([segment_path, os.path.abspath(SEGMENT_BASE_DIR)]) == os.path.abspath(SEGMENT_BASE_DIR):
-         if os.path.exists(segment_path):
-             file_to_serve = segment_path
+    # Speaker segments are rendered from the original upload on first request
+    if parse_segment_filename(filename):
+        source_path = find_upload_path(task_id)
+        if source_path:
+            try:
+                file_to_serve = await run_in_threadpool(segment_cache.get_or_render, task_id, filename, source_path)
+            except Exception as e:
+                print(f"Error rendering segment {filename} for task {task_id}: {e}")
+                raise HTTPException(status_code=404, detail=f"Audio file '{filename}' could not be rendered")
 
     # Check original path (filename should match task_id.ext format)
-    if not file_to_serve and filename.startswith(task_id) and os.path.commonpath([original_path, os.path.abspath(UPLOAD_DIR)]) == os.path.abspath(UPLOAD_DIR):
+    elif filename.startswith(task_id) and os.path.commonpath([original_path, os.path.abspath(UPLOAD_DIR)]) == os.path.abspath(UPLOAD_DIR):
         if os.path.exists(original_path):
             file_to_serve = original_path
 
     if file_to_serve:
         print(f"Serving audio file: {file_to_serve}")
+        await run_in_threadpool(storage_index.touch, task_id) # recently served audio is evicted last
         media_type, _ = mimetypes.guess_type(file_to_serve)
         media_type = media_type or "application/octet-stream" # Fallback mime type
-        return FileResponse(path=file_to_serve, media_type=media_type, filename=filename)
+        # FileResponse answers Range requests with 206 partial content, so seeking doesn't re-send the file
+        return FileResponse(path=file_to_serve, media_type=media_type, filename=filename, content_disposition_type="inline")
     else:
         print(f"Audio file not found: task={task_id}, filename={filename}")
         raise HTTPException(status_code=404, detail=f"Audio file '{filename}' not found")
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """Prometheus metrics. Counters and histograms are totals over every API worker (kept in the task
+    database); gauges such as queue depth and RSS describe the worker that answered and carry its pid,
+    so scrape each worker separately or aggregate gauges by pid."""
+    queue_stats = analysis_queue.stats()
+    queue_depth_metric.set(queue_stats["queueDepth"])
+    in_flight_metric.set(queue_stats["inFlight"])
+    workers_ready_metric.set(queue_stats["readyWorkers"])
+    api_rss_metric.set(process_rss_bytes())
+    cache_hit_rate_metric.set((await run_in_threadpool(result_cache.stats))["hitRate"], cache="results")
+    for name, cache in (("segment_audio", segment_cache), ("historical_word_clouds", historical_word_cloud_cache),
+                        ("chat_replies", chat_reply_cache), ("emotion_indexes", emotion_index_cache)):
+        cache_hit_rate_metric.set(cache.stats()["hitRate"], cache=name)
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/storage")
+async def get_storage_report():
+    # Disk usage of uploads/segments and what the next janitor sweep would reclaim, by reason
+    return await run_in_threadpool(storage_janitor.report)
+
+@app.get("/cache/stats")
+async def get_cache_stats():
+    return {
+        "results": await run_in_threadpool(result_cache.stats),
+        "segmentAudio": segment_cache.stats(),
+        "historicalWordClouds": historical_word_cloud_cache.stats(),
+        "chatReplies": chat_reply_cache.stats(),
+        "emotionIndexes": emotion_index_cache.stats(),
+    }
+
 # --- Placeholder Endpoints ---
 @app.get("/historical")
-async def get_historical_data(timeframe: str = "last_7_days"):
-    # (Keep existing mock implementation)
-    print(f"Received historical data request for timeframe: {timeframe}")
-    # Ensure generate_word_cloud_base64 exists before calling
-    mock_wordcloud_data = None
+async def get_historical_data(timeframe: str = DEFAULT_TIMEFRAME, start: str = None, end: str = None):
+    # start/end (ISO 8601 or epoch seconds) select an arbitrary range instead of a named timeframe
+    print(f"Received historical data request for timeframe: {timeframe}, start: {start}, end: {end}")
+    try:
+        start_ms, end_ms = resolve_time_range(timeframe, start, end)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid time range: {e}")
+    word_cloud_data = None
     if models_loaded: # Only try if models loaded
-        #mock_wordcloud_data = generate_word_cloud_base64("historical data analysis trends common issues reports")
-        texts = load_historical_data(timeframe)
-        combined_text = " ".join(texts)
-        mock_wordcloud_data = generate_word_cloud_base64(combined_text)
+        word_cloud_data = await run_in_threadpool(get_historical_word_cloud, timeframe, start, end, start_ms, end_ms)
+    # Served from the hourly/daily rollups maintained as each call is saved
+    analytics = await run_in_threadpool(get_call_store().call_analytics, start_ms, end_ms)
     return {
         "timeframe": timeframe,
-        "wordCloudData": mock_wordcloud_data, # Use consistent key
-        "averageSatisfaction": {"value": 0.65, "label": "Neutral"},
+        "start": start_ms, "end": end_ms, # epoch ms actually queried (None = unbounded)
+        "wordCloudData": word_cloud_data, # Use consistent key
+        "averageSatisfaction": {"value": analytics["satisfaction"]["mean"], "label": analytics["satisfaction"]["label"]},
+        "analytics": analytics,
     }
 
+async def prepare_chat(message):
+    # SQLite reads run off the event loop
+    store = get_call_store()
+    cache_key = (normalize_question(message), await run_in_threadpool(store.calls_version))
+    cached = chat_reply_cache.get(cache_key)
+    if cached is not None: return cache_key, cached, None
+    # Only the calls relevant to the question (BM25 over the call store) go into the prompt, within a token budget
+    messages, context_stats = await run_in_threadpool(build_chat_messages, message.lower(), store)
+    print(f"INFO: Chat context: {context_stats['includedCalls']}/{context_stats['totalCalls']} calls, ~{context_stats['contextTokens']} tokens.")
+    return cache_key, None, messages
+
 @app.post("/chat")
 async def chatbot_response(user_input: UserMessage):
-    user_message = user_input.message.lower()
-    call_data = load_call_data()
-    # Prepare summarized data for the model
-    call_summaries = [
-        f"File: {call.get('fileName')}, "
-        f"Transcription: {call.get('transcription')}, "
-        f"Speech Emotion: {list(call.get('speechEmotionOverall', {}).keys())}, "
-        #f"Text Sentiment: {call.get('textSentimentOverall', {}).get('dominant')}, "
-        #f"Satisfaction: {call.get('satisfactionPrediction', {}).get('label')}"
-        f"Timestamp: {call.get('timestamp')} "
-        for call in call_data
-    ]
-    combined_context = "\n".join(call_summaries)
-    messages = [
-        {
-            "role": "system",
-            "content": (
-                "You are a helpful assistant who analyzes call center conversations. You are given structured analysis data for each call - including transcriptions, "
-                "and sentiment. Your job is to answer the questions properly in natural language."
-                "Avoid using numbers in general. Only give numerical answer when quantitative questions are asked. Otherwise use plain English. Be concise and conversational."
-            )
-        },
-        {
-            "role": "user",
-            "content": f"Call Records:\n{combined_context}\n\nUser Question: {user_message}"
-        }
-    ]
-    response = groq_client.chat.completions.create(
-        model="llama-3.1-8b-instant",
-        messages=messages,
-        temperature=0.7
-    )
-    reply = response.choices[0].message.content.strip()
-    print(f"Chatbot response: {reply}")
-    return {"reply": reply}
+    cache_key, reply, messages = await prepare_chat(user_input.message)
+    if reply is not None: return {"reply": reply, "cached": True}
+    try:
+        async with chat_semaphore:
+            reply = await chat_client.complete(messages)
+    except Exception as e:
+        print(f"ERROR: Chat request failed: {e}")
+        raise HTTPException(status_code=502, detail="Chat model request failed.")
+    chat_reply_cache.put(cache_key, reply)
+    return {"reply": reply, "cached": False}
+
+@app.post("/chat/stream")
+async def chatbot_response_stream(user_input: UserMessage):
+    """Streams the reply as Server-Sent Events: `token` events with text deltas, then `done` (or `error`)."""
+    cache_key, cached_reply, messages = await prepare_chat(user_input.message)
+
+    async def events():
+        if cached_reply is not None:
+            yield sse_event("token", {"text": cached_reply})
+            yield sse_event("done", {"reply": cached_reply, "cached": True})
+            return
+        parts = []
+        try:
+            async with chat_semaphore:
+                async for delta in chat_client.stream(messages):
+                    parts.append(delta)
+                    yield sse_event("token", {"text": delta})
+        except Exception as e:
+            print(f"ERROR: Chat stream failed: {e}")
+            yield sse_event("error", {"detail": "Chat model request failed."})
+            return
+        reply = "".join(parts).strip()
+        chat_reply_cache.put(cache_key, reply)
+        yield sse_event("done", {"reply": reply, "cached": False})
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
 
 # --- Optional Cleanup Endpoint ---
 @app.delete("/cleanup/{task_id}")
@@ -298,11 +1015,11 @@ async def cleanup_task_data(task_id: str):
     segment_dir = os.path.join(SEGMENT_BASE_DIR, task_id)
     deleted_segments = False; deleted_upload = False
     upload_file_to_delete = None
-    try: # Find original file based on task_id prefix
-        for fname in os.listdir(UPLOAD_DIR):
-            if fname.startswith(task_id):
-                upload_file_to_delete = os.path.join(UPLOAD_DIR, fname); break
-    except Exception as e: print(f"Error scanning upload dir: {e}")
+    try: # Original file from the storage index
+        upload_file_to_delete = await run_in_threadpool(find_upload_path, task_id)
+    except Exception as e: print(f"Error looking up upload of task {task_id}: {e}")
+    segment_cache.drop_task(task_id)
+    emotion_index_cache.pop(task_id)
 
     if os.path.exists(segment_dir):
         try: shutil.rmtree(segment_dir); deleted_segments = True; print(f"Deleted segment directory: {segment_dir}")
@@ -310,9 +1027,9 @@ async def cleanup_task_data(task_id: str):
     if upload_file_to_delete and os.path.exists(upload_file_to_delete):
         try: os.remove(upload_file_to_delete); deleted_upload = True; print(f"Deleted upload file: {upload_file_to_delete}")
         except Exception as e: print(f"Error deleting upload file {upload_file_to_delete}: {e}")
+    await run_in_threadpool(storage_index.remove, task_id)
 
-    analysis_status_store.pop(task_id, None)
-    analysis_results_store.pop(task_id, None)
+    await run_in_threadpool(task_store.delete, task_id)
 
     if deleted_segments or deleted_upload: return {"message": f"Cleanup successful for task {task_id}."}
     else: raise HTTPException(status_code=404, detail=f"No data found or failed to cleanup task {task_id}")
@@ -3,10 +3,9 @@ import os
 import torch
 import librosa
 import numpy as np
-from pydub import AudioSegment
 from transformers import pipeline as hf_pipeline
 # Explicitly import Wav2Vec2FeatureExtractor
-from transformers import AutoProcessor, AutoModelForAudioClassification, Wav2Vec2FeatureExtractor # Keep AutoProcessor for now, might remove later if not used
+from transformers import AutoModelForAudioClassification, Wav2Vec2FeatureExtractor
 from transformers import AutoTokenizer, AutoModelForSequenceClassification
 import torch.nn.functional as F
 from pyannote.audio import Pipeline as DiarizationPipeline
@@ -17,19 +16,81 @@ import logging
 import traceback
 from collections import Counter
 import json
+import hashlib
+import threading
+import time
 from datetime import datetime,timezone
 from pathlib import Path
+from utils.lru_cache import LRUCache
+from utils.call_store import get_call_store, satisfaction_label
+from utils.intervals import align_greedy
+from utils.segment_policy import plan_inference_windows, aggregate_window_scores
+from utils.vad import detect_speech_regions, clip_regions, SpeechTimeMap
+from utils.task_store import TaskStore
+from utils.metrics import process_rss_bytes, peak_rss_bytes
+from models.stage_graph import Stage, StageGraph
 
 # --- Configuration ---
 HF_TOKEN = "<add your token>"
 DEVICE = torch.device("cuda" if torch.cuda.is_available() else "cpu")
 print(f"INFO: Using device: {DEVICE}")
+# Every upload is decoded once into a mono float32 buffer at this rate; all models work on views of it
+ANALYSIS_SAMPLE_RATE = 16000
+# Container for segment audio URLs (wav | flac | ogg | opus); files are rendered lazily by /api/audio
+SEGMENT_AUDIO_FORMAT = os.environ.get("SEGMENT_AUDIO_FORMAT", "wav").lower()
+# Text sentiment runs in token-length-sorted batches; results are memoized per normalized sentence
+TEXT_SENTIMENT_BATCH_SIZE = int(os.environ.get("TEXT_SENTIMENT_BATCH_SIZE", "16"))
+TEXT_SENTIMENT_CACHE_SIZE = int(os.environ.get("TEXT_SENTIMENT_CACHE_SIZE", "4096"))
+# ASR runs over fixed-length overlapping chunks so peak memory doesn't grow with call length
+ASR_CHUNK_LENGTH_S = float(os.environ.get("ASR_CHUNK_LENGTH_S", "30"))
+ASR_STRIDE_LENGTH_S = float(os.environ.get("ASR_STRIDE_LENGTH_S", "5"))
+ASR_BATCH_SIZE = int(os.environ.get("ASR_BATCH_SIZE", "1"))
+# "full" transcribes the whole call, "segments" transcribes each diarized turn separately
+ASR_MODE = os.environ.get("ASR_MODE", "full").lower()
+# Thread pool size for running independent pipeline stages concurrently
+PIPELINE_WORKERS = int(os.environ.get("PIPELINE_WORKERS", "3"))
+# Words separated by a longer pause than this start a new phrase in the text emotion timeline
+TEXT_PHRASE_MAX_GAP_S = float(os.environ.get("TEXT_PHRASE_MAX_GAP_S", "0.8"))
+TEXT_PHRASE_MAX_WORDS = int(os.environ.get("TEXT_PHRASE_MAX_WORDS", "25"))
+# Speech emotion inference runs in length-sorted buckets of up to this many segments
+SPEECH_EMOTION_BATCH_SIZE = int(os.environ.get("SPEECH_EMOTION_BATCH_SIZE", "8"))
+# Cap on padded samples per forward pass (bucket size x longest segment), keeps long turns from blowing up memory
+SPEECH_EMOTION_MAX_BATCH_SAMPLES = int(os.environ.get("SPEECH_EMOTION_MAX_BATCH_SAMPLES", str(16000 * 120)))
+# Speech emotion / gender inputs: same-speaker turns under SEGMENT_MERGE_MIN_S are merged with neighbours at most
+# SEGMENT_MERGE_MAX_GAP_S away; anything over SEGMENT_MAX_WINDOW_S is scored in SEGMENT_WINDOW_S windows every SEGMENT_WINDOW_HOP_S
+SEGMENT_MERGE_MIN_S = float(os.environ.get("SEGMENT_MERGE_MIN_S", "1.0"))
+SEGMENT_MERGE_MAX_GAP_S = float(os.environ.get("SEGMENT_MERGE_MAX_GAP_S", "0.5"))
+SEGMENT_WINDOW_S = float(os.environ.get("SEGMENT_WINDOW_S", "8"))
+SEGMENT_WINDOW_HOP_S = float(os.environ.get("SEGMENT_WINDOW_HOP_S", "6"))
+SEGMENT_MAX_WINDOW_S = float(os.environ.get("SEGMENT_MAX_WINDOW_S", "12"))
+# "energy" runs ASR and the audio classifiers on detected speech only (silence, hum and hold music skipped), "off" on everything
+VAD_MODE = os.environ.get("VAD_MODE", "energy").lower()
+VAD_ENERGY_MARGIN_DB = float(os.environ.get("VAD_ENERGY_MARGIN_DB", "12"))
+VAD_MIN_SPEECH_S = float(os.environ.get("VAD_MIN_SPEECH_S", "0.25"))
+VAD_MIN_SILENCE_S = float(os.environ.get("VAD_MIN_SILENCE_S", "0.5"))
+VAD_PAD_S = float(os.environ.get("VAD_PAD_S", "0.2"))
+# Diarized turns with less speech than this share are left out of speech emotion / gender inference
+VAD_MIN_TURN_SPEECH_FRACTION = float(os.environ.get("VAD_MIN_TURN_SPEECH_FRACTION", "0.2"))
+
+# Hugging Face model ids loaded by load_models; part of the result cache fingerprint
+MODEL_IDS = {
+    "asr": "facebook/wav2vec2-base-960h",
+    "textSentiment": "bhadresh-savani/bert-base-go-emotion",
+    "speechEmotion": "ehcalabres/wav2vec2-lg-xlsr-en-speech-emotion-recognition",
+    "gender": "alefiury/wav2vec2-large-xlsr-53-gender-recognition-librispeech",
+    "diarization": "pyannote/speaker-diarization-3.1",
+}
+# Bump when a pipeline change alters results, so cached analyses of earlier versions stop matching
+ANALYSIS_VERSION = 4
 
 # --- Global Model Variables ---
 asr_pipeline_global = None
 sentiment_tokenizer = None
 sentiment_model = None
 GO_ID2LABEL = None
+GO_TO_8_MATRIX = None # (GoEmotions labels x TARGET_EMOTIONS) 0/1 matrix, built once in load_models
+# text_sentiment and text_timeline run concurrently; HF fast tokenizers raise "Already borrowed" when shared across threads
+sentiment_model_lock = threading.Lock()
 ehcalabres_emotion_feature_extractor = None
 ehcalabres_emotion_model = None
 # For gender model, we'll use feature_extractor explicitly
@@ -37,6 +98,7 @@ gender_feature_extractor_new = None # CHANGED from processor
 gender_model_new = None
 diarization_pipeline_global = None
 models_loaded_successfully = False
+MODEL_LOAD_SECONDS = {} # MODEL_IDS key -> seconds load_models spent on it in this process
 
 # --- Constants ---
 # (Keep TARGET_EMOTIONS and GO_TO_8_MAP as they are)
@@ -51,13 +113,21 @@ GO_TO_8_MAP = {
     "neutral": "Neutral", "curiosity": "Other", "desire": "Other", "caring": "Other",
     "embarrassment": "Other"
 }
+SPEECH_EMOTION_LABEL_MAP = {
+    "angry": "Angry", "calm": "Calm", "disgust": "Disgust",
+    "fearful": "Fear", "happy": "Happy", "neutral": "Neutral",
+    "sad": "Sad", "surprised": "Surprise",
+    # Add short forms if model outputs them
+    "ang": "Angry", "cal": "Calm", "dis": "Disgust",
+    "fea": "Fear", "hap": "Happy", "neu": "Neutral",
+    "sadness": "Sad", "sur": "Surprise"
+}
 
-HISTORY_FILE = Path("historical_transcriptions.json")
-DATA_FILE = Path("call_data.json")
+text_sentiment_cache = LRUCache(TEXT_SENTIMENT_CACHE_SIZE)
 
 # --- Model Loading Function ---
 def load_models():
-    global asr_pipeline_global, sentiment_tokenizer, sentiment_model, GO_ID2LABEL, \
+    global asr_pipeline_global, sentiment_tokenizer, sentiment_model, GO_ID2LABEL, GO_TO_8_MATRIX, \
            ehcalabres_emotion_feature_extractor, ehcalabres_emotion_model, \
            gender_feature_extractor_new, gender_model_new, \
            diarization_pipeline_global, models_loaded_successfully
@@ -66,26 +136,36 @@ def load_models():
         print("INFO: Models already loaded.")
         return True
     try:
-        print("INFO: Loading ASR model (facebook/wav2vec2-base-960h)...")
-        asr_pipeline_global = hf_pipeline("automatic-speech-recognition", model="facebook/wav2vec2-base-960h", device=0 if DEVICE.type == 'cuda' else -1)
-
-        print("INFO: Loading GoEmotions Sentiment model (bhadresh-savani/bert-base-go-emotion)...")
-        sentiment_model_name = "bhadresh-savani/bert-base-go-emotion"
+        load_start = time.perf_counter()
+        def loaded(model_key):
+            nonlocal load_start
+            MODEL_LOAD_SECONDS[model_key] = round(time.perf_counter() - load_start, 2)
+            load_start = time.perf_counter()
+
+        print(f"INFO: Loading ASR model ({MODEL_IDS['asr']})...")
+        asr_pipeline_global = hf_pipeline("automatic-speech-recognition", model=MODEL_IDS["asr"], device=0 if DEVICE.type == 'cuda' else -1)
+        loaded("asr")
+
+        sentiment_model_name = MODEL_IDS["textSentiment"]
+        print(f"INFO: Loading GoEmotions Sentiment model ({sentiment_model_name})...")
         sentiment_tokenizer = AutoTokenizer.from_pretrained(sentiment_model_name)
         sentiment_model = AutoModelForSequenceClassification.from_pretrained(sentiment_model_name).to(DEVICE)
         GO_ID2LABEL = sentiment_model.config.id2label
+        GO_TO_8_MATRIX = build_go_to_8_matrix(GO_ID2LABEL)
+        loaded("textSentiment")
 
-        print("INFO: Loading Speech Emotion model (ehcalabres/wav2vec2-lg-xlsr-en-speech-emotion-recognition)...")
-        ehcalabres_model_name = "ehcalabres/wav2vec2-lg-xlsr-en-speech-emotion-recognition"
+        ehcalabres_model_name = MODEL_IDS["speechEmotion"]
+        print(f"INFO: Loading Speech Emotion model ({ehcalabres_model_name})...")
         print(f"INFO: Attempting to load feature extractor for {ehcalabres_model_name}...")
         ehcalabres_emotion_feature_extractor = Wav2Vec2FeatureExtractor.from_pretrained(ehcalabres_model_name)
         print(f"INFO: Attempting to load model weights for {ehcalabres_model_name}...")
         ehcalabres_emotion_model = AutoModelForAudioClassification.from_pretrained(ehcalabres_model_name).to(DEVICE)
         print("INFO: ehcalabres emotion model config.id2label:", ehcalabres_emotion_model.config.id2label)
+        loaded("speechEmotion")
 
 
-        print("INFO: Loading Gender model (alefiury/wav2vec2-large-xlsr-53-gender-recognition-librispeech)...")
-        gender_model_id = "alefiury/wav2vec2-large-xlsr-53-gender-recognition-librispeech"
+        gender_model_id = MODEL_IDS["gender"]
+        print(f"INFO: Loading Gender model ({gender_model_id})...")
         # --- MODIFIED: Load Feature Extractor explicitly for Gender Model ---
         print(f"INFO: Attempting to load feature extractor for {gender_model_id}...")
         gender_feature_extractor_new = Wav2Vec2FeatureExtractor.from_pretrained(gender_model_id) # Add token=HF_TOKEN if needed
@@ -93,17 +173,19 @@ def load_models():
         print(f"INFO: Attempting to load model weights for {gender_model_id}...")
         gender_model_new = AutoModelForAudioClassification.from_pretrained(gender_model_id).to(DEVICE) # Add token=HF_TOKEN if needed
         print("INFO: New gender model config.id2label:", gender_model_new.config.id2label)
+        loaded("gender")
 
 
-        print("INFO: Loading Diarization pipeline (pyannote/speaker-diarization-3.1)...")
+        print(f"INFO: Loading Diarization pipeline ({MODEL_IDS['diarization']})...")
         if not HF_TOKEN or HF_TOKEN == "YOUR_HF_TOKEN":
              print("WARNING: Hugging Face Token not set for diarization. Diarization might fail if model needs auth.")
         diarization_pipeline_global = DiarizationPipeline.from_pretrained(
-            "pyannote/speaker-diarization-3.1",
+            MODEL_IDS["diarization"],
             use_auth_token=HF_TOKEN if HF_TOKEN and HF_TOKEN != "YOUR_HF_TOKEN" else None
         ).to(DEVICE)
+        loaded("diarization")
 
-        print("INFO: All models loaded successfully.")
+        print(f"INFO: All models loaded successfully. Load times (s): {MODEL_LOAD_SECONDS}")
         models_loaded_successfully = True
         return True
 
@@ -114,16 +196,24 @@ def load_models():
         return False
 
 # --- Helper Functions ---
+def decode_audio(audio_path, target_sr=ANALYSIS_SAMPLE_RATE):
+    # Single decode + resample step; every later stage works on views of the returned buffer
+    try:
+        audio, _ = librosa.load(audio_path, sr=target_sr, mono=True, dtype=np.float32)
+    except Exception as e:
+        raise Exception(f"Failed to decode audio file ({type(e).__name__}): {e}. Is ffmpeg installed and working?") from e
+    return np.ascontiguousarray(audio)
+
 # --- MODIFIED predict_gender to use gender_feature_extractor_new ---
-def predict_gender(audio_segment_path, sampling_rate=16000): # Default sampling rate, will be overridden
+def predict_gender(audio_segment, sampling_rate=ANALYSIS_SAMPLE_RATE):
     global gender_feature_extractor_new, gender_model_new # Use new variable names
     if not models_loaded_successfully: return "Unknown (Models Failed)"
     try:
-        audio_input, loaded_sr = librosa.load(audio_segment_path, sr=None)
+        audio_input = np.asarray(audio_segment, dtype=np.float32)
         # Use the feature extractor's configured sampling rate
         target_sr = gender_feature_extractor_new.sampling_rate
-        if loaded_sr != target_sr:
-            audio_input = librosa.resample(audio_input, orig_sr=loaded_sr, target_sr=target_sr)
+        if sampling_rate != target_sr:
+            audio_input = librosa.resample(audio_input, orig_sr=sampling_rate, target_sr=target_sr)
         
         # Use the explicit feature extractor
         inputs = gender_feature_extractor_new(
@@ -140,7 +230,6 @@ def predict_gender(audio_segment_path, sampling_rate=16000): # Default sampling
         predicted_id = torch.argmax(logits, dim=-1).item()
         predicted_label_raw = gender_model_new.config.id2label[predicted_id]
 
-        # print(f"Raw gender label: '{predicted_label_raw}' for {os.path.basename(audio_segment_path)}") # Debug
         if "female" in predicted_label_raw.lower():
             return "Female"
         elif "male" in predicted_label_raw.lower():
@@ -150,73 +239,205 @@ def predict_gender(audio_segment_path, sampling_rate=16000): # Default sampling
             return predicted_label_raw.capitalize() 
 
     except Exception as e:
-        print(f"Warning: Gender prediction failed for {os.path.basename(audio_segment_path)}. Error: {type(e).__name__} - {e}")
+        print(f"Warning: Gender prediction failed for a {len(audio_segment) / sampling_rate:.2f}s segment. Error: {type(e).__name__} - {e}")
         return "Unknown"
 
-# (predict_speech_emotion, get_text_sentiment, generate_word_cloud_base64, and analyze_audio
-#  remain the same as the last full version you provided in the previous response,
-#  assuming predict_speech_emotion was already correctly using its feature_extractor)
-# ... Ensure predict_speech_emotion also uses its explicit feature_extractor ...
-
-def predict_speech_emotion(audio_segment_path):
+def predict_speech_emotion(audio_segment, sampling_rate=ANALYSIS_SAMPLE_RATE):
+    labels, _ = predict_speech_emotion_batch([audio_segment], sampling_rate=sampling_rate)
+    return labels[0]
+
+def _length_buckets(lengths, batch_size, max_batch_samples):
+    # Sort by length so each bucket pads to a similar size; ascending order means the
+    # segment being added is always the longest one in the current bucket.
+    order = sorted(range(len(lengths)), key=lambda i: lengths[i])
+    buckets, current = [], []
+    for idx in order:
+        padded_size = lengths[idx] * (len(current) + 1)
+        if current and (len(current) >= batch_size or padded_size > max_batch_samples):
+            buckets.append(current)
+            current = []
+        current.append(idx)
+    if current:
+        buckets.append(current)
+    return buckets
+
+def predict_speech_emotion_batch(waveforms, sampling_rate=ANALYSIS_SAMPLE_RATE, batch_size=None, on_progress=None):
+    """Predicts speech emotion for many segment waveforms with one forward pass per length bucket.
+
+    Returns (labels, stats) where labels follow the order of `waveforms` and stats holds
+    throughput numbers for tuning SPEECH_EMOTION_BATCH_SIZE. `on_progress(done, total)` is
+    called after each batch.
+    """
+    scores, errors, stats = speech_emotion_scores(waveforms, sampling_rate, batch_size, on_progress)
+    return [error or speech_emotion_label(score) for score, error in zip(scores, errors)], stats
+
+def speech_emotion_label(score):
+    predicted_label = ehcalabres_emotion_model.config.id2label[int(np.argmax(score))]
+    return SPEECH_EMOTION_LABEL_MAP.get(predicted_label.lower(), predicted_label.capitalize())
+
+def speech_emotion_scores(waveforms, sampling_rate=ANALYSIS_SAMPLE_RATE, batch_size=None, on_progress=None):
+    """Class probabilities of the speech emotion model for each waveform, batched like predict_speech_emotion_batch.
+
+    Returns (scores, errors, stats): scores[i] is a probability vector over the model's id2label
+    (None if inference failed) and errors[i] the label reported instead ("Unknown", "OOM Error", ...).
+    """
     global ehcalabres_emotion_feature_extractor, ehcalabres_emotion_model
-    if not models_loaded_successfully: return "N/A (Models Failed)"
-    try:
-        speech_array, loaded_sr = librosa.load(audio_segment_path, sr=None)
-        target_sr = ehcalabres_emotion_feature_extractor.sampling_rate
-        if loaded_sr != target_sr:
-            speech_array = librosa.resample(speech_array, orig_sr=loaded_sr, target_sr=target_sr)
-        
-        inputs = ehcalabres_emotion_feature_extractor(
-            speech_array, 
-            sampling_rate=target_sr, 
-            return_tensors="pt", 
-            padding=True
-        )
-        inputs = {key: val.to(DEVICE) for key, val in inputs.items()}
-
-        with torch.no_grad(): 
-            logits = ehcalabres_emotion_model(**inputs).logits
-
-        predicted_id = torch.argmax(logits, dim=-1).item()
-        predicted_label = ehcalabres_emotion_model.config.id2label[predicted_id]
-        
-        label_map_ehcalabres = {
-            "angry": "Angry", "calm": "Calm", "disgust": "Disgust", 
-            "fearful": "Fear", "happy": "Happy", "neutral": "Neutral", 
-            "sad": "Sad", "surprised": "Surprise",
-            # Add short forms if model outputs them
-            "ang": "Angry", "cal": "Calm", "dis": "Disgust", 
-            "fea": "Fear", "hap": "Happy", "neu": "Neutral", 
-            "sadness": "Sad", "sur": "Surprise" 
-        }
-        final_label = label_map_ehcalabres.get(predicted_label.lower(), predicted_label.capitalize())
-        return final_label
-    except Exception as e:
-        print(f"Warning: ehcalabres speech emotion prediction failed for {os.path.basename(audio_segment_path)}. Error: {e}")
-        return "Unknown"
+    batch_size = batch_size or SPEECH_EMOTION_BATCH_SIZE
+    stats = {"segments": len(waveforms), "batches": 0, "batchSize": batch_size,
+             "audioSeconds": 0.0, "inferenceSeconds": 0.0, "segmentsPerSecond": 0.0}
+    if not models_loaded_successfully: return [None] * len(waveforms), ["N/A (Models Failed)"] * len(waveforms), stats
+
+    target_sr = ehcalabres_emotion_feature_extractor.sampling_rate
+    prepared = []
+    for waveform in waveforms:
+        waveform = np.asarray(waveform, dtype=np.float32)
+        if sampling_rate != target_sr and waveform.size:
+            waveform = librosa.resample(waveform, orig_sr=sampling_rate, target_sr=target_sr)
+        prepared.append(waveform)
+
+    scores, errors = [None] * len(prepared), ["Unknown"] * len(prepared)
+    lengths = [len(w) for w in prepared]
+    valid_indices = [i for i, length in enumerate(lengths) if length > 0]
+    buckets = _length_buckets([lengths[i] for i in valid_indices], batch_size, SPEECH_EMOTION_MAX_BATCH_SAMPLES)
+
+    start_time = time.perf_counter()
+    done = 0
+    for bucket in buckets:
+        bucket = [valid_indices[i] for i in bucket]
+        try:
+            inputs = ehcalabres_emotion_feature_extractor(
+                [prepared[i] for i in bucket],
+                sampling_rate=target_sr,
+                return_tensors="pt",
+                padding=True,
+                return_attention_mask=True
+            )
+            inputs = {key: val.to(DEVICE) for key, val in inputs.items()}
+            with torch.no_grad():
+                logits = ehcalabres_emotion_model(**inputs).logits
+            for i, probabilities in zip(bucket, torch.softmax(logits.float(), dim=-1).cpu().numpy()):
+                scores[i], errors[i] = probabilities, None
+        except torch.cuda.OutOfMemoryError as e:
+            print(f"Warning: speech emotion batch of {len(bucket)} segments ran out of memory. Error: {e}")
+            for i in bucket: errors[i] = "OOM Error"
+        except Exception as e:
+            print(f"Warning: ehcalabres speech emotion prediction failed for a batch of {len(bucket)} segments. Error: {e}")
+        done += len(bucket)
+        if on_progress: on_progress(done, len(valid_indices))
+    elapsed = time.perf_counter() - start_time
+
+    stats["batches"] = len(buckets)
+    stats["audioSeconds"] = round(sum(lengths) / target_sr, 2)
+    stats["inferenceSeconds"] = round(elapsed, 3)
+    stats["segmentsPerSecond"] = round(len(valid_indices) / elapsed, 2) if elapsed > 0 else 0.0
+    print(f"INFO: Speech emotion: {stats['segments']} segments in {stats['batches']} batches, "
+          f"{stats['inferenceSeconds']}s ({stats['segmentsPerSecond']} segments/s)")
+    return scores, errors, stats
+
+def transcribe_audio(audio, sampling_rate=ANALYSIS_SAMPLE_RATE, offset_s=0.0):
+    # Chunked CTC decoding: the pipeline walks the buffer in ASR_CHUNK_LENGTH_S windows with
+    # ASR_STRIDE_LENGTH_S of context on each side, so only one chunk's activations are alive at a time
+    global asr_pipeline_global
+    if not asr_pipeline_global: raise Exception("ASR pipeline not loaded.")
+    if len(audio) == 0: return {"text": "", "words": []}
+    output = asr_pipeline_global(
+        {"raw": audio, "sampling_rate": sampling_rate},
+        chunk_length_s=ASR_CHUNK_LENGTH_S,
+        stride_length_s=ASR_STRIDE_LENGTH_S,
+        batch_size=ASR_BATCH_SIZE,
+        return_timestamps="word"
+    )
+    words = []
+    for chunk in output.get("chunks") or []:
+        start, end = chunk.get("timestamp") or (None, None)
+        if start is None: continue
+        end = start if end is None else end
+        words.append({"word": chunk["text"], "start": round(start + offset_s, 2), "end": round(end + offset_s, 2)})
+    return {"text": (output.get("text") or "").strip(), "words": words}
+
+def transcribe_speech(audio, regions, sampling_rate=ANALYSIS_SAMPLE_RATE):
+    # Transcribes only `regions` of the buffer, concatenated, with word times mapped back onto the buffer's timeline
+    speech_map = SpeechTimeMap(regions, sampling_rate)
+    output = transcribe_audio(speech_map.gather(audio), sampling_rate)
+    for word in output["words"]:
+        word["start"] = round(speech_map.to_original(word["start"]), 2)
+        word["end"] = round(speech_map.to_original(word["end"], end=True), 2)
+    return output
+
+def group_words_into_phrases(words, max_gap_s=None, max_words=None):
+    # wav2vec2 CTC output has no punctuation, so phrases are cut at pauses (or every max_words words)
+    max_gap_s = TEXT_PHRASE_MAX_GAP_S if max_gap_s is None else max_gap_s
+    max_words = max_words or TEXT_PHRASE_MAX_WORDS
+    phrases, current = [], []
+    for word in words:
+        if current and (word["start"] - current[-1]["end"] > max_gap_s or len(current) >= max_words):
+            phrases.append(current)
+            current = []
+        current.append(word)
+    if current: phrases.append(current)
+    return [{"text": " ".join(w["word"] for w in phrase), "start": phrase[0]["start"], "end": phrase[-1]["end"]} for phrase in phrases]
+
+def build_go_to_8_matrix(id2label):
+    # probs (batch x GoEmotions) @ matrix -> scores (batch x TARGET_EMOTIONS)
+    matrix = torch.zeros(len(id2label), len(TARGET_EMOTIONS))
+    for idx, go_label in id2label.items():
+        mapped_emotion = GO_TO_8_MAP.get(go_label.lower(), "Other")
+        matrix[int(idx), TARGET_EMOTIONS.index(mapped_emotion)] = 1.0
+    return matrix.to(DEVICE)
+
+def normalize_sentence(text):
+    # The GoEmotions BERT tokenizer is uncased, so case and spacing don't change the prediction
+    return " ".join(text.lower().split())
 
 def get_text_sentiment(text):
-    global sentiment_tokenizer, sentiment_model, GO_ID2LABEL, GO_TO_8_MAP, TARGET_EMOTIONS
-    if not models_loaded_successfully: return {"dominant": "N/A (Models Failed)", "scores": {}}
-    if not text or not text.strip(): return {"dominant": "Neutral", "scores": {emo: 0.0 for emo in TARGET_EMOTIONS}}
-    try:
-        inputs = sentiment_tokenizer(text, return_tensors="pt", padding=True, truncation=True, max_length=512).to(DEVICE)
-        with torch.no_grad(): outputs = sentiment_model(**inputs)
-        logits = outputs.logits
-        probs = F.softmax(logits, dim=1).detach().cpu().numpy()[0]
-        sentiment_scores = {emotion: 0.0 for emotion in TARGET_EMOTIONS}
-        for idx, prob in enumerate(probs):
-            go_label = GO_ID2LABEL.get(idx, "unknown").lower()
-            mapped_emotion = GO_TO_8_MAP.get(go_label, "Other")
-            sentiment_scores[mapped_emotion] += prob
-        dominant_sentiment = max(sentiment_scores, key=sentiment_scores.get) if sentiment_scores else "Neutral"
-        total_score = sum(sentiment_scores.values())
-        normalized_scores = {k: v / total_score if total_score > 0 else 0 for k, v in sentiment_scores.items()}
-        return {"dominant": dominant_sentiment, "scores": normalized_scores}
-    except Exception as e:
-        print(f"Warning: Text sentiment analysis failed for text: '{text[:50]}...'. Error: {e}")
-        return {"dominant": "N/A", "scores": {}}
+    return get_text_sentiment_batch([text])[0]
+
+def get_text_sentiment_batch(texts, batch_size=None):
+    global sentiment_tokenizer, sentiment_model, GO_TO_8_MATRIX
+    if not models_loaded_successfully: return [{"dominant": "N/A (Models Failed)", "scores": {}} for _ in texts]
+    batch_size = batch_size or TEXT_SENTIMENT_BATCH_SIZE
+    results = [None] * len(texts)
+    pending = {} # normalized text -> indices in `texts` waiting for it
+    for i, text in enumerate(texts):
+        if not text or not text.strip():
+            results[i] = {"dominant": "Neutral", "scores": {emo: 0.0 for emo in TARGET_EMOTIONS}}
+            continue
+        key = normalize_sentence(text)
+        cached = text_sentiment_cache.get(key)
+        if cached is not None:
+            results[i] = {"dominant": cached["dominant"], "scores": dict(cached["scores"])}
+        else:
+            pending.setdefault(key, []).append(i)
+
+    if pending:
+        keys = list(pending)
+        # Tokenize once without padding, then pad each length-sorted batch only to its own longest sentence
+        with sentiment_model_lock: encodings = sentiment_tokenizer(keys, truncation=True, max_length=512)
+        order = sorted(range(len(keys)), key=lambda k: len(encodings["input_ids"][k]))
+        for batch_start in range(0, len(order), batch_size):
+            batch = order[batch_start:batch_start + batch_size]
+            try:
+                features = [{name: encodings[name][k] for name in encodings.keys()} for k in batch]
+                with sentiment_model_lock, torch.no_grad():
+                    inputs = sentiment_tokenizer.pad(features, return_tensors="pt").to(DEVICE)
+                    logits = sentiment_model(**inputs).logits
+                scores = F.softmax(logits, dim=1) @ GO_TO_8_MATRIX
+                scores = scores / scores.sum(dim=1, keepdim=True).clamp_min(1e-12)
+                dominant_ids = torch.argmax(scores, dim=1).tolist()
+                for k, row, dominant_id in zip(batch, scores.cpu().tolist(), dominant_ids):
+                    result = {"dominant": TARGET_EMOTIONS[dominant_id], "scores": dict(zip(TARGET_EMOTIONS, row))}
+                    text_sentiment_cache.put(keys[k], result)
+                    for i in pending[keys[k]]:
+                        results[i] = {"dominant": result["dominant"], "scores": dict(result["scores"])}
+            except Exception as e:
+                print(f"Warning: Text sentiment analysis failed for a batch of {len(batch)} sentences. Error: {e}")
+                for k in batch:
+                    for i in pending[keys[k]]:
+                        results[i] = {"dominant": "N/A", "scores": {}}
+    return results
+
+def get_text_sentiment_cache_stats():
+    return text_sentiment_cache.stats()
 
 def generate_word_cloud_base64(text):
     if not text or not text.strip(): return None
@@ -230,47 +451,345 @@ def generate_word_cloud_base64(text):
         print(f"Warning: Word cloud generation failed. Error: {e}")
         return None
 
+def generate_word_cloud_from_frequencies(frequencies):
+    # Renders pre-aggregated counts (e.g. the call store's daily word rollups) without re-tokenizing text
+    if not frequencies: return None
+    try:
+        wordcloud = WordCloud(width=400, height=200, background_color='white', collocations=False).generate_from_frequencies(frequencies)
+        buffered = BytesIO()
+        wordcloud.to_image().save(buffered, format="PNG")
+        img_str = base64.b64encode(buffered.getvalue()).decode('utf-8')
+        return f"data:image/png;base64,{img_str}"
+    except Exception as e:
+        print(f"Warning: Word cloud generation failed. Error: {e}")
+        return None
+
 def save_transcription_to_history(transcription_text):
-    timestamp = datetime.now(timezone.utc).isoformat()
-    # Load existing data
-    if HISTORY_FILE.exists():
-        with open(HISTORY_FILE, "r") as f:
-            history = json.load(f)
-    else:
-        history = []
-    # Append new record
-    history.append({
-        "timestamp": timestamp,
-        "transcription": transcription_text
-    })
-    # Save back
-    with open(HISTORY_FILE, "w") as f:
-        json.dump(history, f, indent=2)
+    # O(1) append to the call store (see utils/call_store.py) instead of rewriting the JSON history file
+    get_call_store().append_transcription(transcription_text)
 
 def save_call_data(output_data):
     timestamp = datetime.now(timezone.utc).isoformat()
     output_data["timestamp"] = timestamp  # Add timestamp to the data
-    # Load existing data
-    if DATA_FILE.exists():
-        with open(DATA_FILE, "r") as f:
-            data = json.load(f)
+    get_call_store().append_call(output_data)
+
+def analysis_fingerprint():
+    """Hash of everything besides the audio that shapes a result: models, pipeline version and options."""
+    config = {
+        "version": ANALYSIS_VERSION, "models": MODEL_IDS,
+        "options": {
+            "sampleRate": ANALYSIS_SAMPLE_RATE, "segmentFormat": SEGMENT_AUDIO_FORMAT, "asrMode": ASR_MODE,
+            "asrChunkS": ASR_CHUNK_LENGTH_S, "asrStrideS": ASR_STRIDE_LENGTH_S,
+            "phraseMaxGapS": TEXT_PHRASE_MAX_GAP_S, "phraseMaxWords": TEXT_PHRASE_MAX_WORDS,
+            "segmentMergeMinS": SEGMENT_MERGE_MIN_S, "segmentMergeMaxGapS": SEGMENT_MERGE_MAX_GAP_S,
+            "segmentWindowS": SEGMENT_WINDOW_S, "segmentWindowHopS": SEGMENT_WINDOW_HOP_S, "segmentMaxWindowS": SEGMENT_MAX_WINDOW_S,
+            "vadMode": VAD_MODE, "vadEnergyMarginDb": VAD_ENERGY_MARGIN_DB, "vadMinSpeechS": VAD_MIN_SPEECH_S,
+            "vadMinSilenceS": VAD_MIN_SILENCE_S, "vadPadS": VAD_PAD_S, "vadMinTurnSpeechFraction": VAD_MIN_TURN_SPEECH_FRACTION,
+        },
+    }
+    return hashlib.sha256(json.dumps(config, sort_keys=True).encode("utf-8")).hexdigest()
+
+# --- Pipeline Stages ---
+# Each stage reads/writes the shared `ctx` dict; dependencies are declared in build_analysis_graph.
+# Stages that run concurrently only ever write disjoint keys of ctx["results"].
+def _stage_decode(ctx):
+    # 1. Decode Audio (once, straight to the shared 16 kHz buffer)
+    task_id, results, sr = ctx["task_id"], ctx["results"], ctx["sr"]
+    print(f"[Task {task_id}] Decoding audio: {ctx['audio_path']}")
+    ctx["audio"] = decode_audio(ctx["audio_path"], sr)
+    ctx["duration"] = len(ctx["audio"]) / sr
+    results["audioDuration"] = round(ctx["duration"], 2)
+    print(f"[Task {task_id}] Audio Duration: {results['audioDuration']}s")
+
+def _stage_vad(ctx):
+    # 1b. Voice Activity (speech regions found once; ASR and the audio classifiers skip everything else)
+    task_id, results, audio, sr = ctx["task_id"], ctx["results"], ctx["audio"], ctx["sr"]
+    if VAD_MODE == "off":
+        regions = [(0, len(audio))] if len(audio) else []
     else:
-        data = []
-    # Append new record
-    data.append(output_data)
-    # Save back
-    with open(DATA_FILE, "w") as f:
-        json.dump(data, f, indent=2)
+        regions = detect_speech_regions(audio, sr, energy_margin_db=VAD_ENERGY_MARGIN_DB, min_speech_s=VAD_MIN_SPEECH_S,
+                                        min_silence_s=VAD_MIN_SILENCE_S, pad_s=VAD_PAD_S)
+    ctx["speech_regions"] = regions
+    speech_seconds = sum(end - start for start, end in regions) / sr
+    results["metrics"]["vad"] = {
+        "mode": VAD_MODE, "regions": len(regions), "speechSeconds": round(speech_seconds, 2),
+        "skippedSeconds": round(ctx["duration"] - speech_seconds, 2),
+        "skippedFraction": round(1 - speech_seconds / ctx["duration"], 4) if ctx["duration"] else 0.0,
+    }
+    print(f"[Task {task_id}] VAD: {len(regions)} speech regions, {results['metrics']['vad']['skippedFraction']:.1%} of the audio skipped")
+
+def _stage_diarization(ctx):
+    # 2. Diarization (in-memory waveform input, no second decode inside pyannote)
+    global diarization_pipeline_global
+    task_id = ctx["task_id"]
+    print(f"[Task {task_id}] Running diarization...")
+    if not diarization_pipeline_global: raise Exception("Diarization pipeline not loaded.")
+    waveform = torch.from_numpy(ctx["audio"]).unsqueeze(0) # (channel, time) view of the shared buffer
+    ctx["diarization"] = diarization_pipeline_global({"uri": task_id, "waveform": waveform, "sample_rate": ctx["sr"]})
+    print(f"[Task {task_id}] Diarization found {len(ctx['diarization'].labels())} unique speaker labels.")
+
+def _stage_segments(ctx):
+    # 3. Process Speakers and Segments
+    task_id, sr, diarization = ctx["task_id"], ctx["sr"], ctx["diarization"]
+    speaker_data_map = {}
+    if diarization:
+        for turn, _, speaker_id in diarization.itertracks(yield_label=True):
+            start_ms, end_ms = int(turn.start * 1000), int(turn.end * 1000)
+            start_s, end_s = round(turn.start, 2), round(turn.end, 2)
+            start_ms = max(0, start_ms); end_ms = min(int(ctx["duration"] * 1000), end_ms)
+            if start_ms >= end_ms: continue
+            segment_range = (start_ms * sr // 1000, end_ms * sr // 1000) # sample offsets into the shared buffer
+            # Playback file is rendered from the original upload on first request (see /api/audio)
+            segment_filename = f"{speaker_id}_{start_ms}-{end_ms}.{SEGMENT_AUDIO_FORMAT}"
+            segment_url = f"/api/audio/{task_id}/{segment_filename}"
+            if speaker_id not in speaker_data_map:
+                 speaker_data_map[speaker_id] = {"id": speaker_id, "gender": "Unknown", "segments": [], "segment_ranges_temp": []}
+            speaker_data_map[speaker_id]["segments"].append({"start": start_s, "end": end_s, "audioUrl": segment_url})
+            speaker_data_map[speaker_id]["segment_ranges_temp"].append(segment_range)
+    ctx["speaker_data_map"] = speaker_data_map
+
+def _stage_segment_policy(ctx):
+    # 3b. Inference Windows for the audio classifiers: micro-turns merged, long turns split (see utils/segment_policy.py)
+    task_id, results = ctx["task_id"], ctx["results"]
+    turns, turn_refs, planned, no_speech = [], [], [], set()
+    for speaker_id, data in ctx["speaker_data_map"].items():
+        for segment_info, (start, end) in zip(data["segments"], data["segment_ranges_temp"]):
+            # Turns are trimmed to the speech they contain; mostly-silent ones (hold music, line noise) are not scored
+            speech = clip_regions(ctx["speech_regions"], start, end)
+            # (a turn without any speech is never scored, even with VAD_MIN_TURN_SPEECH_FRACTION=0)
+            if not speech or sum(e - s for s, e in speech) < VAD_MIN_TURN_SPEECH_FRACTION * (end - start):
+                no_speech.add(len(turn_refs))
+            else:
+                planned.append(len(turn_refs))
+                turns.append((speaker_id, speech[0][0], speech[-1][1]))
+            turn_refs.append((speaker_id, segment_info))
+    plan = plan_inference_windows(turns, ctx["sr"], SEGMENT_MERGE_MIN_S, SEGMENT_MERGE_MAX_GAP_S,
+                                  SEGMENT_WINDOW_S, SEGMENT_WINDOW_HOP_S, SEGMENT_MAX_WINDOW_S)
+    turn_windows = [[] for _ in turn_refs]
+    for i, weights in zip(planned, plan["turnWindows"]): turn_windows[i] = weights
+    plan.update({"turnRefs": turn_refs, "turnWindows": turn_windows, "noSpeechTurns": no_speech})
+    plan["stats"]["noSpeechTurns"] = len(no_speech)
+    ctx["inference_plan"] = plan
+    results["metrics"]["segmentPolicy"] = plan["stats"]
+    print(f"[Task {task_id}] Segment policy: {plan['stats']['turns']} turns -> {plan['stats']['units']} units, "
+          f"{plan['stats']['windows']} windows (longest {plan['stats']['longestWindowS']}s)")
+
+def _stage_asr(ctx):
+    # 4. Transcription (chunked over the shared buffer, or per diarized turn)
+    task_id, results, sr = ctx["task_id"], ctx["results"], ctx["sr"]
+    speaker_data_map = ctx.get("speaker_data_map")
+    print(f"[Task {task_id}] Running ASR ({ASR_MODE} mode)...")
+    try:
+        if ASR_MODE == "segments" and speaker_data_map:
+            turns = sorted(
+                (segment_range for data in speaker_data_map.values() for segment_range in data["segment_ranges_temp"]),
+                key=lambda turn: turn[0]
+            )
+            turn_texts = []
+            for start, end in turns:
+                # Only the speech inside the turn; turns without any are skipped
+                turn_asr = transcribe_speech(ctx["audio"], clip_regions(ctx["speech_regions"], start, end), sr)
+                if turn_asr["text"]: turn_texts.append(turn_asr["text"])
+                results["wordTimestamps"].extend(turn_asr["words"])
+            asr_text = " ".join(turn_texts)
+        else:
+            asr_result = transcribe_speech(ctx["audio"], ctx["speech_regions"], sr)
+            asr_text = asr_result["text"]
+            results["wordTimestamps"] = asr_result["words"]
+        results["transcription"] = asr_text if asr_text else "Transcription not available."
+        print(f"[Task {task_id}] ASR: {results['transcription'][:100]}... ({len(results['wordTimestamps'])} words)")
+    except Exception as e:
+        results["transcription"] = f"Transcription error: {type(e).__name__}"
+        print(f"Error during ASR: {e}")
+    # Save transcription to history (bulk analyses hand it back to the API process instead, see analyze_audio)
+    if ctx["persist"]: save_transcription_to_history(results["transcription"])
+
+def _stage_text_sentiment(ctx):
+    # 5. Text Sentiment (Overall)
+    task_id, results = ctx["task_id"], ctx["results"]
+    print(f"[Task {task_id}] Analyzing overall text sentiment...")
+    results["textSentimentOverall"] = get_text_sentiment(results["transcription"])
+    print(f"[Task {task_id}] Overall Text Sentiment: {results['textSentimentOverall'].get('dominant', 'N/A')}")
+
+def _stage_word_cloud(ctx):
+    # 6. Word Cloud
+    print(f"[Task {ctx['task_id']}] Generating word cloud...")
+    ctx["results"]["wordCloudData"] = generate_word_cloud_base64(ctx["results"]["transcription"])
+
+def _stage_gender(ctx):
+    # 7. Gender Prediction
+    task_id, results, plan, sr = ctx["task_id"], ctx["results"], ctx["inference_plan"], ctx["sr"]
+    # One bounded window per speaker: their first one of at least SEGMENT_MERGE_MIN_S, else their longest
+    speaker_windows = {}
+    for unit, start, end in plan["windows"]:
+        speaker = plan["units"][unit]["speaker"]
+        current = speaker_windows.get(speaker)
+        if current is None or (current[1] - current[0] < SEGMENT_MERGE_MIN_S * sr and end - start > current[1] - current[0]):
+            speaker_windows[speaker] = (start, end)
+    for speaker_id, data in ctx["speaker_data_map"].items():
+        print(f"[Task {task_id}] Analyzing speaker: {speaker_id}")
+        if speaker_id in speaker_windows:
+            start, end = speaker_windows[speaker_id]
+            data["gender"] = predict_gender(ctx["audio"][start:end], sampling_rate=sr)
+        else:
+            data["gender"] = "Unknown (No Speech)" if data["segments"] else "Unknown (No Segments)"
+        # Add speaker data to final results (excluding temp views)
+        results["speakers"].append({"id": data["id"], "gender": data["gender"], "segments": data["segments"]})
+
+def _stage_speech_emotion(ctx):
+    # 8. Speech Emotion Timeline (every inference window of the call in one batched call, probabilities averaged back per turn)
+    task_id, results, plan = ctx["task_id"], ctx["results"], ctx["inference_plan"]
+    print(f"[Task {task_id}] Running batched speech emotion recognition...")
+    window_views = [ctx["audio"][start:end] for _, start, end in plan["windows"]]
+    def on_progress(done, total):
+        ctx["emit"]("progress", {"stage": "speech_emotion", "done": done, "total": total,
+                                 "percent": round(100 * done / total, 1) if total else 100.0})
+    scores, errors, emotion_stats = speech_emotion_scores(window_views, sampling_rate=ctx["sr"], on_progress=on_progress)
+    emotion_stats["turns"] = len(plan["turnRefs"])
+    results["metrics"]["speechEmotion"] = emotion_stats
+    emotions = []
+    for i, (weights, score) in enumerate(zip(plan["turnWindows"], aggregate_window_scores(plan["turnWindows"], scores))):
+        if score is not None: emotions.append(speech_emotion_label(score))
+        elif i in plan["noSpeechTurns"]: emotions.append("No Speech")
+        else: emotions.append(next((errors[w] for w, _ in weights if errors[w]), "Unknown"))
+    all_speech_emotions = []
+    for (speaker_id, segment_info), emotion in zip(plan["turnRefs"], emotions):
+        results["speechEmotionTimeline"].append({
+            "speaker": speaker_id, "start": segment_info["start"],
+            "end": segment_info["end"], "emotion": emotion
+        })
+        if emotion not in ["Unknown", "N/A (Models Failed)", "OOM Error", "No Speech"]:
+             all_speech_emotions.append(emotion)
+
+    # 9. Calculate Overall Speech Emotion Distribution
+    print(f"[Task {task_id}] Calculating overall speech emotion...")
+    if all_speech_emotions:
+        emotion_counts = Counter(all_speech_emotions)
+        total_valid = len(all_speech_emotions)
+        results["speechEmotionOverall"] = {
+            emo: round(count / total_valid, 3) for emo, count in emotion_counts.items()
+        }
+    print(f"[Task {task_id}] Overall Speech Emotion Dist: {results['speechEmotionOverall']}")
+
+def _stage_text_timeline(ctx):
+    # 10. Text Emotion Timeline (phrases timed by ASR word timestamps)
+    task_id, results = ctx["task_id"], ctx["results"]
+    print(f"[Task {task_id}] Analyzing text emotion timeline...")
+    if results["wordTimestamps"]:
+         phrases = group_words_into_phrases(results["wordTimestamps"])
+         for phrase, phrase_sentiment in zip(phrases, get_text_sentiment_batch([p["text"] for p in phrases])):
+             results["textEmotionTimeline"].append({"start": phrase["start"], "end": phrase["end"], "emotion": phrase_sentiment["dominant"]})
+    elif results["transcription"] and results["transcription"].lower() != "transcription not available." and not results["transcription"].startswith("Transcription error") and ctx["duration"] > 0:
+         # No word timings: fall back to spreading sentences evenly over the call
+         sentences = [s.strip() for s in results["transcription"].split('.') if s.strip()]
+         num_sentences = len(sentences)
+         time_per_sentence = ctx["duration"] / num_sentences if num_sentences > 0 else 0
+         current_time = 0.0
+         for sent_sentiment in get_text_sentiment_batch(sentences):
+             start_approx = round(current_time, 2)
+             end_approx = round(current_time + time_per_sentence, 2)
+             results["textEmotionTimeline"].append({"start": start_approx, "end": end_approx, "emotion": sent_sentiment["dominant"]})
+             current_time = end_approx
+         if results["textEmotionTimeline"]: results["textEmotionTimeline"][-1]["end"] = results["audioDuration"]
+    results["metrics"]["textSentimentCache"] = get_text_sentiment_cache_stats()
+
+def _stage_comparison(ctx):
+    # 11. Emotion Comparison (Simplified)
+    task_id, results = ctx["task_id"], ctx["results"]
+    print(f"[Task {task_id}] Generating simplified emotion comparison...")
+    if results["speechEmotionTimeline"] and results["textEmotionTimeline"]:
+        # Each text segment takes the unused speech segment it overlaps most; only overlapping ones are visited
+        speech_timeline = results["speechEmotionTimeline"]
+        results["emotionComparison"] = []
+        for text_idx, speech_idx, _ in align_greedy(results["textEmotionTimeline"], speech_timeline, min_overlap=0.1):
+            speech_seg, text_seg = speech_timeline[speech_idx], results["textEmotionTimeline"][text_idx]
+            results["emotionComparison"].append({
+                "segment": f"{speech_seg['start']:.1f}s-{speech_seg['end']:.1f}s ({speech_seg['speaker']})",
+                "speechEmotion": speech_seg['emotion'], "textEmotion": text_seg['emotion']
+            })
+
+def _stage_satisfaction(ctx):
+    # 12. Satisfaction Prediction (Placeholder Heuristic)
+    task_id, results = ctx["task_id"], ctx["results"]
+    print(f"[Task {task_id}] Predicting satisfaction...")
+    scores = results["textSentimentOverall"].get("scores", {})
+    happy_score = scores.get("Happy", 0); sad_score = scores.get("Sad", 0); angry_score = scores.get("Angry", 0)
+    satisfaction_value = 0.5 + (happy_score * 0.3) - (sad_score * 0.2) - (angry_score * 0.4)
+    satisfaction_value = max(0, min(1, satisfaction_value))
+    results["satisfactionPrediction"] = {"value": round(satisfaction_value, 2), "label": satisfaction_label(satisfaction_value)}
+    print(f"[Task {task_id}] Predicted Satisfaction: {results['satisfactionPrediction']}")
+
+def build_analysis_graph(asr_mode=None):
+    asr_mode = asr_mode or ASR_MODE
+    # Per-turn ASR needs the diarized turns; full-call ASR only needs the speech regions
+    asr_deps = ("segments", "vad") if asr_mode == "segments" else ("vad",)
+    return StageGraph([
+        Stage("decode", _stage_decode),
+        Stage("vad", _stage_vad, deps=("decode",)),
+        Stage("diarization", _stage_diarization, deps=("decode",)),
+        Stage("segments", _stage_segments, deps=("diarization",)),
+        Stage("asr", _stage_asr, deps=asr_deps),
+        Stage("text_sentiment", _stage_text_sentiment, deps=("asr",)),
+        Stage("word_cloud", _stage_word_cloud, deps=("asr",)),
+        Stage("text_timeline", _stage_text_timeline, deps=("asr",)),
+        Stage("segment_policy", _stage_segment_policy, deps=("segments", "vad")),
+        Stage("gender", _stage_gender, deps=("segment_policy",)),
+        Stage("speech_emotion", _stage_speech_emotion, deps=("segment_policy",)),
+        Stage("comparison", _stage_comparison, deps=("speech_emotion", "text_timeline")),
+        Stage("satisfaction", _stage_satisfaction, deps=("text_sentiment",)),
+    ])
+
+# Result keys that are final once a stage completes, pushed to clients as partial results (see partial_summary)
+STAGE_PARTIAL_KEYS = {
+    "decode": ("audioDuration",),
+    "asr": ("transcription", "wordTimestamps"),
+    "text_sentiment": ("textSentimentOverall",),
+    "word_cloud": ("wordCloudData",),
+    "text_timeline": ("textEmotionTimeline",),
+    "gender": ("speakers",),
+    "speech_emotion": ("speechEmotionTimeline", "speechEmotionOverall"),
+    "comparison": ("emotionComparison",),
+    "satisfaction": ("satisfactionPrediction",),
+}
+
+# Partial events are stored per task in SQLite: bulky keys only go out as summaries, the full values come from /analysis
+PARTIAL_SUMMARIES = {
+    "transcription": lambda text: {"chars": len(text or ""), "preview": (text or "")[:500]},
+    "wordTimestamps": lambda words: {"count": len(words)},
+    "wordCloudData": lambda image: {"ready": image is not None},
+    "textEmotionTimeline": lambda timeline: {"count": len(timeline)},
+    "speechEmotionTimeline": lambda timeline: {"count": len(timeline)},
+    "emotionComparison": lambda pairs: {"count": len(pairs)},
+    "speakers": lambda speakers: [{"id": s["id"], "gender": s["gender"], "segments": len(s["segments"])} for s in speakers],
+}
+
+def partial_summary(results, keys):
+    return {key: PARTIAL_SUMMARIES[key](results[key]) if key in PARTIAL_SUMMARIES else results[key] for key in keys}
+
+_event_stores = {}
+
+def task_event_emitter(task_id, event_db_path=None):
+    """Returns emit(event, data) appending to the task's event log in the shared task store.
+
+    A failing write only logs a warning: progress events must never fail the analysis itself.
+    """
+    if not event_db_path: return lambda event, data: None
+    if event_db_path not in _event_stores: _event_stores[event_db_path] = TaskStore(event_db_path)
+    store = _event_stores[event_db_path]
+    def emit(event, data):
+        try:
+            store.add_event(task_id, event, data)
+        except Exception as e:
+            print(f"Warning: [Task {task_id}] could not record '{event}' event: {e}")
+    return emit
 
 #main analysis function
-def analyze_audio(original_audio_path: str, task_id: str, original_filename: str):
-    global asr_pipeline_global, diarization_pipeline_global
+def analyze_audio(original_audio_path: str, task_id: str, original_filename: str, event_db_path=None, persist=True):
+    # persist=False leaves the call-store writes to the caller: the records come back as results["storeRecords"]
     if not models_loaded_successfully:
          return {"error": "Backend models are not loaded. Cannot perform analysis.", "taskId": task_id, "fileName": original_filename}
 
     print(f"[Task {task_id}] Starting analysis for: {original_filename}")
-    TASK_DATA_DIR = os.path.join("data", "speaker_segments", task_id)
-    os.makedirs(TASK_DATA_DIR, exist_ok=True)
     saved_file_extension = os.path.splitext(original_filename)[1]
     saved_filename_on_disk = f"{task_id}{saved_file_extension}"
 
@@ -279,162 +798,47 @@ def analyze_audio(original_audio_path: str, task_id: str, original_filename: str
         "originalAudioUrl": f"/api/audio/{task_id}/{saved_filename_on_disk}",
         "transcription": None, "speakers": [], "speechEmotionOverall": {},
         "speechEmotionTimeline": [], "textSentimentOverall": {}, "textEmotionTimeline": [],
-        "wordCloudData": None, "emotionComparison": [],
-        "satisfactionPrediction": {"value": 0.5, "label": "Neutral"}, "error": None
+        "wordTimestamps": [], "wordCloudData": None, "emotionComparison": [],
+        "satisfactionPrediction": {"value": 0.5, "label": "Neutral"}, "metrics": {}, "error": None
     }
-
+    emit = task_event_emitter(task_id, event_db_path)
+    ctx = {"task_id": task_id, "audio_path": original_audio_path, "sr": ANALYSIS_SAMPLE_RATE, "results": results, "emit": emit, "persist": persist}
+    graph = build_analysis_graph()
+    completed_stages = []
+
+    def on_stage_event(name, state):
+        # Runs on the stage's pool thread; completed stages only ever publish keys nothing else writes
+        if state == "completed": completed_stages.append(name)
+        emit("stage", {"stage": name, "state": state, "progress": round(len(completed_stages) / len(graph.stages), 3)})
+        if state == "completed" and name in STAGE_PARTIAL_KEYS:
+            emit("partial", partial_summary(results, STAGE_PARTIAL_KEYS[name]))
+
+    analysis_start = time.perf_counter()
     try:
-        # 1. Load Audio
-        print(f"[Task {task_id}] Loading audio: {original_audio_path}")
-        y, sr = librosa.load(original_audio_path, sr=None)
-        audio_duration = librosa.get_duration(y=y, sr=sr)
-        results["audioDuration"] = round(audio_duration, 2)
-        print(f"[Task {task_id}] Audio Duration: {results['audioDuration']}s")
-        try:
-            audio_segment_full = AudioSegment.from_file(original_audio_path)
-        except Exception as e:
-            raise Exception(f"Pydub failed to load audio file ({type(e).__name__}): {e}. Is ffmpeg installed and working?") from e
-
-        # 2. Diarization
-        print(f"[Task {task_id}] Running diarization...")
-        if not diarization_pipeline_global: raise Exception("Diarization pipeline not loaded.")
-        diarization = diarization_pipeline_global({"uri": task_id, "audio": original_audio_path})
-        print(f"[Task {task_id}] Diarization found {len(diarization.labels())} unique speaker labels.")
-
-        # 3. Process Speakers and Segments
-        speaker_data_map = {}
-        if diarization:
-            for turn, _, speaker_id in diarization.itertracks(yield_label=True):
-                start_ms, end_ms = int(turn.start * 1000), int(turn.end * 1000)
-                start_s, end_s = round(turn.start, 2), round(turn.end, 2)
-                start_ms = max(0, start_ms); end_ms = min(len(audio_segment_full), end_ms)
-                if start_ms >= end_ms: continue
-                segment_audio = audio_segment_full[start_ms:end_ms]
-                segment_filename = f"{speaker_id}_{start_ms}-{end_ms}.wav"
-                segment_filepath = os.path.join(TASK_DATA_DIR, segment_filename)
-                try:
-                    segment_audio.export(segment_filepath, format="wav")
-                    segment_url = f"/api/audio/{task_id}/{segment_filename}"
-                    if speaker_id not in speaker_data_map:
-                         speaker_data_map[speaker_id] = {"id": speaker_id, "gender": "Unknown", "segments": [], "segment_paths_temp": []}
-                    speaker_data_map[speaker_id]["segments"].append({"start": start_s, "end": end_s, "audioUrl": segment_url})
-                    speaker_data_map[speaker_id]["segment_paths_temp"].append(segment_filepath)
-                except Exception as e:
-                    print(f"Warning: Failed to export segment {segment_filename}. Error: {e}")
-        
-        # 4. Transcription (on original full audio)
-        print(f"[Task {task_id}] Running ASR...")
-        try:
-            if not asr_pipeline_global: raise Exception("ASR pipeline not loaded.")
-            audio_16k, _ = librosa.load(original_audio_path, sr=16000)
-            asr_result = asr_pipeline_global(audio_16k) 
-            results["transcription"] = asr_result["text"].strip() if asr_result and asr_result.get("text") else "Transcription not available."
-            print(f"[Task {task_id}] ASR: {results['transcription'][:100]}...")
-        except Exception as e:
-            results["transcription"] = f"Transcription error: {type(e).__name__}"
-            print(f"Error during ASR: {e}")
-        # Save transcription to history
-        save_transcription_to_history(results["transcription"])
-
-        # 5. Text Sentiment (Overall)
-        print(f"[Task {task_id}] Analyzing overall text sentiment...")
-        results["textSentimentOverall"] = get_text_sentiment(results["transcription"])
-        print(f"[Task {task_id}] Overall Text Sentiment: {results['textSentimentOverall'].get('dominant', 'N/A')}")
-
-        # 6. Word Cloud
-        print(f"[Task {task_id}] Generating word cloud...")
-        results["wordCloudData"] = generate_word_cloud_base64(results["transcription"])
-
-        # --- Speaker Specific Analysis ---
-        all_speech_emotions = []
-        for speaker_id, data in speaker_data_map.items():
-            # 7. Gender Prediction
-            print(f"[Task {task_id}] Analyzing speaker: {speaker_id}")
-            if data["segment_paths_temp"]:
-                data["gender"] = predict_gender(data["segment_paths_temp"][0])
-            else:
-                data["gender"] = "Unknown (No Segments)"
-
-            # 8. Speech Emotion Timeline
-            for i, segment_info in enumerate(data["segments"]):
-                segment_filepath = data["segment_paths_temp"][i]
-                if os.path.exists(segment_filepath):
-                    emotion = predict_speech_emotion(segment_filepath)
-                    results["speechEmotionTimeline"].append({
-                        "speaker": speaker_id, "start": segment_info["start"],
-                        "end": segment_info["end"], "emotion": emotion
-                    })
-                    if emotion not in ["Unknown", "N/A (Models Failed)", "OOM Error"]:
-                         all_speech_emotions.append(emotion)
-            # Add speaker data to final results (excluding temp paths)
-            results["speakers"].append({"id": data["id"], "gender": data["gender"], "segments": data["segments"]})
-
-        # 9. Calculate Overall Speech Emotion Distribution
-        print(f"[Task {task_id}] Calculating overall speech emotion...")
-        if all_speech_emotions:
-            emotion_counts = Counter(all_speech_emotions)
-            total_valid = len(all_speech_emotions)
-            results["speechEmotionOverall"] = {
-                emo: round(count / total_valid, 3) for emo, count in emotion_counts.items()
-            }
-        print(f"[Task {task_id}] Overall Speech Emotion Dist: {results['speechEmotionOverall']}")
-
-        # 10. Text Emotion Timeline (Approx)
-        print(f"[Task {task_id}] Analyzing text emotion timeline (approx)...")
-        if results["transcription"] and results["transcription"].lower() != "transcription not available." and not results["transcription"].startswith("Transcription error") and audio_duration > 0:
-             sentences = [s.strip() for s in results["transcription"].split('.') if s.strip()]
-             num_sentences = len(sentences)
-             time_per_sentence = audio_duration / num_sentences if num_sentences > 0 else 0
-             current_time = 0.0
-             for sent in sentences:
-                 start_approx = round(current_time, 2)
-                 end_approx = round(current_time + time_per_sentence, 2)
-                 sent_sentiment = get_text_sentiment(sent)["dominant"]
-                 results["textEmotionTimeline"].append({"start": start_approx, "end": end_approx, "emotion": sent_sentiment})
-                 current_time = end_approx
-             if results["textEmotionTimeline"]: results["textEmotionTimeline"][-1]["end"] = results["audioDuration"]
-
-        # 11. Emotion Comparison (Simplified)
-        print(f"[Task {task_id}] Generating simplified emotion comparison...")
-        if results["speechEmotionTimeline"] and results["textEmotionTimeline"]:
-            processed_speech_indices = set()
-            results["emotionComparison"] = [] 
-            for text_seg in results["textEmotionTimeline"]:
-                 best_overlap = 0; best_speech_seg = None; best_speech_idx = -1
-                 for idx, speech_seg in enumerate(results["speechEmotionTimeline"]):
-                     overlap_start = max(text_seg['start'], speech_seg['start'])
-                     overlap_end = min(text_seg['end'], speech_seg['end'])
-                     overlap_duration = max(0, overlap_end - overlap_start)
-                     if overlap_duration > 0.1 and idx not in processed_speech_indices:
-                          if overlap_duration > best_overlap:
-                              best_overlap = overlap_duration; best_speech_seg = speech_seg; best_speech_idx = idx
-                 if best_speech_seg:
-                      results["emotionComparison"].append({
-                          "segment": f"{best_speech_seg['start']:.1f}s-{best_speech_seg['end']:.1f}s ({best_speech_seg['speaker']})",
-                          "speechEmotion": best_speech_seg['emotion'], "textEmotion": text_seg['emotion']
-                      })
-                      processed_speech_indices.add(best_speech_idx)
-        
-        # 12. Satisfaction Prediction (Placeholder Heuristic)
-        print(f"[Task {task_id}] Predicting satisfaction...")
-        scores = results["textSentimentOverall"].get("scores", {})
-        happy_score = scores.get("Happy", 0); sad_score = scores.get("Sad", 0); angry_score = scores.get("Angry", 0)
-        satisfaction_value = 0.5 + (happy_score * 0.3) - (sad_score * 0.2) - (angry_score * 0.4)
-        satisfaction_value = max(0, min(1, satisfaction_value))
-        if satisfaction_value >= 0.7: sat_label = "Satisfied"
-        elif satisfaction_value <= 0.4: sat_label = "Unsatisfied"
-        else: sat_label = "Neutral"
-        results["satisfactionPrediction"] = {"value": round(satisfaction_value, 2), "label": sat_label}
-        print(f"[Task {task_id}] Predicted Satisfaction: {results['satisfactionPrediction']}")
-
+        stage_seconds = graph.run(ctx, max_workers=PIPELINE_WORKERS, on_stage_event=on_stage_event)
+        results["metrics"]["stageSeconds"] = stage_seconds
     except Exception as e:
         print(f"ERROR during analysis pipeline for task {task_id}: {e}")
         traceback.print_exc()
         results["error"] = f"Analysis pipeline failed: {type(e).__name__} - {e}"
 
-    print(f"[Task {task_id}] Analysis function finished.")
+    total_seconds = time.perf_counter() - analysis_start
+    results["metrics"].update({
+        "totalSeconds": round(total_seconds, 3),
+        # Processing time per second of audio; below 1 means faster than real time
+        "realTimeFactor": round(total_seconds / results["audioDuration"], 4) if results["audioDuration"] else None,
+        "modelLoadSeconds": dict(MODEL_LOAD_SECONDS),
+        "workerRssBytes": process_rss_bytes(),
+        "workerPeakRssBytes": peak_rss_bytes(),
+    })
+    print(f"[Task {task_id}] Analysis function finished in {results['metrics']['totalSeconds']}s (RTF {results['metrics']['realTimeFactor']}).")
     filtered = {}
-    excluded_keys = ["taskId", "originalAudioUrl", "speakers", "speechEmotionTimeline", "textEmotionTimeline", "wordCloudData", "error","audioDuration", "textSentimentOverall", "emotionComparison", "satisfactionPrediction"]
+    # audioDuration, textSentimentOverall and satisfactionPrediction are kept: they feed the historical rollups
+    excluded_keys = ["taskId", "originalAudioUrl", "speakers", "speechEmotionTimeline", "textEmotionTimeline", "wordCloudData", "error", "emotionComparison", "metrics", "wordTimestamps"]
     filtered = {k: v for k, v in results.items() if k not in excluded_keys}
-    save_call_data(filtered)  # Save the results to call_data.json
+    if persist:
+        save_call_data(filtered)  # Append the results to the call store
+    else:
+        filtered["timestamp"] = datetime.now(timezone.utc).isoformat()
+        results["storeRecords"] = {"call": filtered, "transcription": results["transcription"]}
     return results
@@ -0,0 +1,99 @@
+# backend/models/stage_graph.py
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+try:
+    import torch
+except ImportError: # the scheduling needs no torch; without it stages just run without a thread budget
+    torch = None
+
+# Intra-op threads torch started with in this process. Stage budgets are derived from this, never from the
+# current setting: set_num_threads is per thread on OpenMP builds but process-wide on native thread-pool
+# builds, where reading it back after a run would shrink every following run's budget.
+BASE_TORCH_THREADS = torch.get_num_threads() if torch is not None else None
+
+class Stage:
+    def __init__(self, name, fn, deps=()):
+        self.name = name
+        self.fn = fn # fn(ctx) -> None, reads/writes the shared context dict
+        self.deps = tuple(deps)
+
+
+class StageGraph:
+    """Runs pipeline stages on a thread pool as soon as their declared dependencies finish.
+
+    Independent stages overlap; torch intra-op threads are divided between the stages that
+    can run at the same time so concurrent stages don't oversubscribe the cores.
+    """
+
+    def __init__(self, stages):
+        self.stages = {stage.name: stage for stage in stages}
+        for stage in stages:
+            for dep in stage.deps:
+                if dep not in self.stages:
+                    raise ValueError(f"Stage '{stage.name}' depends on unknown stage '{dep}'")
+        self.levels = self._levels()
+
+    def _levels(self):
+        # Topological layering; also rejects cycles
+        remaining = dict(self.stages)
+        done, levels = set(), []
+        while remaining:
+            level = [name for name, stage in remaining.items() if all(dep in done for dep in stage.deps)]
+            if not level:
+                raise ValueError(f"Stage graph has a cycle among: {', '.join(remaining)}")
+            levels.append(level)
+            done.update(level)
+            for name in level: remaining.pop(name)
+        return levels
+
+    def max_parallelism(self):
+        return max((len(level) for level in self.levels), default=1)
+
+    def run(self, ctx, max_workers=2, on_stage_event=None):
+        """Executes every stage; returns {stage name: seconds}. Re-raises the first stage failure."""
+        workers = max(1, min(max_workers, self.max_parallelism()))
+        threads_per_stage = max(1, BASE_TORCH_THREADS // workers) if torch is not None else None
+        timings = {}
+        timings_lock = threading.Lock()
+
+        def run_stage(stage):
+            # Every stage of a run sets the same value, so it doesn't matter whether the setting is per
+            # thread (OpenMP) or process-wide: concurrent stages never change each other's thread count
+            if threads_per_stage: torch.set_num_threads(threads_per_stage)
+            if on_stage_event: on_stage_event(stage.name, "started")
+            start = time.perf_counter()
+            try:
+                stage.fn(ctx)
+            finally:
+                with timings_lock:
+                    timings[stage.name] = round(time.perf_counter() - start, 3)
+            if on_stage_event: on_stage_event(stage.name, "completed")
+
+        pending_deps = {name: set(stage.deps) for name, stage in self.stages.items()}
+        dependents = {name: [] for name in self.stages}
+        for name, stage in self.stages.items():
+            for dep in stage.deps: dependents[dep].append(name)
+
+        failure = None
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="stage") as pool:
+            running = {}
+            for name, deps in pending_deps.items():
+                if not deps: running[pool.submit(run_stage, self.stages[name])] = name
+            while running:
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    name = running.pop(future)
+                    error = future.exception()
+                    if error is not None:
+                        # Stop scheduling new stages, let the ones in flight finish, then re-raise
+                        if failure is None: failure = error
+                        continue
+                    if failure is not None: continue
+                    for dependent in dependents[name]:
+                        pending_deps[dependent].discard(name)
+                        if not pending_deps[dependent]:
+                            running[pool.submit(run_stage, self.stages[dependent])] = dependent
+        if failure is not None:
+            raise failure
+        return timings
@@ -0,0 +1,113 @@
+# backend/tests/test_call_store.py
+import random
+from collections import Counter
+
+import pytest
+
+from utils.call_store import (DAY_MS, HOUR_MS, SATISFACTION_BINS, CallStore, _histogram_percentile,
+                              count_words, satisfaction_label)
+
+START_MS = 1_700_000_000_000 - 1_700_000_000_000 % DAY_MS + 5 * 60 * 1000 # a few minutes past midnight UTC
+SPAN_MS = 10 * DAY_MS
+EMOTIONS = ("Neutral", "Happy", "Angry", "Sad")
+SENTIMENTS = ("positive", "neutral", "negative")
+WORDS = "refund billing order delivery manager account payment card charge waiting happy angry great".split()
+
+
+def _random_call(rng):
+    shares = [rng.random() for _ in EMOTIONS]
+    record = {
+        "timestamp": START_MS + rng.randrange(SPAN_MS),
+        "fileName": f"call_{rng.randrange(1000)}.wav",
+        "audioDuration": round(rng.uniform(5, 900), 2),
+        "speechEmotionOverall": {emotion: share / sum(shares) for emotion, share in zip(EMOTIONS, shares)},
+        "transcription": " ".join(rng.choice(WORDS) for _ in range(rng.randint(0, 30))),
+    }
+    if rng.random() < 0.8: record["satisfactionPrediction"] = {"value": round(rng.random(), 3)}
+    if rng.random() < 0.8: record["textSentimentOverall"] = {"dominant": rng.choice(SENTIMENTS)}
+    return record
+
+
+def _expected_analytics(calls):
+    # Recomputed from the raw records the way call_analytics aggregates its rollups
+    satisfactions = [call["satisfactionPrediction"]["value"] for call in calls if "satisfactionPrediction" in call]
+    hist = [0] * SATISFACTION_BINS
+    for value in satisfactions: hist[min(int(value * SATISFACTION_BINS), SATISFACTION_BINS - 1)] += 1
+    emotions, sentiments = Counter(), Counter()
+    for call in calls:
+        emotions.update(call["speechEmotionOverall"])
+        if "textSentimentOverall" in call: sentiments[call["textSentimentOverall"]["dominant"]] += 1
+    mean = sum(satisfactions) / len(satisfactions) if satisfactions else None
+    return {
+        "calls": len(calls),
+        "totalAudioSeconds": round(sum(call["audioDuration"] for call in calls), 2),
+        "speechEmotionDistribution": {k: round(v / len(calls), 3) for k, v in emotions.items()} if calls else {},
+        "textSentimentDistribution": {k: round(v / len(calls), 3) for k, v in sentiments.items()} if calls else {},
+        "satisfaction": {
+            "mean": round(mean, 3) if mean is not None else None,
+            "p50": _histogram_percentile(hist, 0.5),
+            "p90": _histogram_percentile(hist, 0.9),
+            "label": satisfaction_label(mean) if mean is not None else "No Data",
+        },
+    }
+
+
+def _random_window(rng):
+    start = START_MS - DAY_MS + rng.randrange(SPAN_MS + 2 * DAY_MS)
+    end = start + rng.choice((rng.randrange(1, HOUR_MS), rng.randrange(1, DAY_MS), rng.randrange(1, SPAN_MS), 24 * HOUR_MS))
+    if rng.random() < 0.3: start -= start % HOUR_MS
+    return rng.choice((start, None)), rng.choice((end, end, None))
+
+
+@pytest.fixture
+def store_and_calls(tmp_path):
+    rng = random.Random(42)
+    store = CallStore(str(tmp_path / "calls.db"))
+    calls = [_random_call(rng) for _ in range(300)]
+    store.append_many(calls=calls[:200], transcriptions=[(call["transcription"], call["timestamp"]) for call in calls[:200]])
+    for call in calls[200:]:
+        store.append_call(call)
+        store.append_transcription(call["transcription"], call["timestamp"])
+    return store, calls
+
+
+def _approx(analytics):
+    # Rollups sum floats in a different order than the recomputation
+    return {**analytics, "speechEmotionDistribution": pytest.approx(analytics["speechEmotionDistribution"], abs=1e-3),
+            "totalAudioSeconds": pytest.approx(analytics["totalAudioSeconds"], abs=0.02)}
+
+
+def test_call_analytics_match_recomputation(store_and_calls):
+    store, calls = store_and_calls
+    rng = random.Random(1)
+    for _ in range(200):
+        start, end = _random_window(rng)
+        # Analytics have hour resolution: the hours the window touches count whole
+        low = start - start % HOUR_MS if start is not None else None
+        high = -(-end // HOUR_MS) * HOUR_MS if end is not None else None
+        inside = [call for call in calls if (low is None or call["timestamp"] >= low) and (high is None or call["timestamp"] < high)]
+        assert store.call_analytics(start, end) == _approx(_expected_analytics(inside))
+
+
+def test_word_frequencies_and_version_match_raw_rows(store_and_calls):
+    store, calls = store_and_calls
+    rng = random.Random(2)
+    for _ in range(200):
+        start, end = _random_window(rng)
+        inside = [call for call in calls if (start is None or call["timestamp"] >= start) and (end is None or call["timestamp"] < end)]
+        expected = Counter()
+        for call in inside: expected.update(count_words(call["transcription"]))
+        assert store.word_frequencies(start, end, limit=len(WORDS)) == dict(expected)
+        assert store.transcriptions_version(start, end)[0] == len(inside)
+
+
+def test_backfill_rebuilds_the_same_rollups(store_and_calls):
+    store, _ = store_and_calls
+    before = [dict(row) for row in store.db.query("SELECT * FROM call_rollups ORDER BY granularity, bucket")]
+    words_before = [dict(row) for row in store.db.query("SELECT * FROM word_counts ORDER BY day, word")]
+    store.db.execute("INSERT INTO meta (key, value) VALUES ('json_migrated', 'test')")
+    store.db.execute("DELETE FROM meta WHERE key IN ('call_rollups_built', 'word_rollups_built')")
+    assert store.migrate_json("missing.json", "missing.json") == 0
+    # Replayed in id order, so the float sums come out bit for bit the same
+    assert [dict(row) for row in store.db.query("SELECT * FROM call_rollups ORDER BY granularity, bucket")] == before
+    assert [dict(row) for row in store.db.query("SELECT * FROM word_counts ORDER BY day, word")] == words_before
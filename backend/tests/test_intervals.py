@@ -0,0 +1,59 @@
+# backend/tests/test_intervals.py
+import random
+
+from utils.intervals import IntervalIndex, align_greedy, overlap_seconds
+
+
+def _random_intervals(rng, count, duration=120.0):
+    intervals = []
+    for _ in range(count):
+        start = round(rng.uniform(0, duration), rng.choice((0, 1, 2)))
+        length = rng.choice((0.0, 0.05, 0.5, round(rng.uniform(0.1, 15), 1)))
+        intervals.append({"start": start, "end": start + length})
+    return intervals
+
+
+def _align_nested(queries, targets, min_overlap=0.1):
+    # The scan align_greedy replaced: every query against every target
+    used, pairs = set(), []
+    for q, query in enumerate(queries):
+        best, best_overlap = None, 0
+        for t, target in enumerate(targets):
+            if t in used: continue
+            overlap = overlap_seconds(query["start"], query["end"], target["start"], target["end"])
+            if overlap > min_overlap and overlap > best_overlap:
+                best, best_overlap = t, overlap
+        if best is not None:
+            used.add(best)
+            pairs.append((q, best, best_overlap))
+    return pairs
+
+
+def test_align_greedy_matches_nested_scan():
+    rng = random.Random(1234)
+    for _ in range(300):
+        queries = _random_intervals(rng, rng.randint(0, 40))
+        targets = _random_intervals(rng, rng.randint(0, 40))
+        min_overlap = rng.choice((0.0, 0.1, 0.5))
+        assert align_greedy(queries, targets, min_overlap) == _align_nested(queries, targets, min_overlap)
+
+
+def test_align_greedy_ties_go_to_earliest_target():
+    queries = [{"start": 0.0, "end": 10.0}]
+    targets = [{"start": 5.0, "end": 7.0}, {"start": 1.0, "end": 3.0}, {"start": 2.0, "end": 4.0}]
+    assert align_greedy(queries, targets) == [(0, 0, 2.0)]
+
+
+def test_index_queries_match_brute_force():
+    rng = random.Random(99)
+    for _ in range(200):
+        items = _random_intervals(rng, rng.randint(0, 60))
+        index = IntervalIndex(items)
+        by_start = sorted(range(len(items)), key=lambda i: (items[i]["start"], i))
+        for _ in range(20):
+            start = rng.uniform(-5, 130)
+            end = start + rng.choice((0.0, 0.01, rng.uniform(0, 20)))
+            assert index.overlapping(start, end) == [i for i in by_start if items[i]["start"] < end and items[i]["end"] > start]
+            assert index.at(start) == [i for i in by_start if items[i]["start"] <= start < items[i]["end"]]
+        for item in items:
+            assert index.at(item["start"]) == [i for i in by_start if items[i]["start"] <= item["start"] < items[i]["end"]]
@@ -0,0 +1,60 @@
+# backend/tests/test_segment_policy.py
+import random
+
+from utils.segment_policy import aggregate_window_scores, plan_inference_windows
+
+SR = 100 # samples per second, keeps the numbers readable
+POLICY = {"merge_min_s": 1.0, "merge_max_gap_s": 0.5, "window_s": 8, "hop_s": 6, "max_window_s": 12}
+
+
+def _plan(turns):
+    return plan_inference_windows(turns, SR, **POLICY)
+
+
+def test_short_turns_of_one_speaker_merge():
+    # The third turn joins the first two (its unit is still under a second); the fourth doesn't,
+    # since by then neither side is shorter than merge_min_s
+    turns = [("A", 0, 40), ("A", 70, 90), ("A", 100, 400), ("A", 420, 900), ("B", 900, 950)]
+    plan = _plan(turns)
+    assert [(unit["speaker"], unit["start"], unit["end"], unit["turns"]) for unit in plan["units"]] == [
+        ("A", 0, 400, [0, 1, 2]), ("A", 420, 900, [3]), ("B", 900, 950, [4])]
+    assert plan["stats"]["mergedTurns"] == 3
+
+
+def test_turns_are_not_merged_across_gaps_or_speakers():
+    turns = [("A", 0, 50), ("A", 200, 250), ("B", 250, 300), ("A", 300, 350)]
+    plan = _plan(turns)
+    assert [unit["turns"] for unit in plan["units"]] == [[0], [1], [2], [3]]
+
+
+def test_long_units_are_split_into_bounded_windows():
+    plan = _plan([("A", 0, 3000)])
+    spans = [(start, end) for _, start, end in plan["windows"]]
+    assert spans == [(0, 800), (600, 1400), (1200, 2000), (1800, 2600), (2200, 3000)]
+    assert plan["stats"]["splitUnits"] == 1
+    assert plan["turnWindows"][0] == [(0, 800), (1, 800), (2, 800), (3, 800), (4, 800)]
+
+
+def test_no_window_exceeds_max_window_and_every_turn_is_covered():
+    rng = random.Random(7)
+    for _ in range(200):
+        turns, position = [], 0
+        for _ in range(rng.randint(0, 30)):
+            position += rng.randint(0, 80)
+            length = rng.randint(1, 3000)
+            turns.append((rng.choice("AB"), position, position + length))
+            position += length
+        plan = _plan(turns)
+        assert all(end - start <= POLICY["max_window_s"] * SR for _, start, end in plan["windows"])
+        for (_, start, end), weights in zip(turns, plan["turnWindows"]):
+            covered = set()
+            for w, overlap in weights:
+                _, window_start, window_end = plan["windows"][w]
+                assert overlap == min(end, window_end) - max(start, window_start) > 0
+                covered.update(range(max(start, window_start), min(end, window_end)))
+            assert covered == set(range(start, end))
+
+
+def test_aggregate_is_overlap_weighted_and_skips_failed_windows():
+    scores = [1.0, 3.0, None]
+    assert aggregate_window_scores([[(0, 1), (1, 3)], [(2, 5)], [(1, 2), (2, 2)], []], scores) == [2.5, None, 3.0, None]
@@ -0,0 +1,78 @@
+# backend/tests/test_stage_graph.py
+import threading
+import time
+
+import pytest
+
+from models.stage_graph import Stage, StageGraph
+
+
+def _recording_stage(name, deps=(), delay=0.0, error=None):
+    def fn(ctx):
+        with ctx["lock"]: ctx["started"].append(name)
+        time.sleep(delay)
+        if error is not None: raise error
+        with ctx["lock"]: ctx["finished"].append(name)
+    return Stage(name, fn, deps)
+
+
+def _ctx():
+    return {"lock": threading.Lock(), "started": [], "finished": []}
+
+
+def test_stages_run_after_their_dependencies():
+    graph = StageGraph([
+        _recording_stage("decode"),
+        _recording_stage("asr", ("decode",), delay=0.02),
+        _recording_stage("diarize", ("decode",)),
+        _recording_stage("merge", ("asr", "diarize")),
+    ])
+    assert graph.levels == [["decode"], ["asr", "diarize"], ["merge"]]
+    assert graph.max_parallelism() == 2
+    ctx, events = _ctx(), []
+    timings = graph.run(ctx, max_workers=4, on_stage_event=lambda name, event: events.append((name, event)))
+    assert set(timings) == {"decode", "asr", "diarize", "merge"}
+    finished = ctx["finished"]
+    assert finished[0] == "decode" and finished[-1] == "merge"
+    for name in timings:
+        assert events.index((name, "started")) < events.index((name, "completed"))
+
+
+def test_independent_stages_overlap():
+    barrier = threading.Barrier(2, timeout=5)
+    graph = StageGraph([Stage("a", lambda ctx: barrier.wait()), Stage("b", lambda ctx: barrier.wait())])
+    graph.run({}, max_workers=2) # deadlocks (and the barrier times out) if the two ran one after the other
+
+
+def test_unknown_dependencies_and_cycles_are_rejected():
+    with pytest.raises(ValueError, match="unknown stage"):
+        StageGraph([Stage("a", lambda ctx: None, ("missing",))])
+    with pytest.raises(ValueError, match="cycle"):
+        StageGraph([Stage("a", lambda ctx: None, ("c",)), Stage("b", lambda ctx: None, ("a",)),
+                    Stage("c", lambda ctx: None, ("b",)), Stage("d", lambda ctx: None)])
+
+
+def test_failure_stops_dependents_and_is_reraised():
+    graph = StageGraph([
+        _recording_stage("decode"),
+        _recording_stage("asr", ("decode",), error=RuntimeError("asr failed")),
+        _recording_stage("diarize", ("decode",), delay=0.05),
+        _recording_stage("merge", ("asr", "diarize")),
+    ])
+    ctx = _ctx()
+    with pytest.raises(RuntimeError, match="asr failed"):
+        graph.run(ctx, max_workers=2)
+    # The stage already in flight finishes; nothing depending on the failure is started
+    assert "diarize" in ctx["finished"] and "merge" not in ctx["started"]
+
+
+def test_thread_budget_comes_from_the_base_thread_count():
+    torch = pytest.importorskip("torch")
+    from models.stage_graph import BASE_TORCH_THREADS
+    seen = []
+    graph = StageGraph([Stage(name, lambda ctx: seen.append(torch.get_num_threads())) for name in ("a", "b")])
+    try:
+        for _ in range(3): graph.run({}, max_workers=2)
+    finally:
+        torch.set_num_threads(BASE_TORCH_THREADS)
+    assert seen == [max(1, BASE_TORCH_THREADS // 2)] * 6
@@ -0,0 +1,50 @@
+# backend/tests/test_storage.py
+import os
+import time
+
+from utils.storage import StorageIndex, StorageJanitor
+
+DAY_S = 24 * 3600
+
+
+def _janitor(index, statuses, quota_bytes=10**9):
+    return StorageJanitor(index, retention_s=30 * DAY_S, quota_bytes=quota_bytes, segment_bytes=lambda: {},
+                          task_statuses=lambda: statuses, evict=lambda task_id, path: os.remove(path))
+
+
+def _upload(directory, name, age_s, size=100):
+    path = os.path.join(directory, name)
+    with open(path, "wb") as f: f.write(b"\0" * size)
+    mtime = time.time() - age_s
+    os.utime(path, (mtime, mtime))
+    return path
+
+
+def test_backfilled_uploads_follow_retention_not_task_expiry(tmp_path):
+    uploads = tmp_path / "uploads"
+    uploads.mkdir()
+    _upload(uploads, "recent.wav", age_s=2 * DAY_S)
+    _upload(uploads, "old.wav", age_s=40 * DAY_S)
+    (uploads / "partial.wav.part").write_bytes(b"\0")
+    index = StorageIndex(str(tmp_path / "tasks.db"))
+    assert index.backfill(str(uploads)) == 2
+    assert index.backfill(str(uploads)) == 0 # one-time
+    index.register("expired", _upload(uploads, "expired.wav", age_s=0))
+
+    evictions, _ = _janitor(index, statuses={}).plan()
+    assert {eviction["taskId"]: eviction["reason"] for eviction in evictions} == {"old": "retention", "expired": "taskExpired"}
+    assert _janitor(index, statuses={}).sweep()["evictedTasks"] == 2
+    assert sorted(os.listdir(uploads)) == ["partial.wav.part", "recent.wav"]
+
+
+def test_backfilled_uploads_still_count_towards_the_quota(tmp_path):
+    uploads = tmp_path / "uploads"
+    uploads.mkdir()
+    _upload(uploads, "older.wav", age_s=3 * DAY_S)
+    _upload(uploads, "newer.wav", age_s=1 * DAY_S)
+    index = StorageIndex(str(tmp_path / "tasks.db"))
+    index.backfill(str(uploads))
+    index.register("live", _upload(uploads, "live.wav", age_s=0))
+    evictions, usage = _janitor(index, statuses={"live": "complete"}, quota_bytes=250).plan()
+    assert usage["uploads"] == {"files": 3, "bytes": 300}
+    assert [(eviction["taskId"], eviction["reason"]) for eviction in evictions] == [("older", "quota")]
@@ -0,0 +1,89 @@
+# backend/tests/test_task_store.py
+from utils.task_store import INTERRUPTED_ERROR, TaskStore
+
+
+def _store(tmp_path):
+    return TaskStore(str(tmp_path / "tasks.db"))
+
+
+def test_reconcile_fails_tasks_of_stopped_owners_only(tmp_path):
+    store = _store(tmp_path)
+    store.register_owner("live")
+    store.register_owner("stopped")
+    store.db.execute("UPDATE queue_owners SET heartbeat_at = heartbeat_at - 1000 WHERE owner = 'stopped'")
+    store.create("mine", "a.wav", owner="live")
+    store.create("lost-pending", "b.wav", owner="stopped")
+    store.create("lost-running", "c.wav", owner="stopped")
+    store.transition("lost-running", "processing")
+    store.create("legacy", "d.wav") # from before owners were recorded
+    store.create("done", "e.wav", owner="stopped")
+    store.transition("done", "processing")
+    store.transition("done", "complete", {"ok": True})
+    store.create_batch("batch")
+    store.create("waiting", "f.wav", owner="stopped")
+    store.add_batch_task("batch", "waiting", {"args": [], "kwargs": {}, "priority": "bulk"})
+
+    assert store.reconcile_orphans(stale_s=120) == {"failed": 3, "requeued": 0}
+    statuses = store.statuses()
+    assert statuses == {"mine": "pending", "lost-pending": "error", "lost-running": "error", "legacy": "error",
+                        "done": "complete", "waiting": "pending"}
+    task = store.get("lost-running")
+    assert task["result"]["error"] == INTERRUPTED_ERROR and task["expires_at"] is not None
+    assert store.events_since("lost-pending")[-1]["data"] == {"status": "error", "error": INTERRUPTED_ERROR}
+    assert [row["owner"] for row in store.db.query("SELECT owner FROM queue_owners")] == ["live"]
+    assert [owner["owner"] for owner in store.live_owners(120)] == ["live"]
+    assert store.live_owners(120, host="elsewhere") == []
+    assert store.reconcile_orphans(stale_s=120) == {"failed": 0, "requeued": 0}
+
+
+def test_a_restarted_process_settles_its_predecessors_tasks(tmp_path):
+    store = _store(tmp_path)
+    store.register_owner("before-restart")
+    store.create("task", "a.wav", owner="before-restart")
+    store.remove_owner("before-restart") # clean shutdown with the job still queued
+    restarted = _store(tmp_path)
+    restarted.register_owner("after-restart")
+    assert restarted.reconcile_orphans(stale_s=120) == {"failed": 1, "requeued": 0}
+    assert restarted.get_status("task") == "error"
+
+
+def test_claimed_batch_tasks_of_a_stopped_owner_return_to_the_backlog(tmp_path):
+    store = _store(tmp_path)
+    store.register_owner("stopped")
+    store.create_batch("batch")
+    job = {"args": ["a.wav"], "kwargs": {}, "priority": "bulk"}
+    for task_id in ("queued", "running", "finished"):
+        store.create(task_id, f"{task_id}.wav", owner="stopped")
+        store.add_batch_task("batch", task_id, job)
+    assert [claimed["task_id"] for claimed in store.claim_batch_tasks(3, "stopped")] == ["queued", "running", "finished"]
+    assert store.claim_batch_tasks(3, "other") == []
+    store.transition("running", "processing")
+    store.transition("finished", "processing")
+    store.transition("finished", "complete", {"ok": True})
+    store.remove_owner("stopped")
+
+    assert store.reconcile_orphans(stale_s=120) == {"failed": 0, "requeued": 2}
+    assert store.statuses() == {"queued": "pending", "running": "pending", "finished": "complete"}
+    assert store.events_since("running")[-1]["data"] == {"status": "pending", "requeued": True}
+    store.register_owner("restarted")
+    assert [claimed["task_id"] for claimed in store.claim_batch_tasks(3, "restarted")] == ["queued", "running"]
+    assert store.reconcile_orphans(stale_s=120) == {"failed": 0, "requeued": 0}
+    assert store.batch_progress("batch")["counts"]["pending"] == 2
+
+
+def test_heartbeat_reregisters_an_owner_presumed_dead(tmp_path):
+    store = _store(tmp_path)
+    store.heartbeat("stalled")
+    assert [row["owner"] for row in store.db.query("SELECT owner FROM queue_owners")] == ["stalled"]
+
+
+def test_owner_column_is_added_to_older_stores(tmp_path):
+    path = str(tmp_path / "tasks.db")
+    store = TaskStore(path)
+    store.db.execute("DROP INDEX idx_tasks_status")
+    conn = store.db.connection()
+    conn.executescript("ALTER TABLE tasks RENAME TO old; CREATE TABLE tasks AS SELECT task_id, status, file_name, created_at, "
+                       "updated_at, started_at, finished_at, expires_at, result FROM old; DROP TABLE old;")
+    store = TaskStore(path)
+    store.create("task", "a.wav", owner="me")
+    assert store.get("task")["owner"] == "me"
@@ -0,0 +1,193 @@
+# backend/tests/test_upload_ingest.py
+import hashlib
+import io
+import random
+import struct
+import wave
+
+import pytest
+
+pytest.importorskip("python_multipart")
+
+from utils.upload_ingest import (MultipartFileReceiver, StreamingUpload, UploadRejected, probe_audio_header,
+                                 validate_probe)
+
+
+def _wav(seconds=1.0, sample_rate=16000, channels=1):
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as w:
+        w.setnchannels(channels)
+        w.setsampwidth(2)
+        w.setframerate(sample_rate)
+        w.writeframes(b"\x00\x01" * int(seconds * sample_rate) * channels)
+    return buffer.getvalue()
+
+
+def _flac(sample_rate=44100, channels=2, bits=16, total_samples=441000):
+    info = sample_rate << 44 | (channels - 1) << 41 | (bits - 1) << 36 | total_samples
+    streaminfo = b"\x10\x00\x10\x00" + b"\x00" * 6 + info.to_bytes(8, "big") + b"\x00" * 16
+    return b"fLaC" + b"\x80\x00\x00\x22" + streaminfo
+
+
+def _ogg_vorbis(sample_rate=48000, channels=2):
+    packet = b"\x01vorbis" + struct.pack("<IBI", 0, channels, sample_rate) + b"\x00" * 18
+    return b"OggS" + b"\x00" * 22 + b"\x01" + bytes([len(packet)]) + packet
+
+
+def _mp3(frames=4, tag=b""):
+    # MPEG-1 Layer III, 128 kbps, 44.1 kHz, joint stereo: 417-byte frames
+    return tag + (b"\xff\xfb\x90\x44" + b"\x00" * 413) * frames
+
+
+def _adts(frames=4, frame_length=200):
+    # AAC LC, 44.1 kHz (rate index 4), 2 channels
+    header = bytes([0xFF, 0xF1, 0x50 | 0, 0x80 | (frame_length >> 11), (frame_length >> 3) & 0xFF, (frame_length & 0x7) << 5 | 0x1F, 0xFC])
+    return (header + b"\x00" * (frame_length - 7)) * frames
+
+
+def _mp4(timescale=44100, duration=441000):
+    ftyp = struct.pack(">I", 20) + b"ftypM4A " + b"\x00" * 8
+    mdhd = struct.pack(">I", 32) + b"mdhd" + b"\x00" * 12 + struct.pack(">II", timescale, duration) + b"\x00" * 4
+    return ftyp + mdhd
+
+
+@pytest.mark.parametrize("head, expected", [
+    (_wav(2.0), {"format": "wav", "sampleRate": 16000, "channels": 1, "durationS": 2.0}),
+    (_flac(), {"format": "flac", "sampleRate": 44100, "channels": 2, "bitsPerSample": 16, "durationS": 10.0}),
+    (_ogg_vorbis(), {"format": "ogg", "codec": "vorbis", "sampleRate": 48000, "channels": 2}),
+    (_mp3(), {"format": "mp3", "sampleRate": 44100, "channels": 2, "bitrate": 128000}),
+    (_mp3(tag=b"ID3\x04\x00\x00\x00\x00\x00\x0a" + b"\x00" * 10), {"format": "mp3", "dataOffset": 20}),
+    (_adts(), {"format": "aac", "sampleRate": 44100, "channels": 2}),
+    (_mp4(), {"format": "mp4", "sampleRate": 44100, "durationS": 10.0}),
+])
+def test_probes_supported_formats(head, expected):
+    probe = probe_audio_header(head, complete=True)
+    assert {key: probe.get(key) for key in expected} == expected
+
+
+def test_short_heads_ask_for_more_bytes():
+    assert probe_audio_header(_mp3()[:300]) is None
+    assert probe_audio_header(b"RIFF") is None
+    with pytest.raises(UploadRejected) as rejected:
+        probe_audio_header(b"RIFF", complete=True)
+    assert rejected.value.status_code == 415
+
+
+def test_lone_mpeg_sync_is_not_audio():
+    # One plausible frame header with nothing matching where its frame ends
+    head = b"\x00" * 100 + b"\xff\xfb\x90\x44" + bytes(random.Random(0).randrange(1, 255) for _ in range(8000))
+    with pytest.raises(UploadRejected):
+        probe_audio_header(head, complete=True)
+
+
+def test_random_bytes_are_rejected():
+    rng = random.Random(5)
+    for _ in range(200):
+        head = rng.randbytes(rng.choice((512, 16 * 1024, 64 * 1024)))
+        with pytest.raises(UploadRejected):
+            probe_audio_header(head, complete=True)
+
+
+def test_validate_probe_limits():
+    assert validate_probe({"sampleRate": 16000, "channels": 1, "durationS": 30.0}, max_duration_s=60)["durationS"] == 30.0
+    for probe, status in [({"sampleRate": 4000}, 415), ({"channels": 0}, 415), ({"channels": 9}, 415),
+                          ({"durationS": 0}, 422), ({"durationS": 61.0}, 413)]:
+        with pytest.raises(UploadRejected) as rejected:
+            validate_probe(probe, max_duration_s=60)
+        assert rejected.value.status_code == status
+    # CBR estimate from the size when the header carries no duration
+    estimated = validate_probe({"bitrate": 128000, "dataOffset": 1000}, total_bytes=1000 + 16000 * 90, max_duration_s=600)
+    assert estimated["durationS"] == 90.0 and estimated["durationEstimated"]
+    with pytest.raises(UploadRejected):
+        validate_probe({"bitrate": 128000}, total_bytes=16000 * 90, max_duration_s=60)
+
+
+def test_streaming_upload_writes_hashes_and_probes(tmp_path):
+    data = _wav(5.0)
+    upload = StreamingUpload(str(tmp_path / "call.wav"), max_bytes=10 * 1024 * 1024, max_duration_s=60)
+    for i in range(0, len(data), 7000): upload.write(data[i:i + 7000])
+    result = upload.finish()
+    assert result["bytes"] == len(data) and result["sha256"] == hashlib.sha256(data).hexdigest()
+    assert result["audio"]["format"] == "wav" and result["audio"]["durationS"] == 5.0
+    assert (tmp_path / "call.wav").read_bytes() == data and not (tmp_path / "call.wav.part").exists()
+
+
+def test_streaming_upload_rejects_early(tmp_path):
+    upload = StreamingUpload(str(tmp_path / "big.wav"), max_bytes=100 * 1024)
+    with pytest.raises(UploadRejected) as rejected:
+        upload.write(b"\x00" * (200 * 1024))
+    assert rejected.value.status_code == 413
+    upload.abort()
+    assert not (tmp_path / "big.wav.part").exists()
+    too_long = StreamingUpload(str(tmp_path / "long.wav"), max_bytes=10 * 1024 * 1024, max_duration_s=1)
+    with pytest.raises(UploadRejected) as rejected:
+        too_long.write(_wav(5.0)[:64 * 1024])
+    assert rejected.value.status_code == 413
+    too_long.abort()
+
+
+def _multipart(boundary, parts):
+    body = b""
+    for name, filename, content in parts:
+        disposition = f'form-data; name="{name}"' + (f'; filename="{filename}"' if filename else "")
+        body += f"--{boundary}\r\nContent-Disposition: {disposition}\r\n\r\n".encode() + content + b"\r\n"
+    return body + f"--{boundary}--\r\n".encode()
+
+
+def test_multipart_receiver_streams_the_file_field(tmp_path):
+    data = _wav(3.0)
+    body = _multipart("xyz", [("note", None, b"ignored"), ("file", "call.wav", data)])
+    opened = []
+
+    def open_writer(filename):
+        opened.append(filename)
+        return StreamingUpload(str(tmp_path / filename), max_bytes=10 * 1024 * 1024)
+
+    receiver = MultipartFileReceiver("multipart/form-data; boundary=xyz", open_writer)
+    for i in range(0, len(body), 1000): receiver.feed(body[i:i + 1000])
+    assert receiver.finish().finish()["sha256"] == hashlib.sha256(data).hexdigest()
+    assert opened == ["call.wav"]
+
+
+def test_multipart_receiver_rejects_bad_bodies(tmp_path):
+    with pytest.raises(UploadRejected):
+        MultipartFileReceiver("application/json", lambda filename: None)
+    receiver = MultipartFileReceiver("multipart/form-data; boundary=xyz", lambda filename: None)
+    receiver.feed(_multipart("xyz", [("note", None, b"no file here")]))
+    with pytest.raises(UploadRejected) as rejected:
+        receiver.finish()
+    assert rejected.value.status_code == 400
+    small = MultipartFileReceiver("multipart/form-data; boundary=xyz",
+                                  lambda filename: StreamingUpload(str(tmp_path / filename), max_bytes=1024))
+    with pytest.raises(UploadRejected) as rejected:
+        small.feed(_multipart("xyz", [("file", "call.wav", _wav(1.0))]))
+    assert rejected.value.status_code == 413
+
+
+def test_multipart_receiver_bulk_mode_drops_only_the_bad_parts(tmp_path):
+    good = _wav(1.0)
+    body = _multipart("xyz", [("files", "a.wav", good), ("files", "b.wav", b"not audio at all" * 100),
+                              ("files", "skip.wav", good), ("files", "c.wav", good), ("files", "big.wav", _wav(3.0))])
+    ended = []
+
+    def open_writer(filename):
+        if filename == "skip.wav": return None
+        limit = 50 * 1024 if filename == "big.wav" else 10 * 1024 * 1024
+        return StreamingUpload(str(tmp_path / filename), max_bytes=limit)
+
+    receiver = MultipartFileReceiver("multipart/form-data; boundary=xyz", open_writer, field="files",
+                                     on_file_end=lambda writer: ended.append(writer.finish()["sha256"]))
+    for i in range(0, len(body), 4096): receiver.feed(body[i:i + 4096])
+    writers = receiver.finish()
+    assert [writer.path for writer in writers] == [str(tmp_path / "a.wav"), str(tmp_path / "c.wav")]
+    assert ended == [hashlib.sha256(good).hexdigest()] * 2
+    assert [(entry["file"], entry["error"].split()[0]) for entry in receiver.rejected] == [("b.wav", "File"), ("big.wav", "File")]
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["a.wav", "c.wav"]
+
+
+def test_multipart_receiver_bulk_mode_without_files_is_rejected():
+    receiver = MultipartFileReceiver("multipart/form-data; boundary=xyz", lambda filename: None, field="files",
+                                     on_file_end=lambda writer: None)
+    receiver.feed(_multipart("xyz", [("note", None, b"x")]))
+    with pytest.raises(UploadRejected):
+        receiver.finish()
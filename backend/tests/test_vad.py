@@ -0,0 +1,108 @@
+# backend/tests/test_vad.py
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from utils.vad import SpeechTimeMap, clip_regions, detect_speech_regions
+
+SR = 16000
+
+
+def _speech(seconds, rng, f0=150, envelope_floor=0.0, gain=1.0):
+    # Voiced harmonics under a syllable-rate (3-6 Hz) envelope: in band, tonal and modulated;
+    # envelope_floor > 0 keeps the voice from ever going quiet between syllables
+    t = np.arange(int(seconds * SR)) / SR
+    phase = 2 * np.cumsum(np.pi * (f0 + 20 * np.sin(2 * np.pi * 0.5 * t)) / SR)
+    voice = sum(np.sin(k * phase) / k for k in range(2, 20))
+    syllables = np.clip(np.sin(2 * np.pi * np.cumsum(3 + 3 * rng.random(len(t))) / SR), 0, None) ** 2
+    envelope = envelope_floor + (1 - envelope_floor) * syllables
+    return (0.3 * gain * voice * envelope + 0.001 * rng.standard_normal(len(t))).astype(np.float32)
+
+
+def _silence(seconds, rng):
+    return (0.001 * rng.standard_normal(int(seconds * SR))).astype(np.float32)
+
+
+def test_detects_speech_between_silences():
+    rng = np.random.default_rng(0)
+    audio = np.concatenate([_silence(3, rng), _speech(4, rng), _silence(5, rng), _speech(3, rng), _silence(3, rng)])
+    regions = detect_speech_regions(audio, SR)
+    assert len(regions) == 2
+    for (start, end), (expected_start, expected_end) in zip(regions, [(3, 7), (12, 15)]):
+        assert abs(start / SR - expected_start) < 0.5
+        assert abs(end / SR - expected_end) < 0.5
+
+
+@pytest.mark.parametrize("quieter_db", [0, 6, 12])
+def test_dense_two_speaker_call_keeps_the_quieter_speaker(quieter_db):
+    # Turns with 0.3 s pauses: under 10% of the frames are background, so the floor can't be
+    # a plain percentile of frame energy
+    rng = np.random.default_rng(4)
+    parts, turns, position = [], [], 0
+    for i in range(16):
+        turn = _speech(rng.uniform(2, 5), rng, f0=140 if i % 2 == 0 else 220, envelope_floor=0.3,
+                       gain=1.0 if i % 2 == 0 else 10 ** (-quieter_db / 20))
+        turns.append((i % 2, position, position + len(turn)))
+        parts += [turn, _silence(0.3, rng)]
+        position += len(turn) + int(0.3 * SR)
+    regions = detect_speech_regions(np.concatenate(parts), SR)
+    for speaker in (0, 1):
+        total = sum(end - start for who, start, end in turns if who == speaker)
+        covered = sum(end - start for who, turn_start, turn_end in turns if who == speaker
+                      for start, end in clip_regions(regions, turn_start, turn_end))
+        assert covered / total > 0.95
+
+
+def test_rejects_silence_hiss_and_steady_tones():
+    rng = np.random.default_rng(1)
+    t = np.arange(10 * SR) / SR
+    assert detect_speech_regions(_silence(10, rng), SR) == []
+    assert detect_speech_regions((0.05 * rng.standard_normal(len(t))).astype(np.float32), SR) == []
+    hold_tone = np.concatenate([_silence(3, rng), (0.3 * np.sin(2 * np.pi * 1000 * t[:4 * SR])).astype(np.float32), _silence(3, rng)])
+    assert detect_speech_regions(hold_tone, SR) == []
+    assert detect_speech_regions(np.zeros(10, dtype=np.float32), SR) == []
+
+
+def test_detects_speech_over_a_noise_bed():
+    rng = np.random.default_rng(3)
+    audio = np.concatenate([_silence(4, rng), _speech(4, rng), _silence(4, rng)])
+    audio += (0.01 * rng.standard_normal(len(audio))).astype(np.float32)
+    regions = detect_speech_regions(audio, SR)
+    assert len(regions) == 1
+    assert abs(regions[0][0] / SR - 4) < 0.5 and abs(regions[0][1] / SR - 8) < 0.5
+
+
+def test_regions_are_sorted_disjoint_and_in_bounds():
+    rng = np.random.default_rng(2)
+    parts = [_speech(rng.uniform(0.1, 3), rng) if i % 2 else _silence(rng.uniform(0.1, 2), rng) for i in range(30)]
+    audio = np.concatenate(parts)
+    regions = detect_speech_regions(audio, SR)
+    assert regions
+    for (start, end), following in zip(regions, regions[1:] + [(len(audio) + 1, None)]):
+        assert 0 <= start < end <= len(audio) and end < following[0]
+
+
+def test_clip_regions():
+    regions = [(0, 10), (20, 30), (40, 50)]
+    assert clip_regions(regions, 5, 45) == [(5, 10), (20, 30), (40, 45)]
+    assert clip_regions(regions, 25, 26) == [(25, 26)]
+    assert clip_regions(regions, 10, 20) == []
+    assert clip_regions(regions, 60, 70) == []
+    assert clip_regions([], 0, 10) == []
+
+
+def test_speech_time_map_round_trip():
+    audio = np.arange(100, dtype=np.float32)
+    regions = [(10, 20), (50, 60), (80, 90)]
+    time_map = SpeechTimeMap(regions, sr=10)
+    compact = time_map.gather(audio)
+    assert time_map.samples == 30
+    assert compact.tolist() == list(range(10, 20)) + list(range(50, 60)) + list(range(80, 90))
+    assert time_map.to_original(0.0) == 1.0
+    assert time_map.to_original(1.5) == 5.5
+    # A join maps to the start of the later region, or with end=True to the end of the earlier one
+    assert time_map.to_original(1.0) == 5.0
+    assert time_map.to_original(1.0, end=True) == 2.0
+    assert time_map.to_original(3.0, end=True) == 9.0
+    assert SpeechTimeMap([], sr=10).to_original(4.2) == 4.2
+    assert SpeechTimeMap([(10, 20)], sr=10).gather(audio).base is audio
@@ -0,0 +1,588 @@
+# backend/utils/call_store.py
+import json
+import math
+import os
+import re
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone
+
+from utils.db import SQLiteDatabase
+
+CALL_STORE_DB_PATH = os.environ.get("CALL_STORE_DB_PATH", os.path.join("data", "calls.db"))
+
+CALL_SCHEMA = """
+CREATE TABLE IF NOT EXISTS calls (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    ts INTEGER NOT NULL, -- epoch milliseconds, UTC
+    file_name TEXT,
+    record TEXT NOT NULL -- call record as built by save_call_data
+);
+CREATE INDEX IF NOT EXISTS idx_calls_ts ON calls(ts);
+CREATE TABLE IF NOT EXISTS transcriptions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    ts INTEGER NOT NULL,
+    transcription TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_transcriptions_ts ON transcriptions(ts);
+-- Per-day word frequency rollups, updated when each transcription is saved
+CREATE TABLE IF NOT EXISTS word_counts (
+    day INTEGER NOT NULL, -- days since the epoch, UTC
+    word TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (day, word)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS day_stats (
+    day INTEGER PRIMARY KEY,
+    transcriptions INTEGER NOT NULL,
+    last_id INTEGER NOT NULL
+);
+-- Per-hour and per-day call analytics, updated when each call record is saved
+CREATE TABLE IF NOT EXISTS call_rollups (
+    granularity TEXT NOT NULL, -- 'hour' | 'day'
+    bucket INTEGER NOT NULL, -- hours / days since the epoch, UTC
+    calls INTEGER NOT NULL DEFAULT 0,
+    audio_seconds REAL NOT NULL DEFAULT 0,
+    satisfaction_sum REAL NOT NULL DEFAULT 0,
+    satisfaction_count INTEGER NOT NULL DEFAULT 0,
+    satisfaction_hist TEXT NOT NULL DEFAULT '[]', -- call counts per SATISFACTION_BINS bin
+    speech_emotions TEXT NOT NULL DEFAULT '{}', -- emotion -> summed per-call share
+    text_sentiments TEXT NOT NULL DEFAULT '{}', -- dominant text sentiment -> call count
+    PRIMARY KEY (granularity, bucket)
+) WITHOUT ROWID;
+-- BM25 retrieval index over call records for /chat, updated when each call record is saved
+CREATE TABLE IF NOT EXISTS call_docs (
+    call_id INTEGER PRIMARY KEY, -- calls.id
+    length INTEGER NOT NULL, -- indexed terms in the call
+    summary TEXT NOT NULL -- compact one-line summary used as chat context
+);
+CREATE TABLE IF NOT EXISTS call_terms (
+    term TEXT NOT NULL,
+    call_id INTEGER NOT NULL,
+    tf INTEGER NOT NULL,
+    PRIMARY KEY (term, call_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+HOUR_MS = 3600 * 1000
+DAY_MS = 24 * HOUR_MS
+SATISFACTION_BINS = 20 # satisfaction in [0, 1] histogrammed in 0.05 steps for percentiles
+CALL_SUMMARY_EXCERPT_WORDS = int(os.environ.get("CALL_SUMMARY_EXCERPT_WORDS", "60"))
+BM25_K1 = 1.2
+BM25_B = 0.75
+# Same token rules as WordCloud.process_text: 2+ word chars, no trailing 's, no stopwords or bare numbers.
+# The stopwords are wordcloud's own list (wordcloud/stopwords), kept here so the store doesn't import the renderer.
+WORD_RE = re.compile(r"\w[\w']+")
+WORD_STOPWORDS = frozenset("""
+    a about above after again against all also am an and any are aren't as at be because been before being below
+    between both but by can can't cannot com could couldn't did didn't do does doesn't doing don't down during
+    each else ever few for from further get had hadn't has hasn't have haven't having he he'd he'll he's hence
+    her here here's hers herself him himself his how how's however http i i'd i'll i'm i've if in into is isn't
+    it it's its itself just k let's like me more most mustn't my myself no nor not of off on once only or other
+    otherwise ought our ours ourselves out over own r same shall shan't she she'd she'll she's should shouldn't
+    since so some such than that that's the their theirs them themselves then there there's therefore these they
+    they'd they'll they're they've this those through to too under until up very was wasn't we we'd we'll we're
+    we've were weren't what what's when when's where where's which while who who's whom why why's with won't
+    would wouldn't www you you'd you'll you're you've your yours yourself yourselves
+""".split())
+
+
+def count_words(text):
+    counts = Counter()
+    for word in WORD_RE.findall((text or "").lower()):
+        if word.endswith("'s"): word = word[:-2]
+        if word in WORD_STOPWORDS or word.isdigit() or len(word) < 2: continue
+        counts[word] += 1
+    return counts
+
+
+def satisfaction_label(value):
+    if value >= 0.7: return "Satisfied"
+    elif value <= 0.4: return "Unsatisfied"
+    return "Neutral"
+
+
+def _histogram_percentile(hist, fraction):
+    # Linear interpolation inside the bin that holds the requested rank
+    total = sum(hist)
+    if not total: return None
+    rank = fraction * total
+    seen = 0
+    for i, count in enumerate(hist):
+        if count and seen + count >= rank:
+            within = (rank - seen) / count
+            return round((i + within) / len(hist), 3)
+        seen += count
+    return 1.0
+
+
+def _top_labels(distribution, limit=2, min_share=0.0):
+    ranked = sorted((distribution or {}).items(), key=lambda item: item[1], reverse=True)
+    return [(label, share) for label, share in ranked[:limit] if share > min_share]
+
+
+def summarize_call(record, excerpt_words=CALL_SUMMARY_EXCERPT_WORDS):
+    """One-line summary of a call record: metadata, dominant emotions and a transcription excerpt."""
+    ts = datetime.fromtimestamp(to_epoch_ms(record["timestamp"]) / 1000, tz=timezone.utc)
+    parts = [f"[{ts.strftime('%Y-%m-%d %H:%M')} UTC] {record.get('fileName') or 'unknown file'}"]
+    if record.get("audioDuration"): parts[0] += f" ({round(record['audioDuration'])}s)"
+    speech = _top_labels(record.get("speechEmotionOverall"))
+    if speech: parts.append("speech: " + ", ".join(f"{label} {round(share * 100)}%" for label, share in speech))
+    dominant_text = (record.get("textSentimentOverall") or {}).get("dominant")
+    if dominant_text: parts.append(f"text: {dominant_text}")
+    satisfaction = record.get("satisfactionPrediction") or {}
+    if satisfaction.get("label"):
+        parts.append(f"satisfaction: {satisfaction['label']}"
+                     + (f" ({satisfaction['value']:.2f})" if satisfaction.get("value") is not None else ""))
+    words = (record.get("transcription") or "").split()
+    if words:
+        excerpt = " ".join(words[:excerpt_words]) + (" ..." if len(words) > excerpt_words else "")
+        parts.append(f'"{excerpt}"')
+    return " | ".join(parts)
+
+
+def index_terms(record):
+    # Transcription plus the labels people ask about ("angry calls", "unsatisfied customers")
+    labels = [label for label, _ in _top_labels(record.get("speechEmotionOverall"), limit=3, min_share=0.2)]
+    labels.append((record.get("textSentimentOverall") or {}).get("dominant") or "")
+    labels.append((record.get("satisfactionPrediction") or {}).get("label") or "")
+    file_stem = os.path.splitext(record.get("fileName") or "")[0].replace("_", " ").replace("-", " ")
+    return count_words(" ".join([record.get("transcription") or "", file_stem, *labels]))
+
+
+def to_epoch_ms(timestamp):
+    if isinstance(timestamp, (int, float)): return int(timestamp)
+    dt = datetime.fromisoformat(timestamp)
+    if dt.tzinfo is None: dt = dt.replace(tzinfo=timezone.utc)
+    return int(dt.timestamp() * 1000)
+
+
+def now_iso():
+    return datetime.now(timezone.utc).isoformat()
+
+
+# Named rolling windows accepted by /historical, in milliseconds (None = unbounded)
+TIMEFRAMES = {
+    "last_24_hours": 24 * 3600 * 1000,
+    "last_7_days": 7 * 24 * 3600 * 1000,
+    "last_30_days": 30 * 24 * 3600 * 1000,
+    "last_90_days": 90 * 24 * 3600 * 1000,
+    "all_time": None,
+}
+DEFAULT_TIMEFRAME = "last_7_days"
+
+
+def parse_time_bound(value):
+    # Accepts ISO 8601 strings or epoch seconds
+    if value is None or value == "": return None
+    try:
+        return int(float(value) * 1000)
+    except (TypeError, ValueError):
+        return to_epoch_ms(value)
+
+
+def resolve_time_range(timeframe=DEFAULT_TIMEFRAME, start=None, end=None, now_ms=None):
+    """Returns (start_ms, end_ms) for a query; explicit start/end override the named timeframe.
+
+    Either bound may be None (unbounded). Raises ValueError for unparseable or inverted bounds.
+    """
+    start_ms, end_ms = parse_time_bound(start), parse_time_bound(end)
+    if start_ms is None and end_ms is None:
+        window = TIMEFRAMES.get(timeframe, TIMEFRAMES[DEFAULT_TIMEFRAME])
+        if window is not None:
+            start_ms = (now_ms if now_ms is not None else int(time.time() * 1000)) - window
+    if start_ms is not None and end_ms is not None and start_ms >= end_ms:
+        raise ValueError("start must be before end")
+    return start_ms, end_ms
+
+
+def _range_clause(start, end, column="ts"):
+    # Half-open [start, end) on an indexed column: an O(log n) seek plus a scan over the k matching rows
+    clauses, params = [], []
+    if start is not None:
+        clauses.append(f"{column} >= ?"); params.append(start)
+    if end is not None:
+        clauses.append(f"{column} < ?"); params.append(end)
+    return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+
+class CallStore:
+    """Append-only store for call records and transcription history.
+
+    Each save is a single-row INSERT (O(1), safe with concurrent writers thanks to SQLite
+    locking) and reads go through the `ts` index instead of parsing the whole history.
+    """
+
+    def __init__(self, db_path=CALL_STORE_DB_PATH):
+        self.db = SQLiteDatabase(db_path, CALL_SCHEMA)
+
+    def append_call(self, record):
+        record.setdefault("timestamp", now_iso())
+        conn = self.db.connection()
+        with conn:
+            return self._insert_call(conn, record)
+
+    def append_many(self, calls=(), transcriptions=()):
+        """Saves many call records and (transcription, timestamp) pairs in one transaction."""
+        conn = self.db.connection()
+        with conn:
+            for transcription, timestamp in transcriptions:
+                self._insert_transcription(conn, to_epoch_ms(timestamp or now_iso()), transcription)
+            for record in calls:
+                record.setdefault("timestamp", now_iso())
+                self._insert_call(conn, record)
+        return len(calls)
+
+    @staticmethod
+    def _insert_call(conn, record):
+        # The INSERT takes the write lock first, so the rollup read-modify-write below is serialized
+        ts = to_epoch_ms(record["timestamp"])
+        row_id = conn.execute(
+            "INSERT INTO calls (ts, file_name, record) VALUES (?, ?, ?)",
+            (ts, record.get("fileName"), json.dumps(record)),
+        ).lastrowid
+        CallStore._roll_up_call(conn, ts, record)
+        CallStore._index_call(conn, row_id, record)
+        return row_id
+
+    @staticmethod
+    def _index_call(conn, call_id, record):
+        terms = index_terms(record)
+        conn.execute(
+            "INSERT OR REPLACE INTO call_docs (call_id, length, summary) VALUES (?, ?, ?)",
+            (call_id, sum(terms.values()), summarize_call(record)),
+        )
+        conn.executemany(
+            "INSERT OR REPLACE INTO call_terms (term, call_id, tf) VALUES (?, ?, ?)",
+            [(term, call_id, tf) for term, tf in terms.items()],
+        )
+
+    @staticmethod
+    def _roll_up_call(conn, ts, record):
+        satisfaction = (record.get("satisfactionPrediction") or {}).get("value")
+        dominant_sentiment = (record.get("textSentimentOverall") or {}).get("dominant")
+        for granularity, bucket in (("hour", ts // HOUR_MS), ("day", ts // DAY_MS)):
+            row = conn.execute(
+                "SELECT * FROM call_rollups WHERE granularity = ? AND bucket = ?", (granularity, bucket)
+            ).fetchone()
+            rollup = _rollup_from_row(row)
+            rollup["calls"] += 1
+            rollup["audio_seconds"] += float(record.get("audioDuration") or 0)
+            if satisfaction is not None:
+                rollup["satisfaction_sum"] += satisfaction
+                rollup["satisfaction_count"] += 1
+                rollup["satisfaction_hist"][min(int(satisfaction * SATISFACTION_BINS), SATISFACTION_BINS - 1)] += 1
+            for emotion, share in (record.get("speechEmotionOverall") or {}).items():
+                rollup["speech_emotions"][emotion] = rollup["speech_emotions"].get(emotion, 0) + share
+            if dominant_sentiment:
+                rollup["text_sentiments"][dominant_sentiment] = rollup["text_sentiments"].get(dominant_sentiment, 0) + 1
+            conn.execute(
+                "INSERT OR REPLACE INTO call_rollups (granularity, bucket, calls, audio_seconds, satisfaction_sum, "
+                "satisfaction_count, satisfaction_hist, speech_emotions, text_sentiments) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (granularity, bucket, rollup["calls"], rollup["audio_seconds"], rollup["satisfaction_sum"],
+                 rollup["satisfaction_count"], json.dumps(rollup["satisfaction_hist"]),
+                 json.dumps(rollup["speech_emotions"]), json.dumps(rollup["text_sentiments"])),
+            )
+
+    def append_transcription(self, transcription, timestamp=None):
+        timestamp = timestamp or now_iso()
+        conn = self.db.connection()
+        with conn:
+            return self._insert_transcription(conn, to_epoch_ms(timestamp), transcription)
+
+    @staticmethod
+    def _insert_transcription(conn, ts, transcription):
+        # Row + its day's word counters in the caller's transaction
+        row_id = conn.execute("INSERT INTO transcriptions (ts, transcription) VALUES (?, ?)", (ts, transcription)).lastrowid
+        CallStore._roll_up_words(conn, row_id, ts, transcription)
+        return row_id
+
+    @staticmethod
+    def _roll_up_words(conn, row_id, ts, transcription):
+        day = ts // DAY_MS
+        conn.executemany(
+            "INSERT INTO word_counts (day, word, count) VALUES (?, ?, ?) "
+            "ON CONFLICT(day, word) DO UPDATE SET count = count + excluded.count",
+            [(day, word, count) for word, count in count_words(transcription).items()],
+        )
+        conn.execute(
+            "INSERT INTO day_stats (day, transcriptions, last_id) VALUES (?, 1, ?) "
+            "ON CONFLICT(day) DO UPDATE SET transcriptions = transcriptions + 1, last_id = MAX(last_id, excluded.last_id)",
+            (day, row_id),
+        )
+
+    def load_calls(self, start_ms=None, end_ms=None):
+        where, params = _range_clause(start_ms, end_ms)
+        rows = self.db.query(f"SELECT record FROM calls{where} ORDER BY ts, id", params)
+        return [json.loads(row["record"]) for row in rows]
+
+    def load_transcriptions(self, start_ms=None, end_ms=None):
+        where, params = _range_clause(start_ms, end_ms)
+        rows = self.db.query(f"SELECT transcription FROM transcriptions{where} ORDER BY ts, id", params)
+        return [row["transcription"] for row in rows]
+
+    def word_frequencies(self, start_ms=None, end_ms=None, limit=200):
+        """Top word counts for [start_ms, end_ms): whole days come from the per-day rollups,
+        only the partial days at the window edges are tokenized from raw transcriptions."""
+        first_day = -(-start_ms // DAY_MS) if start_ms is not None else None # first whole day
+        end_day = end_ms // DAY_MS if end_ms is not None else None # exclusive
+        counts = Counter()
+        if first_day is not None and end_day is not None and first_day >= end_day:
+            # Window shorter than a calendar day boundary-to-boundary: raw rows only
+            for text in self.load_transcriptions(start_ms, end_ms): counts.update(count_words(text))
+        else:
+            where, params = _range_clause(first_day, end_day, column="day")
+            for row in self.db.query(f"SELECT word, SUM(count) AS total FROM word_counts{where} GROUP BY word", params):
+                counts[row["word"]] += row["total"]
+            if first_day is not None:
+                for text in self.load_transcriptions(start_ms, first_day * DAY_MS): counts.update(count_words(text))
+            if end_day is not None:
+                for text in self.load_transcriptions(end_day * DAY_MS, end_ms): counts.update(count_words(text))
+        return dict(counts.most_common(limit))
+
+    def transcriptions_version(self, start_ms=None, end_ms=None):
+        """(count, max id) of transcriptions in the window; changes only when rows enter or leave it."""
+        first_day = -(-start_ms // DAY_MS) if start_ms is not None else None
+        end_day = end_ms // DAY_MS if end_ms is not None else None
+        if first_day is not None and end_day is not None and first_day >= end_day:
+            where, params = _range_clause(start_ms, end_ms)
+            row = self.db.query_one(f"SELECT COUNT(*) AS n, MAX(id) AS last_id FROM transcriptions{where}", params)
+            return (row["n"], row["last_id"])
+        where, params = _range_clause(first_day, end_day, column="day")
+        row = self.db.query_one(f"SELECT SUM(transcriptions) AS n, MAX(last_id) AS last_id FROM day_stats{where}", params)
+        total, last_id = row["n"] or 0, row["last_id"]
+        edges = []
+        if first_day is not None: edges.append((start_ms, first_day * DAY_MS))
+        if end_day is not None: edges.append((end_day * DAY_MS, end_ms))
+        for edge_start, edge_end in edges:
+            where, params = _range_clause(edge_start, edge_end)
+            row = self.db.query_one(f"SELECT COUNT(*) AS n, MAX(id) AS last_id FROM transcriptions{where}", params)
+            total += row["n"]
+            if row["last_id"] is not None: last_id = max(last_id or 0, row["last_id"])
+        return (total, last_id)
+
+    def calls_version(self):
+        """(count, max id) of all call records; changes whenever a call is added or removed."""
+        row = self.db.query_one("SELECT COUNT(*) AS n, MAX(id) AS last_id FROM calls")
+        return (row["n"], row["last_id"])
+
+    def call_analytics(self, start_ms=None, end_ms=None):
+        """Aggregated call analytics for [start_ms, end_ms) at hour resolution.
+
+        Whole days are read from the daily rollups and only the partial days at the edges from
+        the hourly ones, so a read touches a bounded number of rollup rows, never the calls.
+        """
+        start_hour = start_ms // HOUR_MS if start_ms is not None else None
+        end_hour = -(-end_ms // HOUR_MS) if end_ms is not None else None # exclusive
+        first_day = -(-start_hour // 24) if start_hour is not None else None
+        end_day = end_hour // 24 if end_hour is not None else None # exclusive
+        ranges = []
+        if first_day is not None and end_day is not None and first_day >= end_day:
+            ranges.append(("hour", start_hour, end_hour))
+        else:
+            ranges.append(("day", first_day, end_day))
+            if first_day is not None: ranges.append(("hour", start_hour, first_day * 24))
+            if end_day is not None: ranges.append(("hour", end_day * 24, end_hour))
+
+        total = _rollup_from_row(None)
+        for granularity, bucket_start, bucket_end in ranges:
+            where, params = _range_clause(bucket_start, bucket_end, column="bucket")
+            where = (where + " AND" if where else " WHERE") + " granularity = ?"
+            for row in self.db.query(f"SELECT * FROM call_rollups{where}", (*params, granularity)):
+                rollup = _rollup_from_row(row)
+                for key in ("calls", "audio_seconds", "satisfaction_sum", "satisfaction_count"):
+                    total[key] += rollup[key]
+                total["satisfaction_hist"] = [a + b for a, b in zip(total["satisfaction_hist"], rollup["satisfaction_hist"])]
+                for key in ("speech_emotions", "text_sentiments"):
+                    for label, value in rollup[key].items():
+                        total[key][label] = total[key].get(label, 0) + value
+
+        calls = total["calls"]
+        mean_satisfaction = total["satisfaction_sum"] / total["satisfaction_count"] if total["satisfaction_count"] else None
+        return {
+            "calls": calls,
+            "totalAudioSeconds": round(total["audio_seconds"], 2),
+            "speechEmotionDistribution": {k: round(v / calls, 3) for k, v in total["speech_emotions"].items()} if calls else {},
+            "textSentimentDistribution": {k: round(v / calls, 3) for k, v in total["text_sentiments"].items()} if calls else {},
+            "satisfaction": {
+                "mean": round(mean_satisfaction, 3) if mean_satisfaction is not None else None,
+                "p50": _histogram_percentile(total["satisfaction_hist"], 0.5),
+                "p90": _histogram_percentile(total["satisfaction_hist"], 0.9),
+                "label": satisfaction_label(mean_satisfaction) if mean_satisfaction is not None else "No Data",
+            },
+        }
+
+    def search_calls(self, query, limit=10, max_query_terms=32):
+        """Top `limit` calls for a free-text query by BM25 over the retrieval index.
+
+        Only the postings of the query's terms are read. Returns [{"callId", "ts", "score", "summary"}],
+        best first; falls back to the most recent calls when no query term is indexed.
+        """
+        terms = [term for term, _ in count_words(query).most_common(max_query_terms)]
+        stats = self.db.query_one("SELECT COUNT(*) AS n, SUM(length) AS total FROM call_docs")
+        n_docs, avg_length = stats["n"], (stats["total"] or 0) / max(stats["n"], 1)
+        scores = Counter()
+        if terms and n_docs:
+            placeholders = ", ".join("?" * len(terms))
+            postings = self.db.query(
+                f"SELECT t.term, t.call_id, t.tf, d.length FROM call_terms t JOIN call_docs d ON d.call_id = t.call_id "
+                f"WHERE t.term IN ({placeholders})", terms,
+            )
+            doc_freq = Counter(row["term"] for row in postings)
+            for row in postings:
+                idf = math.log(1 + (n_docs - doc_freq[row["term"]] + 0.5) / (doc_freq[row["term"]] + 0.5))
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * row["length"] / (avg_length or 1))
+                scores[row["call_id"]] += idf * row["tf"] * (BM25_K1 + 1) / (row["tf"] + norm)
+        if scores:
+            ranked = scores.most_common(limit)
+            placeholders = ", ".join("?" * len(ranked))
+            rows = {row["call_id"]: row for row in self.db.query(
+                f"SELECT d.call_id, d.summary, c.ts FROM call_docs d JOIN calls c ON c.id = d.call_id "
+                f"WHERE d.call_id IN ({placeholders})", [call_id for call_id, _ in ranked],
+            )}
+            return [{"callId": call_id, "ts": rows[call_id]["ts"], "score": round(score, 4), "summary": rows[call_id]["summary"]}
+                    for call_id, score in ranked if call_id in rows]
+        rows = self.db.query(
+            "SELECT d.call_id, d.summary, c.ts FROM call_docs d JOIN calls c ON c.id = d.call_id "
+            "ORDER BY c.ts DESC, c.id DESC LIMIT ?", (limit,),
+        )
+        return [{"callId": row["call_id"], "ts": row["ts"], "score": 0.0, "summary": row["summary"]} for row in rows]
+
+    def migrate_json(self, history_file, data_file):
+        """One-time import of the legacy historical_transcriptions.json / call_data.json files.
+
+        The JSON files are left untouched; a flag in `meta` makes later calls no-ops, and the
+        check + import run in one IMMEDIATE transaction so concurrent workers import only once.
+        """
+        conn = self.db.connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if conn.execute("SELECT 1 FROM meta WHERE key = 'json_migrated'").fetchone():
+                self._backfill_word_rollups(conn)
+                self._backfill_call_rollups(conn)
+                self._backfill_retrieval_index(conn)
+                conn.execute("COMMIT")
+                return 0
+            imported = 0
+            if os.path.exists(history_file):
+                with open(history_file, "r") as f:
+                    history = json.load(f)
+                for entry in history:
+                    self._insert_transcription(conn, to_epoch_ms(entry["timestamp"]), entry.get("transcription"))
+                imported += len(history)
+            if os.path.exists(data_file):
+                with open(data_file, "r") as f:
+                    calls = json.load(f)
+                for call in calls:
+                    self._insert_call(conn, call)
+                imported += len(calls)
+            conn.execute("INSERT INTO meta (key, value) VALUES ('json_migrated', ?)", (now_iso(),))
+            conn.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('word_rollups_built', ?)", (now_iso(),))
+            conn.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('call_rollups_built', ?)", (now_iso(),))
+            conn.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('retrieval_index_built', ?)", (now_iso(),))
+            conn.execute("COMMIT")
+            return imported
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+
+    def _backfill_word_rollups(self, conn):
+        # Stores created before the word rollups existed get them built once from the raw rows
+        if conn.execute("SELECT 1 FROM meta WHERE key = 'word_rollups_built'").fetchone(): return
+        conn.execute("DELETE FROM word_counts")
+        conn.execute("DELETE FROM day_stats")
+        for row in conn.execute("SELECT id, ts, transcription FROM transcriptions ORDER BY id").fetchall():
+            self._roll_up_words(conn, row["id"], row["ts"], row["transcription"])
+        conn.execute("INSERT INTO meta (key, value) VALUES ('word_rollups_built', ?)", (now_iso(),))
+
+    def _backfill_call_rollups(self, conn):
+        if conn.execute("SELECT 1 FROM meta WHERE key = 'call_rollups_built'").fetchone(): return
+        conn.execute("DELETE FROM call_rollups")
+        for row in conn.execute("SELECT ts, record FROM calls ORDER BY id").fetchall():
+            self._roll_up_call(conn, row["ts"], json.loads(row["record"]))
+        conn.execute("INSERT INTO meta (key, value) VALUES ('call_rollups_built', ?)", (now_iso(),))
+
+    def _backfill_retrieval_index(self, conn):
+        if conn.execute("SELECT 1 FROM meta WHERE key = 'retrieval_index_built'").fetchone(): return
+        conn.execute("DELETE FROM call_terms")
+        conn.execute("DELETE FROM call_docs")
+        for row in conn.execute("SELECT id, record FROM calls ORDER BY id").fetchall():
+            self._index_call(conn, row["id"], json.loads(row["record"]))
+        conn.execute("INSERT INTO meta (key, value) VALUES ('retrieval_index_built', ?)", (now_iso(),))
+
+
+def _rollup_from_row(row):
+    if row is None:
+        return {"calls": 0, "audio_seconds": 0.0, "satisfaction_sum": 0.0, "satisfaction_count": 0,
+                "satisfaction_hist": [0] * SATISFACTION_BINS, "speech_emotions": {}, "text_sentiments": {}}
+    return {"calls": row["calls"], "audio_seconds": row["audio_seconds"],
+            "satisfaction_sum": row["satisfaction_sum"], "satisfaction_count": row["satisfaction_count"],
+            "satisfaction_hist": json.loads(row["satisfaction_hist"]) or [0] * SATISFACTION_BINS,
+            "speech_emotions": json.loads(row["speech_emotions"]), "text_sentiments": json.loads(row["text_sentiments"])}
+
+
+class CallStoreBatchWriter:
+    """Buffers call records produced elsewhere (e.g. bulk analyses) and saves them with append_many.
+
+    A commit happens once `batch_size` records are buffered, when the oldest has waited
+    `max_delay_s` (checked on add), or on an explicit flush(). `on_commit` callbacks passed to
+    add() run after the commit holding their records, so callers can defer whatever must not
+    happen before the records are durable (e.g. marking the task complete).
+    """
+
+    def __init__(self, store, batch_size=50, max_delay_s=30.0):
+        self.store = store
+        self.batch_size = batch_size
+        self.max_delay_s = max_delay_s
+        self._calls, self._transcriptions, self._callbacks = [], [], []
+        self._oldest = None
+        self._lock = threading.Lock()
+
+    def add(self, call=None, transcription=None, timestamp=None, on_commit=None):
+        with self._lock:
+            if call is not None: self._calls.append(call)
+            if transcription is not None: self._transcriptions.append((transcription, timestamp))
+            if on_commit is not None: self._callbacks.append(on_commit)
+            if self._oldest is None: self._oldest = time.monotonic()
+            due = max(len(self._calls), len(self._transcriptions)) >= self.batch_size or time.monotonic() - self._oldest >= self.max_delay_s
+        if due: self.flush()
+
+    def pending(self):
+        with self._lock:
+            return len(self._calls)
+
+    def flush(self):
+        with self._lock:
+            calls, transcriptions, callbacks = self._calls, self._transcriptions, self._callbacks
+            self._calls, self._transcriptions, self._callbacks, self._oldest = [], [], [], None
+        if not calls and not transcriptions and not callbacks: return 0
+        try:
+            saved = self.store.append_many(calls, transcriptions)
+        except Exception:
+            with self._lock: # keep the records (and their callbacks) for the next flush
+                self._calls[:0], self._transcriptions[:0], self._callbacks[:0] = calls, transcriptions, callbacks
+                self._oldest = self._oldest or time.monotonic()
+            raise
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                print(f"Warning: call store commit callback failed: {e}")
+        return saved
+
+
+_call_store = None
+
+def get_call_store():
+    # One store (and one set of per-thread connections) per process
+    global _call_store
+    if _call_store is None:
+        _call_store = CallStore()
+    return _call_store
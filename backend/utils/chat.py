@@ -0,0 +1,129 @@
+# backend/utils/chat.py
+import asyncio
+import os
+import re
+
+# Context sent with each /chat question: the CHAT_TOP_K most relevant call summaries that fit the token budget
+CHAT_CONTEXT_TOKEN_BUDGET = int(os.environ.get("CHAT_CONTEXT_TOKEN_BUDGET", "2000"))
+CHAT_TOP_K = int(os.environ.get("CHAT_TOP_K", "12"))
+# "groq" calls the hosted model; "stub" answers locally without network (tests, offline development)
+CHAT_LLM_BACKEND = os.environ.get("CHAT_LLM_BACKEND", "groq")
+CHAT_MODEL = os.environ.get("CHAT_MODEL", "llama-3.1-8b-instant")
+CHAT_TEMPERATURE = 0.7
+
+SYSTEM_PROMPT = (
+    "You are a helpful assistant who analyzes call center conversations. You are given aggregate statistics "
+    "over all calls and one-line summaries of the calls most relevant to the question - including transcription "
+    "excerpts, emotions and sentiment. Your job is to answer the questions properly in natural language."
+    "Avoid using numbers in general. Only give numerical answer when quantitative questions are asked. Otherwise use plain English. Be concise and conversational."
+)
+
+
+def normalize_question(text):
+    # Cache key form: case, spacing and trailing punctuation don't change the answer
+    return re.sub(r"\s+", " ", (text or "").lower()).strip().rstrip("?!. ")
+
+
+def estimate_tokens(text):
+    # ~4 characters per token for English text; close enough for budgeting without loading a tokenizer
+    return len(text) // 4 + 1
+
+
+def _format_distribution(distribution):
+    ranked = sorted(distribution.items(), key=lambda item: item[1], reverse=True)
+    return ", ".join(f"{label} {round(share * 100)}%" for label, share in ranked) or "none"
+
+
+def build_chat_context(question, store, token_budget=None, top_k=None):
+    """Returns (context text, stats) for a question.
+
+    The context is an aggregate header (from the materialized call analytics) followed by the
+    precomputed summaries of the top-k retrieved calls, in rank order, until the budget is used up.
+    """
+    token_budget = token_budget or CHAT_CONTEXT_TOKEN_BUDGET
+    top_k = top_k or CHAT_TOP_K
+    analytics = store.call_analytics()
+    header = (
+        f"Overall: {analytics['calls']} calls, {round(analytics['totalAudioSeconds'] / 60, 1)} minutes of audio. "
+        f"Speech emotion mix: {_format_distribution(analytics['speechEmotionDistribution'])}. "
+        f"Dominant text sentiment: {_format_distribution(analytics['textSentimentDistribution'])}. "
+        f"Average satisfaction: {analytics['satisfaction']['label']}"
+        + (f" ({analytics['satisfaction']['mean']})" if analytics["satisfaction"]["mean"] is not None else "") + "."
+    )
+    lines, used = [header, "Most relevant calls:"], estimate_tokens(header) + 4
+    hits = store.search_calls(question, limit=top_k)
+    included = 0
+    for hit in hits:
+        cost = estimate_tokens(hit["summary"]) + 1
+        if used + cost > token_budget: break
+        lines.append(hit["summary"])
+        used += cost
+        included += 1
+    stats = {"totalCalls": analytics["calls"], "retrievedCalls": len(hits), "includedCalls": included, "contextTokens": used}
+    return "\n".join(lines), stats
+
+
+def build_chat_messages(question, store, token_budget=None, top_k=None):
+    context, stats = build_chat_context(question, store, token_budget, top_k)
+    messages = [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": f"Call Records:\n{context}\n\nUser Question: {question}"},
+    ]
+    return messages, stats
+
+
+# --- LLM clients ---
+# Clients are async: stream() yields the reply piece by piece, complete() returns it whole.
+class ChatClient:
+    async def stream(self, messages, temperature=CHAT_TEMPERATURE):
+        raise NotImplementedError
+        yield
+
+    async def complete(self, messages, temperature=CHAT_TEMPERATURE):
+        parts = [part async for part in self.stream(messages, temperature)]
+        return "".join(parts).strip()
+
+
+class GroqChatClient(ChatClient):
+    def __init__(self, api_key=None, model=CHAT_MODEL):
+        from groq import AsyncGroq
+        self.client = AsyncGroq(api_key=api_key or os.environ.get("GROQ_API_KEY"))
+        self.model = model
+
+    async def stream(self, messages, temperature=CHAT_TEMPERATURE):
+        response = await self.client.chat.completions.create(
+            model=self.model, messages=messages, temperature=temperature, stream=True
+        )
+        async for chunk in response:
+            delta = chunk.choices[0].delta.content if chunk.choices else None
+            if delta: yield delta
+
+    async def complete(self, messages, temperature=CHAT_TEMPERATURE):
+        response = await self.client.chat.completions.create(model=self.model, messages=messages, temperature=temperature)
+        return response.choices[0].message.content.strip()
+
+
+class StubChatClient(ChatClient):
+    """Offline stand-in: records the prompt and answers with a deterministic description of it.
+
+    `token_delay_s` spaces out the streamed words to imitate a real model in benchmarks.
+    """
+
+    def __init__(self, token_delay_s=0.0):
+        self.token_delay_s = token_delay_s
+        self.requests = []
+
+    async def stream(self, messages, temperature=CHAT_TEMPERATURE):
+        self.requests.append(messages)
+        prompt = messages[-1]["content"]
+        reply = f"[stub] {len(prompt.splitlines())} context lines, ~{estimate_tokens(prompt)} tokens."
+        for i, word in enumerate(reply.split(" ")):
+            await asyncio.sleep(self.token_delay_s)
+            yield word if i == 0 else " " + word
+
+
+def get_chat_client(backend=None):
+    backend = backend or CHAT_LLM_BACKEND
+    if backend == "stub": return StubChatClient(float(os.environ.get("CHAT_STUB_TOKEN_DELAY_S", "0")))
+    if backend == "groq": return GroqChatClient()
+    raise ValueError(f"Unknown CHAT_LLM_BACKEND '{backend}'")
@@ -0,0 +1,50 @@
+# backend/utils/db.py
+import os
+import sqlite3
+import threading
+
+
+class SQLiteDatabase:
+    """Lazily opened per-thread SQLite connections in WAL mode.
+
+    WAL lets readers in any process/thread proceed while one writer commits, which is what
+    the API workers and analysis worker processes need when sharing one database file.
+    """
+
+    def __init__(self, path, schema=None):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory: os.makedirs(directory, exist_ok=True)
+        self._local = threading.local()
+        if schema:
+            conn = self.connection()
+            with conn: conn.executescript(schema)
+
+    def connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def execute(self, sql, params=()):
+        conn = self.connection()
+        with conn: # one transaction per statement
+            return conn.execute(sql, params)
+
+    def query(self, sql, params=()):
+        return self.connection().execute(sql, params).fetchall()
+
+    def add_column(self, table, column, definition):
+        # For stores created before the column existed; another process may add it first
+        if any(row["name"] == column for row in self.query(f"PRAGMA table_info({table})")): return
+        try:
+            self.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+        except sqlite3.OperationalError as e:
+            if "duplicate column" not in str(e): raise
+
+    def query_one(self, sql, params=()):
+        return self.connection().execute(sql, params).fetchone()
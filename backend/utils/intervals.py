@@ -0,0 +1,135 @@
+# backend/utils/intervals.py
+from bisect import bisect_left, bisect_right
+from operator import itemgetter
+
+
+class IntervalIndex:
+    """Static index over (start, end) intervals answering overlap and point queries.
+
+    Intervals are sorted by start once; a max-end segment tree over that order skips every
+    subtree whose intervals all end before the query starts, so a query costs
+    O(log n + k log n) for k matches instead of a scan over all n intervals.
+    Results are indices into the original `items` list, in start order.
+    """
+
+    def __init__(self, items, start=itemgetter("start"), end=itemgetter("end")):
+        self.items = items
+        self._order = sorted(range(len(items)), key=lambda i: (start(items[i]), i))
+        self._starts = [start(items[i]) for i in self._order]
+        self._size = 1
+        while self._size < len(items): self._size *= 2
+        tree = [float("-inf")] * (2 * self._size)
+        for pos, i in enumerate(self._order):
+            tree[self._size + pos] = end(items[i])
+        for node in range(self._size - 1, 0, -1):
+            tree[node] = max(tree[2 * node], tree[2 * node + 1])
+        self._max_end = tree
+
+    def __len__(self):
+        return len(self.items)
+
+    def _collect(self, limit, after):
+        # Positions < limit (in start order) whose end > after, left to right
+        found, stack = [], [(1, 0, self._size)]
+        while stack:
+            node, lo, hi = stack.pop()
+            if lo >= limit or self._max_end[node] <= after: continue
+            if node >= self._size:
+                found.append(self._order[lo])
+                continue
+            mid = (lo + hi) // 2
+            stack.append((2 * node + 1, mid, hi))
+            stack.append((2 * node, lo, mid))
+        return found
+
+    def overlapping(self, start, end):
+        """Intervals sharing some time with [start, end): start_i < end and end_i > start."""
+        return self._collect(bisect_left(self._starts, end), start)
+
+    def at(self, t):
+        """Intervals containing time t: start_i <= t < end_i."""
+        return self._collect(bisect_right(self._starts, t), t)
+
+
+def overlap_seconds(a_start, a_end, b_start, b_end):
+    return max(0, min(a_end, b_end) - max(a_start, b_start))
+
+
+def align_greedy(queries, targets, min_overlap=0.1, index=None):
+    """Pairs each query interval, in order, with the unused target it overlaps most (> min_overlap).
+
+    Ties go to the earliest target; each target is used at most once. Returns
+    [(query index, target index, overlap seconds)]. Same result as comparing every
+    query with every target, but only overlapping targets are looked at.
+    """
+    index = index or IntervalIndex(targets)
+    used, pairs = set(), []
+    for q, query in enumerate(queries):
+        best, best_overlap = None, 0
+        for t in index.overlapping(query["start"], query["end"]):
+            if t in used: continue
+            target = targets[t]
+            overlap = overlap_seconds(query["start"], query["end"], target["start"], target["end"])
+            if overlap > min_overlap and (overlap > best_overlap or (overlap == best_overlap and t < best)):
+                best, best_overlap = t, overlap
+        if best is not None:
+            used.add(best)
+            pairs.append((q, best, best_overlap))
+    return pairs
+
+
+# --- Emotion timelines ---
+class EmotionTimelineIndex:
+    """Interval indexes over an analysis result's speechEmotionTimeline and textEmotionTimeline.
+
+    Text segments have no speaker of their own; each is attributed to the speaker of the speech
+    segment it overlaps most, so both timelines can be filtered by speaker.
+    """
+
+    def __init__(self, speech_timeline, text_timeline, duration=0.0):
+        self.duration = duration
+        self.speech = speech_timeline or []
+        self.text = text_timeline or []
+        self.speech_index = IntervalIndex(self.speech)
+        self.text_index = IntervalIndex(self.text)
+        self.text_speakers = []
+        for segment in self.text:
+            best, best_overlap = None, 0
+            for s in self.speech_index.overlapping(segment["start"], segment["end"]):
+                overlap = overlap_seconds(segment["start"], segment["end"], self.speech[s]["start"], self.speech[s]["end"])
+                if overlap > best_overlap: best, best_overlap = s, overlap
+            self.text_speakers.append(self.speech[best]["speaker"] if best is not None else None)
+
+    def window(self, start, end, speaker=None):
+        """Per-speaker emotion distributions between start and end, weighted by overlapping seconds,
+        plus the overlapping segments of both timelines. With end <= start, the segments at that
+        instant count once each."""
+        speakers = {}
+        point = end <= start
+        find = (lambda index: index.at(start)) if point else (lambda index: index.overlapping(start, end))
+        weight = (lambda segment: 1.0) if point else (lambda segment: overlap_seconds(start, end, segment["start"], segment["end"]))
+
+        def add(segment_speaker, kind, emotion, seconds):
+            entry = speakers.setdefault(segment_speaker or "unattributed", {"speechEmotion": {}, "textEmotion": {}, "speechSeconds": 0.0})
+            entry[kind][emotion] = entry[kind].get(emotion, 0) + seconds
+            if kind == "speechEmotion" and not point: entry["speechSeconds"] += seconds
+
+        speech_segments, text_segments = [], []
+        for s in find(self.speech_index):
+            segment = self.speech[s]
+            if speaker and segment["speaker"] != speaker: continue
+            speech_segments.append(segment)
+            add(segment["speaker"], "speechEmotion", segment["emotion"], weight(segment))
+        for t in find(self.text_index):
+            segment, segment_speaker = self.text[t], self.text_speakers[t]
+            if speaker and segment_speaker != speaker: continue
+            text_segments.append({**segment, "speaker": segment_speaker})
+            add(segment_speaker, "textEmotion", segment["emotion"], weight(segment))
+
+        for entry in speakers.values():
+            entry["speechSeconds"] = round(entry["speechSeconds"], 3)
+            for kind in ("speechEmotion", "textEmotion"):
+                total = sum(entry[kind].values())
+                distribution = {emotion: round(seconds / total, 4) for emotion, seconds in entry[kind].items()} if total else {}
+                entry[kind] = {"dominant": max(distribution, key=distribution.get) if distribution else None, "distribution": distribution}
+        return {"speakers": speakers, "speechSegments": speech_segments, "textSegments": text_segments}
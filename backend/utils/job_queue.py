@@ -0,0 +1,253 @@
+# backend/utils/job_queue.py
+import heapq
+import itertools
+import math
+import multiprocessing as mp
+import threading
+import time
+import traceback
+
+# Lower value runs first
+PRIORITIES = {"interactive": 0, "bulk": 10}
+
+
+class QueueFullError(Exception):
+    def __init__(self, retry_after):
+        super().__init__(f"Analysis queue is full, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+def _worker_main(conn, init_fn, job_fn):
+    # Runs in the child process: load models once, then serve jobs until told to stop
+    try:
+        ready = bool(init_fn()) if init_fn else True
+    except Exception:
+        traceback.print_exc()
+        ready = False
+    conn.send(("ready", ready))
+    if not ready: return
+    while True:
+        message = conn.recv()
+        if message is None: break
+        task_id, args, kwargs = message
+        try:
+            conn.send(("done", task_id, job_fn(*args, **kwargs), None))
+        except Exception as e:
+            traceback.print_exc()
+            conn.send(("done", task_id, None, f"{type(e).__name__}: {e}"))
+
+
+class _Job:
+    def __init__(self, task_id, priority, args, kwargs):
+        self.task_id = task_id
+        self.priority = priority
+        self.args = args
+        self.kwargs = kwargs
+        self.state = "pending" # pending -> running -> done | cancelled
+        self.worker = None
+        self.submitted_at = time.time()
+
+
+class AnalysisJobQueue:
+    """Bounded priority queue feeding a fixed set of worker processes.
+
+    Each worker process runs `init_fn` once (model loading) and then `job_fn(*args, **kwargs)`
+    per job. Callbacks run in the parent process on the worker's dispatcher thread:
+    on_start(task_id), on_done(task_id, result, error) and on_cancel(task_id).
+    Cancelling a running job terminates its worker process, which is replaced by a fresh one.
+    `is_cancelled(task_id)`, if given, lets cancellations recorded elsewhere (e.g. by another
+    API process in the shared task store) reach jobs owned by this queue.
+    The jobs, workers and `max_depth` bound belong to the process that built the queue; API
+    processes running their own queues share none of them.
+    """
+
+    def __init__(self, init_fn, job_fn, num_workers=1, max_depth=32,
+                 on_start=None, on_done=None, on_cancel=None, is_cancelled=None, cancel_poll_s=2.0):
+        self.init_fn = init_fn
+        self.job_fn = job_fn
+        self.num_workers = max(1, num_workers)
+        self.max_depth = max_depth
+        self.on_start = on_start
+        self.on_done = on_done
+        self.on_cancel = on_cancel
+        self.is_cancelled = is_cancelled
+        self.cancel_poll_s = cancel_poll_s
+        self._mp = mp.get_context("spawn") # fork is unsafe with torch/tokenizer threads
+        self._heap = []
+        self._seq = itertools.count()
+        self._jobs = {} # task_id -> _Job (pending or running)
+        self._pending = 0
+        self._running = 0
+        self._ready_workers = 0
+        self._failed_workers = 0
+        self._avg_job_seconds = 30.0
+        self._cond = threading.Condition()
+        self._closed = False
+        self._threads = []
+
+    # --- Lifecycle ---
+    def start(self):
+        for slot in range(self.num_workers):
+            thread = threading.Thread(target=self._run_slot, name=f"analysis-worker-{slot}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        if self.is_cancelled:
+            thread = threading.Thread(target=self._watch_cancellations, name="analysis-cancel-watch", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def close(self, timeout=5):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        for thread in self._threads:
+            thread.join(timeout)
+
+    # --- Public API ---
+    def submit(self, task_id, args=(), kwargs=None, priority="interactive"):
+        priority_value = PRIORITIES.get(priority, priority)
+        with self._cond:
+            if self._pending >= self.max_depth:
+                raise QueueFullError(self.retry_after())
+            job = _Job(task_id, priority_value, args, kwargs or {})
+            self._jobs[task_id] = job
+            heapq.heappush(self._heap, (priority_value, next(self._seq), job))
+            self._pending += 1
+            self._cond.notify()
+        return job
+
+    def cancel(self, task_id):
+        with self._cond:
+            job = self._jobs.get(task_id)
+            if job is None: return False
+            if job.state == "pending":
+                # Left in the heap and skipped when popped
+                job.state = "cancelled"
+                self._pending -= 1
+                self._jobs.pop(task_id, None)
+            elif job.state == "running":
+                job.state = "cancelling"
+                job.worker.terminate() # the slot thread sees EOF, reports the cancel and respawns
+                return True
+            else:
+                return False
+        if self.on_cancel: self.on_cancel(task_id)
+        return True
+
+    def retry_after(self):
+        # Rough time until a queue slot frees up, based on recent job durations
+        with self._cond:
+            waves = (self._pending + 1) / self.num_workers
+            return max(1, min(600, math.ceil(waves * self._avg_job_seconds)))
+
+    def healthy(self):
+        with self._cond:
+            return self._failed_workers < self.num_workers
+
+    def stats(self):
+        with self._cond:
+            return {"workers": self.num_workers, "readyWorkers": self._ready_workers,
+                    "failedWorkers": self._failed_workers, "queueDepth": self._pending,
+                    "maxDepth": self.max_depth, "inFlight": self._running,
+                    "avgJobSeconds": round(self._avg_job_seconds, 2)}
+
+    def _watch_cancellations(self):
+        while True:
+            with self._cond:
+                self._cond.wait(self.cancel_poll_s)
+                if self._closed: return
+                task_ids = list(self._jobs)
+            for task_id in task_ids:
+                try:
+                    if self.is_cancelled(task_id): self.cancel(task_id)
+                except Exception as e:
+                    print(f"Warning: cancellation check failed for task {task_id}: {e}")
+
+    # --- Dispatcher (one thread per worker process) ---
+    def _spawn(self):
+        parent_conn, child_conn = self._mp.Pipe()
+        process = self._mp.Process(target=_worker_main, args=(child_conn, self.init_fn, self.job_fn), daemon=True)
+        process.start()
+        child_conn.close()
+        try:
+            _, ready = parent_conn.recv()
+        except EOFError:
+            ready = False
+        if not ready:
+            process.join(1)
+            return None, None
+        return process, parent_conn
+
+    def _next_job(self, process):
+        with self._cond:
+            while not self._closed:
+                while self._heap:
+                    _, _, job = heapq.heappop(self._heap)
+                    if job.state == "pending":
+                        self._pending -= 1
+                        self._running += 1
+                        job.state = "running"
+                        job.worker = process
+                        return job
+                self._cond.wait()
+            return None
+
+    def _run_slot(self):
+        process, conn = self._spawn()
+        if process is None:
+            self._mark_worker_failed()
+            return
+        with self._cond: self._ready_workers += 1
+        while True:
+            job = self._next_job(process)
+            if job is None: break
+            if self.on_start: self.on_start(job.task_id)
+            started = time.time()
+            result, error, cancelled = None, None, False
+            try:
+                conn.send((job.task_id, job.args, job.kwargs))
+                _, _, result, error = conn.recv()
+            except (EOFError, OSError, BrokenPipeError):
+                cancelled = job.state == "cancelling"
+                error = None if cancelled else "Analysis worker process exited unexpectedly."
+            with self._cond:
+                self._running -= 1
+                self._jobs.pop(job.task_id, None)
+                job.state = "cancelled" if cancelled else "done"
+                if not cancelled:
+                    self._avg_job_seconds = 0.8 * self._avg_job_seconds + 0.2 * (time.time() - started)
+            if cancelled:
+                if self.on_cancel: self.on_cancel(job.task_id)
+            elif self.on_done:
+                self.on_done(job.task_id, result, error)
+            if cancelled or not process.is_alive():
+                process.join(5) # make sure a terminated worker is gone before replacing it
+                with self._cond: self._ready_workers -= 1
+                process, conn = self._spawn()
+                if process is None:
+                    self._mark_worker_failed()
+                    return
+                with self._cond: self._ready_workers += 1
+        try:
+            conn.send(None)
+        except (OSError, BrokenPipeError):
+            pass
+        process.join(5)
+
+    def _mark_worker_failed(self):
+        with self._cond:
+            self._failed_workers += 1
+            all_failed = self._failed_workers >= self.num_workers
+            orphaned = []
+            if all_failed:
+                # No worker can ever pick these up; fail them instead of leaving them pending forever
+                while self._heap:
+                    _, _, job = heapq.heappop(self._heap)
+                    if job.state == "pending":
+                        job.state = "done"
+                        orphaned.append(job.task_id)
+                        self._jobs.pop(job.task_id, None)
+                self._pending = 0
+        print(f"ERROR: Analysis worker failed to load models ({self._failed_workers}/{self.num_workers} workers down).")
+        for task_id in orphaned:
+            if self.on_done: self.on_done(task_id, None, "Backend models unavailable.")
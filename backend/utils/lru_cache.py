@@ -0,0 +1,111 @@
+# backend/utils/lru_cache.py
+import threading
+import time
+from collections import OrderedDict
+
+
+class LRUCache:
+    """Thread-safe LRU mapping bounded by total entry size.
+
+    By default every entry has size 1, so `max_size` is an entry count. Pass `sizeof`
+    to bound by something else (e.g. bytes on disk) and `on_evict` to release whatever
+    an evicted value points to. With `ttl_s`, entries older than that many seconds are
+    treated as missing and dropped on lookup.
+    """
+
+    def __init__(self, max_size, sizeof=None, on_evict=None, ttl_s=None):
+        self.max_size = max_size
+        self.ttl_s = ttl_s
+        self._sizeof = sizeof or (lambda value: 1)
+        self._on_evict = on_evict
+        self._data = OrderedDict() # key -> (value, size, expires_at)
+        self._size = 0
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry[2] is not None and entry[2] <= time.monotonic():
+                self._data.pop(key)
+                self._size -= entry[1]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value):
+        size = self._sizeof(value)
+        expires_at = time.monotonic() + self.ttl_s if self.ttl_s else None
+        evicted = []
+        with self._lock:
+            if key in self._data:
+                self._size -= self._data.pop(key)[1]
+            self._data[key] = (value, size, expires_at)
+            self._size += size
+            # Never evict the entry that was just added, even if it alone exceeds the budget
+            while self._size > self.max_size and len(self._data) > 1:
+                old_key, (old_value, old_size, _) = self._data.popitem(last=False)
+                self._size -= old_size
+                self.evictions += 1
+                evicted.append((old_key, old_value))
+        self._release(evicted)
+
+    def pop(self, key, default=None):
+        with self._lock:
+            entry = self._data.pop(key, None)
+            if entry is None:
+                return default
+            self._size -= entry[1]
+            return entry[0]
+
+    def keys(self):
+        with self._lock:
+            return list(self._data.keys())
+
+    def sizes(self):
+        # key -> size of every entry, least recently used first
+        with self._lock:
+            return {key: size for key, (_, size, _) in self._data.items()}
+
+    def clear(self):
+        with self._lock:
+            evicted = [(key, value) for key, (value, _, _) in self._data.items()]
+            self._data.clear()
+            self._size = 0
+        self._release(evicted)
+
+    def _release(self, evicted):
+        if not self._on_evict: return
+        for key, value in evicted:
+            try:
+                self._on_evict(key, value)
+            except Exception as e:
+                print(f"Warning: LRU eviction callback failed for {key}: {e}")
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._data
+
+    def __len__(self):
+        with self._lock:
+            return len(self._data)
+
+    @property
+    def size(self):
+        with self._lock:
+            return self._size
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._data), "size": self._size, "maxSize": self.max_size,
+                "hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+                "hitRate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
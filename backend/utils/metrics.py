@@ -0,0 +1,201 @@
+# backend/utils/metrics.py
+import json
+import os
+import sys
+import threading
+
+from utils.db import SQLiteDatabase
+
+try:
+    import resource
+except ImportError: # not available on Windows
+    resource = None
+
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+SHARED_METRICS_SCHEMA = """
+-- Counter and histogram samples summed over every process that shares the database
+CREATE TABLE IF NOT EXISTS metric_samples (
+    name TEXT NOT NULL, -- sample name, e.g. analysis_seconds_bucket
+    labels TEXT NOT NULL, -- JSON array of label values (histogram buckets end with their le)
+    value REAL NOT NULL,
+    PRIMARY KEY (name, labels)
+);
+"""
+
+
+class SharedSamples:
+    """Counter/histogram totals in SQLite, so every uvicorn worker reports the same values."""
+
+    def __init__(self, db_path):
+        self.db = SQLiteDatabase(db_path, SHARED_METRICS_SCHEMA)
+
+    def add(self, increments):
+        # increments: [(sample name, label values tuple, amount)], applied in one transaction
+        conn = self.db.connection()
+        with conn:
+            conn.executemany(
+                "INSERT INTO metric_samples (name, labels, value) VALUES (?, ?, ?) "
+                "ON CONFLICT(name, labels) DO UPDATE SET value = value + excluded.value",
+                [(name, json.dumps(list(key)), amount) for name, key, amount in increments],
+            )
+
+    def read(self, names):
+        placeholders = ", ".join("?" for _ in names)
+        rows = self.db.query(f"SELECT name, labels, value FROM metric_samples WHERE name IN ({placeholders})", tuple(names))
+        return {(row["name"], tuple(json.loads(row["labels"]))): row["value"] for row in rows}
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs: return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"): return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help_text, labelnames=(), shared=None):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self._values = {} # label values tuple -> value
+        self._lock = threading.Lock()
+        self._shared = shared # SharedSamples, or None to keep values in this process
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"Metric {self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _samples(self):
+        with self._lock:
+            return [(self.name, key, (), value) for key, value in self._values.items()]
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+        for name, key, extra, value in self._samples():
+            lines.append(f"{name}{_format_labels(self.labelnames, key, extra)} {_format_value(value)}")
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        if self._shared:
+            self._shared.add([(self.name, key, amount)])
+            return
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def _samples(self):
+        if not self._shared: return super()._samples()
+        return [(self.name, key, (), value) for (_, key), value in sorted(self._shared.read([self.name]).items())]
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def _samples(self):
+        # Gauges describe the process answering the scrape; with shared metrics they say which one
+        samples = super()._samples()
+        if not self._shared: return samples
+        return [(name, key, (("pid", os.getpid()),), value) for name, key, _, value in samples]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS, shared=None):
+        super().__init__(name, help_text, labelnames, shared)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        if self._shared:
+            self._shared.add(
+                [(f"{self.name}_bucket", key + (_format_value(bound),), 1) for bound in self.buckets if value <= bound]
+                + [(f"{self.name}_sum", key, value), (f"{self.name}_count", key, 1)]
+            )
+            return
+        with self._lock:
+            entry = self._values.setdefault(key, {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0})
+            for i, bound in enumerate(self.buckets):
+                if value <= bound: entry["counts"][i] += 1
+            entry["sum"] += value
+            entry["count"] += 1
+
+    def _samples(self):
+        samples = []
+        if self._shared:
+            values = self._shared.read([f"{self.name}_bucket", f"{self.name}_sum", f"{self.name}_count"])
+            for key in sorted({key for name, key in values if name == f"{self.name}_count"}):
+                for bound in self.buckets:
+                    le = _format_value(bound)
+                    samples.append((f"{self.name}_bucket", key, (("le", le),), int(values.get((f"{self.name}_bucket", key + (le,)), 0))))
+                samples.append((f"{self.name}_sum", key, (), values[(f"{self.name}_sum", key)]))
+                samples.append((f"{self.name}_count", key, (), int(values[(f"{self.name}_count", key)])))
+            return samples
+        with self._lock:
+            for key, entry in self._values.items():
+                for bound, count in zip(self.buckets, entry["counts"]):
+                    samples.append((f"{self.name}_bucket", key, (("le", _format_value(bound)),), count))
+                samples.append((f"{self.name}_sum", key, (), entry["sum"]))
+                samples.append((f"{self.name}_count", key, (), entry["count"]))
+        return samples
+
+
+class MetricsRegistry:
+    """Metrics rendered in the Prometheus text exposition format (version 0.0.4).
+
+    With `db_path`, counters and histograms are kept in that SQLite database and summed over
+    every process using it, so any API worker answers a scrape with the same totals. Gauges
+    always describe the answering process and then carry its `pid` label.
+    """
+
+    def __init__(self, db_path=None):
+        self._metrics = []
+        self._shared = SharedSamples(db_path) if db_path else None
+
+    def _register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, help_text, labelnames=()):
+        return self._register(Counter(name, help_text, labelnames, self._shared))
+
+    def gauge(self, name, help_text, labelnames=()):
+        return self._register(Gauge(name, help_text, labelnames, self._shared))
+
+    def histogram(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(name, help_text, labelnames, buckets, self._shared))
+
+    def render(self):
+        return "\n".join(metric.render() for metric in self._metrics) + "\n"
+
+
+def process_rss_bytes():
+    # Current resident set size; /proc on Linux, peak RSS elsewhere
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return peak_rss_bytes()
+
+
+def peak_rss_bytes():
+    if resource is None: return 0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024 # bytes on macOS, KiB on Linux
@@ -0,0 +1,103 @@
+# backend/utils/result_cache.py
+import hashlib
+import json
+import time
+import zlib
+
+from utils.db import SQLiteDatabase
+
+RESULT_CACHE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS result_cache (
+    cache_key TEXT PRIMARY KEY, -- sha256(content hash + analysis fingerprint)
+    source_task_id TEXT NOT NULL, -- task whose analysis produced the result
+    result BLOB NOT NULL, -- zlib-compressed JSON
+    size INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    last_used_at REAL NOT NULL,
+    hits INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_result_cache_last_used ON result_cache(last_used_at);
+CREATE TABLE IF NOT EXISTS result_cache_counters (
+    name TEXT PRIMARY KEY, -- 'hits' | 'misses' | 'evictions'
+    value INTEGER NOT NULL
+);
+"""
+
+
+def result_cache_key(content_hash, fingerprint):
+    return hashlib.sha256(f"{content_hash}:{fingerprint}".encode("utf-8")).hexdigest()
+
+
+def retarget_result(result, source_task_id, task_id, file_name, upload_filename):
+    """Copy of a cached result re-addressed to a new task: ids, file name and every audio URL.
+
+    Segment URLs keep their file names; /api/audio renders them lazily from the new task's upload.
+    """
+    text = json.dumps(result).replace(f"/api/audio/{source_task_id}/", f"/api/audio/{task_id}/")
+    result = json.loads(text)
+    result["taskId"] = task_id
+    result["fileName"] = file_name
+    result["originalAudioUrl"] = f"/api/audio/{task_id}/{upload_filename}"
+    return result
+
+
+class ResultCache:
+    """Analysis results keyed by upload content and analysis configuration, bounded by bytes.
+
+    Shared by every API process through SQLite; the least recently used entries are evicted
+    once the compressed results exceed `max_bytes`.
+    """
+
+    def __init__(self, db_path, max_bytes):
+        self.db = SQLiteDatabase(db_path, RESULT_CACHE_SCHEMA)
+        self.max_bytes = max_bytes
+
+    def _bump(self, conn, name, amount=1):
+        conn.execute(
+            "INSERT INTO result_cache_counters (name, value) VALUES (?, ?) "
+            "ON CONFLICT(name) DO UPDATE SET value = value + excluded.value", (name, amount),
+        )
+
+    def get(self, cache_key):
+        """Returns (source task id, result) or None; counts the lookup as a hit or miss."""
+        conn = self.db.connection()
+        with conn:
+            row = conn.execute("SELECT source_task_id, result FROM result_cache WHERE cache_key = ?", (cache_key,)).fetchone()
+            if row is None:
+                self._bump(conn, "misses")
+                return None
+            conn.execute("UPDATE result_cache SET last_used_at = ?, hits = hits + 1 WHERE cache_key = ?", (time.time(), cache_key))
+            self._bump(conn, "hits")
+        return row["source_task_id"], json.loads(zlib.decompress(row["result"]).decode("utf-8"))
+
+    def put(self, cache_key, source_task_id, result):
+        blob = zlib.compress(json.dumps(result, separators=(",", ":")).encode("utf-8"))
+        now = time.time()
+        conn = self.db.connection()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO result_cache (cache_key, source_task_id, result, size, created_at, last_used_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)", (cache_key, source_task_id, blob, len(blob), now, now),
+            )
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) AS total FROM result_cache").fetchone()["total"]
+            evicted = 0
+            # Oldest first, never the entry just written
+            for row in conn.execute(
+                "SELECT cache_key, size FROM result_cache WHERE cache_key != ? ORDER BY last_used_at", (cache_key,)
+            ).fetchall():
+                if total <= self.max_bytes: break
+                conn.execute("DELETE FROM result_cache WHERE cache_key = ?", (row["cache_key"],))
+                total -= row["size"]
+                evicted += 1
+            if evicted: self._bump(conn, "evictions", evicted)
+
+    def stats(self):
+        row = self.db.query_one("SELECT COUNT(*) AS entries, COALESCE(SUM(size), 0) AS size FROM result_cache")
+        counters = {r["name"]: r["value"] for r in self.db.query("SELECT name, value FROM result_cache_counters")}
+        hits, misses = counters.get("hits", 0), counters.get("misses", 0)
+        lookups = hits + misses
+        return {
+            "entries": row["entries"], "size": row["size"], "maxSize": self.max_bytes,
+            "hits": hits, "misses": misses, "evictions": counters.get("evictions", 0),
+            "hitRate": round(hits / lookups, 4) if lookups else 0.0,
+        }
@@ -0,0 +1,130 @@
+# backend/utils/segment_audio.py
+import os
+import re
+import threading
+import librosa
+import numpy as np
+import soundfile as sf
+
+from utils.lru_cache import LRUCache
+
+# Segment files are named <speaker>_<start_ms>-<end_ms>.<ext>, e.g. SPEAKER_00_1520-4830.wav
+SEGMENT_FILENAME_RE = re.compile(r"^(?P<speaker>SPEAKER_\w+?)_(?P<start>\d+)-(?P<end>\d+)\.(?P<ext>wav|flac|ogg|opus)$")
+# extension -> (soundfile container, subtype)
+SEGMENT_FORMATS = {
+    "wav": ("WAV", "PCM_16"),
+    "flac": ("FLAC", "PCM_16"),
+    "ogg": ("OGG", "VORBIS"),
+    "opus": ("OGG", "OPUS"),
+}
+OPUS_SAMPLE_RATES = (8000, 12000, 16000, 24000, 48000)
+
+
+def parse_segment_filename(filename):
+    match = SEGMENT_FILENAME_RE.match(filename)
+    if not match: return None
+    start_ms, end_ms = int(match.group("start")), int(match.group("end"))
+    if start_ms >= end_ms: return None
+    return {"speaker": match.group("speaker"), "start_ms": start_ms, "end_ms": end_ms, "ext": match.group("ext")}
+
+
+def read_audio_range(path, start_ms, end_ms):
+    # soundfile seeks straight to the requested frames; containers libsndfile can't
+    # read (m4a/aac, some mp3) fall back to librosa/audioread, which decodes up to the offset
+    try:
+        with sf.SoundFile(path) as f:
+            sr = f.samplerate
+            start = min(start_ms * sr // 1000, f.frames)
+            stop = min(end_ms * sr // 1000, f.frames)
+            f.seek(start)
+            data = f.read(stop - start, dtype="float32", always_2d=True)
+        return data, sr
+    except (RuntimeError, sf.LibsndfileError):
+        y, sr = librosa.load(path, sr=None, mono=False, offset=start_ms / 1000, duration=(end_ms - start_ms) / 1000)
+        data = y.T if y.ndim > 1 else y[:, np.newaxis]
+        return np.ascontiguousarray(data, dtype=np.float32), sr
+
+
+def render_segment(source_path, start_ms, end_ms, output_path, ext="wav"):
+    container, subtype = SEGMENT_FORMATS[ext]
+    data, sr = read_audio_range(source_path, start_ms, end_ms)
+    if not len(data):
+        raise ValueError(f"Segment {start_ms}-{end_ms}ms is outside the recording")
+    if ext == "opus" and sr not in OPUS_SAMPLE_RATES:
+        data = librosa.resample(data.T, orig_sr=sr, target_sr=48000).T
+        sr = 48000
+    tmp_path = f"{output_path}.part"
+    sf.write(tmp_path, data, sr, format=container, subtype=subtype)
+    os.replace(tmp_path, output_path) # Readers never see a half-written file
+    return output_path
+
+
+class SegmentAudioCache:
+    """Renders speaker segment files on first request into a size-bounded LRU directory."""
+
+    def __init__(self, base_dir, max_bytes):
+        self.base_dir = base_dir
+        self._lru = LRUCache(max_bytes, sizeof=os.path.getsize, on_evict=self._remove_file)
+        self._render_locks = {}
+        self._locks_guard = threading.Lock()
+        self._index_existing()
+
+    def _index_existing(self):
+        # Register files left over from earlier runs, oldest first, so they count against the budget
+        found = []
+        for task_id in os.listdir(self.base_dir) if os.path.isdir(self.base_dir) else []:
+            task_dir = os.path.join(self.base_dir, task_id)
+            if not os.path.isdir(task_dir): continue
+            for filename in os.listdir(task_dir):
+                path = os.path.join(task_dir, filename)
+                if parse_segment_filename(filename) and os.path.isfile(path):
+                    found.append((os.path.getmtime(path), (task_id, filename), path))
+        for _, key, path in sorted(found):
+            self._lru.put(key, path)
+
+    @staticmethod
+    def _remove_file(key, path):
+        if os.path.exists(path):
+            os.remove(path)
+        task_dir = os.path.dirname(path)
+        if os.path.isdir(task_dir) and not os.listdir(task_dir):
+            os.rmdir(task_dir)
+
+    def _render_lock(self, key):
+        with self._locks_guard:
+            return self._render_locks.setdefault(key, threading.Lock())
+
+    def get_or_render(self, task_id, filename, source_path):
+        segment = parse_segment_filename(filename)
+        if not segment: raise ValueError(f"Not a segment filename: {filename}")
+        key = (task_id, filename)
+        path = self._lru.get(key)
+        if path and os.path.exists(path): return path
+        # One render per segment even if the player fires several requests at once
+        with self._render_lock(key):
+            path = self._lru.get(key)
+            if path and os.path.exists(path): return path
+            task_dir = os.path.join(self.base_dir, task_id)
+            os.makedirs(task_dir, exist_ok=True)
+            path = render_segment(source_path, segment["start_ms"], segment["end_ms"],
+                                  os.path.join(task_dir, filename), segment["ext"])
+            self._lru.put(key, path)
+        with self._locks_guard:
+            self._render_locks.pop(key, None)
+        return path
+
+    def drop_task(self, task_id):
+        for key in self._lru.keys():
+            if key[0] == task_id:
+                path = self._lru.pop(key)
+                if path: self._remove_file(key, path)
+
+    def task_bytes(self):
+        # task_id -> bytes of its rendered segments
+        totals = {}
+        for (task_id, _), size in self._lru.sizes().items():
+            totals[task_id] = totals.get(task_id, 0) + size
+        return totals
+
+    def stats(self):
+        return self._lru.stats()
@@ -0,0 +1,81 @@
+# backend/utils/segment_policy.py
+
+
+def _window_spans(start, end, window, hop, max_window):
+    # The whole unit if it fits in max_window, else window-long spans every hop samples, the last one flush with the end
+    if end - start <= max_window: return [(start, end)]
+    spans, position = [], start
+    while position + window < end:
+        spans.append((position, position + window))
+        position += hop
+    spans.append((end - window, end))
+    return spans
+
+
+def plan_inference_windows(turns, sr, merge_min_s, merge_max_gap_s, window_s, hop_s, max_window_s):
+    """Turns diarization turns into bounded model inputs for per-segment classifiers.
+
+    `turns` are (speaker, start_sample, end_sample). Consecutive turns of the same speaker
+    (nobody else talking in between, gap <= merge_max_gap_s) are merged into one unit while
+    either side is shorter than merge_min_s, so micro-turns share a forward pass with their
+    neighbours. Units longer than max_window_s are split into window_s windows every hop_s;
+    no window is ever longer than max_window_s.
+
+    Returns {"units": [{"speaker", "start", "end", "turns"}], "windows": [(unit, start, end)],
+    "turnWindows": per turn [(window index, overlapping samples)], "stats": {...}}.
+    """
+    max_window = max(1, int(max_window_s * sr))
+    window = max(1, min(int(window_s * sr), max_window))
+    hop = max(1, min(int(hop_s * sr), window))
+    merge_min, max_gap = merge_min_s * sr, merge_max_gap_s * sr
+
+    units = []
+    for i in sorted(range(len(turns)), key=lambda i: (turns[i][1], turns[i][2])):
+        speaker, start, end = turns[i]
+        unit = units[-1] if units else None
+        if (unit and unit["speaker"] == speaker and start - unit["end"] <= max_gap
+                and (unit["end"] - unit["start"] < merge_min or end - start < merge_min)
+                and max(end, unit["end"]) - unit["start"] <= max_window):
+            unit["end"] = max(unit["end"], end)
+            unit["turns"].append(i)
+        else:
+            units.append({"speaker": speaker, "start": start, "end": end, "turns": [i]})
+
+    windows, turn_windows = [], [[] for _ in turns]
+    for u, unit in enumerate(units):
+        first = len(windows)
+        windows.extend((u, start, end) for start, end in _window_spans(unit["start"], unit["end"], window, hop, max_window))
+        # Each turn is scored by the windows of its unit that overlap it, weighted by the overlap
+        for i in unit["turns"]:
+            _, turn_start, turn_end = turns[i]
+            for w in range(first, len(windows)):
+                overlap = min(turn_end, windows[w][2]) - max(turn_start, windows[w][1])
+                if overlap > 0: turn_windows[i].append((w, overlap))
+
+    stats = {
+        "turns": len(turns), "units": len(units), "windows": len(windows),
+        "mergedTurns": sum(len(unit["turns"]) for unit in units if len(unit["turns"]) > 1),
+        "splitUnits": sum(1 for unit in units if unit["end"] - unit["start"] > max_window),
+        "turnSeconds": round(sum(end - start for _, start, end in turns) / sr, 2),
+        "windowSeconds": round(sum(end - start for _, start, end in windows) / sr, 2),
+        "longestWindowS": round(max((end - start for _, start, end in windows), default=0) / sr, 2),
+    }
+    return {"units": units, "windows": windows, "turnWindows": turn_windows, "stats": stats}
+
+
+def aggregate_window_scores(turn_windows, window_scores):
+    """Overlap-weighted mean of the window scores (e.g. class probabilities) per turn.
+
+    Windows whose score is None (failed inference) are left out; a turn with no scored
+    window gets None.
+    """
+    aggregated = []
+    for weights in turn_windows:
+        total, weight_sum = None, 0
+        for w, weight in weights:
+            score = window_scores[w]
+            if score is None: continue
+            total = score * weight if total is None else total + score * weight
+            weight_sum += weight
+        aggregated.append(total / weight_sum if weight_sum else None)
+    return aggregated
@@ -0,0 +1,155 @@
+# backend/utils/storage.py
+import os
+import threading
+import time
+
+from utils.db import SQLiteDatabase
+
+STORAGE_SCHEMA = """
+-- Task -> original upload, so lookups and cleanup never scan the upload directory
+CREATE TABLE IF NOT EXISTS task_files (
+    task_id TEXT PRIMARY KEY,
+    upload_path TEXT NOT NULL,
+    upload_bytes INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    last_served_at REAL, -- last time the upload or one of its segments was served
+    backfilled INTEGER NOT NULL DEFAULT 0 -- 1 for uploads indexed from disk, which never had a task row
+);
+CREATE INDEX IF NOT EXISTS idx_task_files_last_used ON task_files(COALESCE(last_served_at, created_at));
+CREATE TABLE IF NOT EXISTS storage_meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+ACTIVE_STATUSES = ("pending", "processing") # the analysis worker still needs the upload
+
+
+class StorageIndex:
+    """Persistent task -> upload file index with last-served times, shared by every API process."""
+
+    def __init__(self, db_path, touch_interval_s=60):
+        self.db = SQLiteDatabase(db_path, STORAGE_SCHEMA)
+        self.db.add_column("task_files", "backfilled", "INTEGER NOT NULL DEFAULT 0")
+        self.touch_interval_s = touch_interval_s
+        self._touched = {} # task_id -> last touch written by this process
+        self._lock = threading.Lock()
+
+    def register(self, task_id, path, size=None, created_at=None):
+        size = os.path.getsize(path) if size is None else size
+        self.db.execute(
+            "INSERT OR REPLACE INTO task_files (task_id, upload_path, upload_bytes, created_at) VALUES (?, ?, ?, ?)",
+            (task_id, path, size, created_at or time.time()),
+        )
+
+    def path(self, task_id):
+        row = self.db.query_one("SELECT upload_path FROM task_files WHERE task_id = ?", (task_id,))
+        return row["upload_path"] if row else None
+
+    def touch(self, task_id):
+        # At most one write per task every touch_interval_s: players fire many range requests
+        now = time.time()
+        with self._lock:
+            if now - self._touched.get(task_id, 0) < self.touch_interval_s: return
+            self._touched[task_id] = now
+        self.db.execute("UPDATE task_files SET last_served_at = ? WHERE task_id = ?", (now, task_id))
+
+    def remove(self, task_id):
+        with self._lock: self._touched.pop(task_id, None)
+        return self.db.execute("DELETE FROM task_files WHERE task_id = ?", (task_id,)).rowcount > 0
+
+    def entries(self):
+        """All indexed uploads, least recently used first."""
+        rows = self.db.query(
+            "SELECT task_id, upload_path, upload_bytes, backfilled, COALESCE(last_served_at, created_at) AS last_used_at "
+            "FROM task_files ORDER BY COALESCE(last_served_at, created_at)"
+        )
+        return [dict(row) for row in rows]
+
+    def backfill(self, upload_dir):
+        """One-time import of uploads saved before the index existed (<task_id><ext> files).
+
+        They have no task row, so they are kept for the retention period from their file mtime
+        instead of counting as expired tasks.
+        """
+        if self.db.query_one("SELECT value FROM storage_meta WHERE key = 'uploads_indexed'"): return 0
+        added = 0
+        conn = self.db.connection()
+        with conn:
+            for entry in os.scandir(upload_dir) if os.path.isdir(upload_dir) else []:
+                if not entry.is_file() or entry.name.endswith(".part"): continue
+                stat = entry.stat()
+                added += conn.execute(
+                    "INSERT OR IGNORE INTO task_files (task_id, upload_path, upload_bytes, created_at, backfilled) VALUES (?, ?, ?, ?, 1)",
+                    (os.path.splitext(entry.name)[0], entry.path, stat.st_size, stat.st_mtime),
+                ).rowcount
+            conn.execute("INSERT OR REPLACE INTO storage_meta (key, value) VALUES ('uploads_indexed', '1')")
+        return added
+
+
+class StorageJanitor:
+    """Evicts task artifacts (upload + rendered segments) that outlived their task or the retention
+    period, then least recently used ones until uploads and segments fit in `quota_bytes`.
+
+    `segment_bytes()` returns task_id -> rendered segment bytes, `task_statuses()` task_id -> status
+    of live tasks, and `evict(task_id, upload_path)` deletes a task's files.
+    Backfilled uploads never had a task, so only the retention period and the quota apply to them.
+    """
+
+    def __init__(self, index, retention_s, quota_bytes, segment_bytes, task_statuses, evict):
+        self.index = index
+        self.retention_s = retention_s
+        self.quota_bytes = quota_bytes
+        self.segment_bytes = segment_bytes
+        self.task_statuses = task_statuses
+        self.evict = evict
+        self.last_sweep = None
+
+    def plan(self, now=None):
+        """Returns (evictions in order as [{"taskId", "bytes", "reason", "lastUsedAt"}], usage totals)."""
+        now = now or time.time()
+        entries, segments, statuses = self.index.entries(), self.segment_bytes(), self.task_statuses()
+        upload_total = sum(entry["upload_bytes"] for entry in entries)
+        total = upload_total + sum(segments.values())
+        usage = {"uploads": {"files": len(entries), "bytes": upload_total},
+                 "segments": {"tasks": len(segments), "bytes": sum(segments.values())}, "totalBytes": total}
+        evictions = []
+        for entry in entries:
+            task_id = entry["task_id"]
+            status = statuses.get(task_id)
+            if status in ACTIVE_STATUSES: continue
+            if status is None and not entry["backfilled"]: reason = "taskExpired"
+            elif now - entry["last_used_at"] > self.retention_s: reason = "retention"
+            elif total > self.quota_bytes: reason = "quota"
+            else: continue
+            size = entry["upload_bytes"] + segments.get(task_id, 0)
+            evictions.append({"taskId": task_id, "uploadPath": entry["upload_path"], "bytes": size,
+                              "reason": reason, "lastUsedAt": entry["last_used_at"]})
+            total -= size
+        return evictions, usage
+
+    def report(self):
+        evictions, usage = self.plan()
+        reclaimable = {}
+        for eviction in evictions:
+            bucket = reclaimable.setdefault(eviction["reason"], {"tasks": 0, "bytes": 0})
+            bucket["tasks"] += 1
+            bucket["bytes"] += eviction["bytes"]
+        return {**usage, "quotaBytes": self.quota_bytes, "retentionS": self.retention_s,
+                "reclaimableBytes": sum(eviction["bytes"] for eviction in evictions),
+                "reclaimable": reclaimable, "lastSweep": self.last_sweep}
+
+    def sweep(self):
+        started = time.time()
+        evictions, _ = self.plan(started)
+        freed, failed = 0, 0
+        for eviction in evictions:
+            try:
+                self.evict(eviction["taskId"], eviction["uploadPath"])
+                self.index.remove(eviction["taskId"])
+                freed += eviction["bytes"]
+            except Exception as e:
+                failed += 1
+                print(f"Warning: could not evict artifacts of task {eviction['taskId']}: {e}")
+        self.last_sweep = {"at": started, "seconds": round(time.time() - started, 3),
+                           "evictedTasks": len(evictions) - failed, "freedBytes": freed, "failed": failed}
+        return self.last_sweep
@@ -0,0 +1,319 @@
+# backend/utils/task_store.py
+import json
+import os
+import socket
+import time
+import zlib
+
+from utils.db import SQLiteDatabase
+
+TASK_SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    task_id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    file_name TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    expires_at REAL,
+    result BLOB,
+    owner TEXT -- queue_owners.owner whose in-memory job queue holds the task; NULL in the batch backlog
+);
+CREATE INDEX IF NOT EXISTS idx_tasks_expires_at ON tasks(expires_at);
+CREATE INDEX IF NOT EXISTS idx_tasks_status ON tasks(status);
+-- API processes running an analysis job queue; a task whose owner stops heartbeating lost its job with it
+CREATE TABLE IF NOT EXISTS queue_owners (
+    owner TEXT PRIMARY KEY,
+    host TEXT NOT NULL,
+    pid INTEGER NOT NULL,
+    started_at REAL NOT NULL,
+    heartbeat_at REAL NOT NULL
+);
+-- Progress events (status changes, stage progress, partial results) streamed to clients over SSE
+CREATE TABLE IF NOT EXISTS task_events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    task_id TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    event TEXT NOT NULL, -- 'status' | 'stage' | 'progress' | 'partial'
+    data TEXT NOT NULL -- JSON
+);
+CREATE INDEX IF NOT EXISTS idx_task_events_task ON task_events(task_id, id);
+-- Bulk uploads: one batch, one task per recording; unqueued tasks wait here until the job queue has room
+CREATE TABLE IF NOT EXISTS batches (
+    batch_id TEXT PRIMARY KEY,
+    created_at REAL NOT NULL,
+    source TEXT, -- uploaded archive / file names
+    ingesting INTEGER NOT NULL DEFAULT 1, -- 1 while the archive is still being expanded
+    rejected TEXT NOT NULL DEFAULT '[]' -- JSON [{"file", "error"}]
+);
+CREATE TABLE IF NOT EXISTS batch_tasks (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT, -- submission order
+    batch_id TEXT NOT NULL,
+    task_id TEXT NOT NULL UNIQUE,
+    job TEXT NOT NULL, -- JSON {"args", "kwargs", "priority"} for the job queue
+    queued INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_batch_tasks_batch ON batch_tasks(batch_id);
+CREATE INDEX IF NOT EXISTS idx_batch_tasks_unqueued ON batch_tasks(queued, seq);
+"""
+
+# new status -> statuses it may be reached from
+STATUS_TRANSITIONS = {
+    "processing": ("pending",),
+    "complete": ("processing",),
+    "error": ("pending", "processing"),
+    "cancelled": ("pending", "processing"),
+}
+TERMINAL_STATUSES = ("complete", "error", "cancelled")
+INTERRUPTED_ERROR = "Analysis was interrupted because the server restarted. Please upload the file again."
+
+
+def _pack(result):
+    if result is None: return None
+    return zlib.compress(json.dumps(result, separators=(",", ":")).encode("utf-8"))
+
+
+def _unpack(blob):
+    if blob is None: return None
+    return json.loads(zlib.decompress(blob).decode("utf-8"))
+
+
+class TaskStore:
+    """Persistent task status/result store shared by every API and worker process.
+
+    Results are stored as zlib-compressed JSON and expire `result_ttl_s` seconds after the
+    task reaches a terminal status. Every status change is also appended to the task's event
+    log, next to the stage/partial-result events the analysis workers add; a finished task's
+    events are purged `event_ttl_s` seconds later.
+    """
+
+    def __init__(self, db_path, result_ttl_s=7 * 24 * 3600, event_ttl_s=600):
+        self.db = SQLiteDatabase(db_path, TASK_SCHEMA)
+        self.result_ttl_s = result_ttl_s
+        self.event_ttl_s = event_ttl_s
+        self.db.add_column("tasks", "owner", "TEXT")
+
+    def create(self, task_id, file_name=None, status="pending", owner=None):
+        now = time.time()
+        conn = self.db.connection()
+        with conn:
+            conn.execute(
+                "INSERT INTO tasks (task_id, status, file_name, created_at, updated_at, owner) VALUES (?, ?, ?, ?, ?, ?)",
+                (task_id, status, file_name, now, now, owner),
+            )
+            self._insert_event(conn, task_id, "status", {"status": status})
+
+    def transition(self, task_id, status, result=None):
+        """Moves a task to `status` if allowed from its current status; returns False otherwise."""
+        now = time.time()
+        allowed_from = STATUS_TRANSITIONS[status]
+        placeholders = ", ".join("?" for _ in allowed_from)
+        conn = self.db.connection()
+        with conn:
+            if status in TERMINAL_STATUSES:
+                cursor = conn.execute(
+                    f"UPDATE tasks SET status = ?, result = ?, updated_at = ?, finished_at = ?, expires_at = ? "
+                    f"WHERE task_id = ? AND status IN ({placeholders})",
+                    (status, _pack(result), now, now, now + self.result_ttl_s, task_id, *allowed_from),
+                )
+            else:
+                cursor = conn.execute(
+                    f"UPDATE tasks SET status = ?, updated_at = ?, started_at = ? "
+                    f"WHERE task_id = ? AND status IN ({placeholders})",
+                    (status, now, now, task_id, *allowed_from),
+                )
+            changed = cursor.rowcount > 0
+            if changed:
+                event = {"status": status}
+                if status == "error" and result: event["error"] = result.get("error")
+                self._insert_event(conn, task_id, "status", event)
+        return changed
+
+    def get_status(self, task_id):
+        row = self.db.query_one(
+            "SELECT status FROM tasks WHERE task_id = ? AND (expires_at IS NULL OR expires_at > ?)",
+            (task_id, time.time()),
+        )
+        return row["status"] if row else None
+
+    def get(self, task_id):
+        row = self.db.query_one(
+            "SELECT * FROM tasks WHERE task_id = ? AND (expires_at IS NULL OR expires_at > ?)",
+            (task_id, time.time()),
+        )
+        if not row: return None
+        task = dict(row)
+        task["result"] = _unpack(task["result"])
+        return task
+
+    def statuses(self):
+        """task_id -> status of every task that hasn't expired."""
+        rows = self.db.query("SELECT task_id, status FROM tasks WHERE expires_at IS NULL OR expires_at > ?", (time.time(),))
+        return {row["task_id"]: row["status"] for row in rows}
+
+    def delete(self, task_id):
+        conn = self.db.connection()
+        with conn:
+            conn.execute("DELETE FROM task_events WHERE task_id = ?", (task_id,))
+            return conn.execute("DELETE FROM tasks WHERE task_id = ?", (task_id,)).rowcount > 0
+
+    def purge_expired(self):
+        conn = self.db.connection()
+        with conn:
+            purged = conn.execute("DELETE FROM tasks WHERE expires_at IS NOT NULL AND expires_at <= ?", (time.time(),)).rowcount
+            # Progress events are only for live /events streams: dropped event_ttl_s after the task finished
+            conn.execute(
+                "DELETE FROM task_events WHERE task_id NOT IN (SELECT task_id FROM tasks) OR task_id IN "
+                "(SELECT task_id FROM tasks WHERE finished_at IS NOT NULL AND finished_at <= ?)",
+                (time.time() - self.event_ttl_s,),
+            )
+            conn.execute("DELETE FROM batch_tasks WHERE queued = 1 AND task_id NOT IN (SELECT task_id FROM tasks)")
+            conn.execute("DELETE FROM batches WHERE ingesting = 0 AND batch_id NOT IN (SELECT batch_id FROM batch_tasks)")
+        return purged
+
+    # --- Queue owners ---
+    def register_owner(self, owner):
+        now = time.time()
+        self.db.execute(
+            "INSERT OR REPLACE INTO queue_owners (owner, host, pid, started_at, heartbeat_at) VALUES (?, ?, ?, ?, ?)",
+            (owner, socket.gethostname(), os.getpid(), now, now),
+        )
+
+    def heartbeat(self, owner):
+        # Re-registers an owner that was presumed dead (e.g. after a long stall); its tasks are already settled
+        if self.db.execute("UPDATE queue_owners SET heartbeat_at = ? WHERE owner = ?", (time.time(), owner)).rowcount == 0:
+            self.register_owner(owner)
+
+    def live_owners(self, stale_s, host=None):
+        """Owners heartbeating within `stale_s` seconds, optionally only those on `host`."""
+        sql, params = "SELECT owner, host, pid FROM queue_owners WHERE heartbeat_at > ?", [time.time() - stale_s]
+        if host is not None:
+            sql += " AND host = ?"; params.append(host)
+        return [dict(row) for row in self.db.query(sql, params)]
+
+    def remove_owner(self, owner):
+        self.db.execute("DELETE FROM queue_owners WHERE owner = ?", (owner,))
+
+    def reconcile_orphans(self, stale_s):
+        """Settles pending/processing tasks whose job lived in a queue that is gone.
+
+        Owners that haven't heartbeated for `stale_s` seconds are dropped, and so are their jobs. Batch
+        tasks still have theirs in batch_tasks and go back to the backlog as pending; the other tasks
+        (and tasks from before owners were recorded) move to "error" so /status, /events and the
+        storage janitor see them finish. Returns {"failed", "requeued"} task counts.
+        """
+        now = time.time()
+        conn = self.db.connection()
+        with conn:
+            conn.execute("DELETE FROM queue_owners WHERE heartbeat_at <= ?", (now - stale_s,))
+            rows = conn.execute(
+                "SELECT t.task_id, t.file_name, b.job FROM tasks t LEFT JOIN batch_tasks b ON b.task_id = t.task_id "
+                "WHERE t.status IN ('pending', 'processing') AND (t.owner IS NULL OR t.owner NOT IN (SELECT owner FROM queue_owners)) "
+                "AND (b.queued IS NULL OR b.queued = 1)"
+            ).fetchall()
+            requeued = [row for row in rows if row["job"] and json.loads(row["job"])]
+            for row in requeued:
+                conn.execute("UPDATE batch_tasks SET queued = 0 WHERE task_id = ?", (row["task_id"],))
+                conn.execute(
+                    "UPDATE tasks SET status = 'pending', owner = NULL, started_at = NULL, updated_at = ? WHERE task_id = ?",
+                    (now, row["task_id"]),
+                )
+                self._insert_event(conn, row["task_id"], "status", {"status": "pending", "requeued": True})
+            failed = [row for row in rows if not (row["job"] and json.loads(row["job"]))]
+            for row in failed:
+                result = {"error": INTERRUPTED_ERROR, "taskId": row["task_id"], "fileName": row["file_name"]}
+                conn.execute(
+                    "UPDATE tasks SET status = 'error', result = ?, updated_at = ?, finished_at = ?, expires_at = ? "
+                    "WHERE task_id = ?", (_pack(result), now, now, now + self.result_ttl_s, row["task_id"]),
+                )
+                self._insert_event(conn, row["task_id"], "status", {"status": "error", "error": INTERRUPTED_ERROR})
+        return {"failed": len(failed), "requeued": len(requeued)}
+
+    # --- Events ---
+    def add_event(self, task_id, event, data):
+        conn = self.db.connection()
+        with conn:
+            return self._insert_event(conn, task_id, event, data)
+
+    @staticmethod
+    def _insert_event(conn, task_id, event, data):
+        return conn.execute(
+            "INSERT INTO task_events (task_id, created_at, event, data) VALUES (?, ?, ?, ?)",
+            (task_id, time.time(), event, json.dumps(data, separators=(",", ":"))),
+        ).lastrowid
+
+    def events_since(self, task_id, after_id=0, limit=500):
+        """Events of a task with id > after_id, oldest first: [{"id", "event", "data"}]."""
+        rows = self.db.query(
+            "SELECT id, event, data FROM task_events WHERE task_id = ? AND id > ? ORDER BY id LIMIT ?",
+            (task_id, after_id, limit),
+        )
+        return [{"id": row["id"], "event": row["event"], "data": json.loads(row["data"])} for row in rows]
+
+    # --- Batches ---
+    def create_batch(self, batch_id, source=None):
+        self.db.execute("INSERT INTO batches (batch_id, created_at, source) VALUES (?, ?, ?)", (batch_id, time.time(), source))
+
+    def finish_batch_ingest(self, batch_id, rejected=(), source=None):
+        # `source` (the uploaded file names) is only known once a streamed body has been read
+        self.db.execute(
+            "UPDATE batches SET ingesting = 0, rejected = ?, source = COALESCE(?, source) WHERE batch_id = ?",
+            (json.dumps(list(rejected)), source, batch_id),
+        )
+
+    def add_batch_task(self, batch_id, task_id, job=None):
+        """Adds a created task to a batch; with `job`, it waits for claim_batch_tasks to hand it to the queue."""
+        conn = self.db.connection()
+        with conn:
+            conn.execute(
+                "INSERT INTO batch_tasks (batch_id, task_id, job, queued) VALUES (?, ?, ?, ?)",
+                (batch_id, task_id, json.dumps(job or {}), 0 if job else 1),
+            )
+            # Waiting in the shared backlog: no process holds the job until one claims it
+            if job: conn.execute("UPDATE tasks SET owner = NULL WHERE task_id = ?", (task_id,))
+
+    def claim_batch_tasks(self, limit, owner=None):
+        """Marks up to `limit` of the oldest unqueued, still pending batch tasks as queued by `owner` and returns them."""
+        conn = self.db.connection()
+        with conn:
+            rows = conn.execute(
+                "SELECT b.seq, b.task_id, b.job, t.status FROM batch_tasks b LEFT JOIN tasks t ON t.task_id = b.task_id "
+                "WHERE b.queued = 0 ORDER BY b.seq LIMIT ?", (limit,),
+            ).fetchall()
+            # Tasks cancelled (or purged) before reaching the queue are claimed too, so they stop blocking the backlog.
+            # Only rows this UPDATE flipped are ours: another worker feeding the backlog may have claimed the rest.
+            claimed = [row for row in rows
+                       if conn.execute("UPDATE batch_tasks SET queued = 1 WHERE seq = ? AND queued = 0", (row["seq"],)).rowcount == 1]
+            conn.executemany("UPDATE tasks SET owner = ? WHERE task_id = ?", [(owner, row["task_id"]) for row in claimed])
+        return [{"task_id": row["task_id"], **json.loads(row["job"])} for row in claimed if row["status"] == "pending"]
+
+    def release_batch_task(self, task_id):
+        # Back to the backlog, e.g. when the queue filled up between claim and submit
+        conn = self.db.connection()
+        with conn:
+            conn.execute("UPDATE batch_tasks SET queued = 0 WHERE task_id = ?", (task_id,))
+            conn.execute("UPDATE tasks SET owner = NULL WHERE task_id = ?", (task_id,))
+
+    def batch_progress(self, batch_id, include_tasks=True):
+        batch = self.db.query_one("SELECT * FROM batches WHERE batch_id = ?", (batch_id,))
+        if not batch: return None
+        rows = self.db.query(
+            "SELECT b.task_id, t.status, t.file_name FROM batch_tasks b LEFT JOIN tasks t ON t.task_id = b.task_id "
+            "WHERE b.batch_id = ? ORDER BY b.seq", (batch_id,),
+        )
+        counts = {status: 0 for status in ("pending", "processing", *TERMINAL_STATUSES)}
+        for row in rows:
+            status = row["status"] or "expired"
+            counts[status] = counts.get(status, 0) + 1
+        finished = len(rows) - counts["pending"] - counts["processing"]
+        progress = {
+            "batchId": batch_id, "source": batch["source"], "createdAt": batch["created_at"],
+            "ingesting": bool(batch["ingesting"]), "total": len(rows), "counts": counts,
+            "progress": round(finished / len(rows), 4) if rows else 0.0,
+            "done": not batch["ingesting"] and finished == len(rows),
+            "rejected": json.loads(batch["rejected"]),
+        }
+        if include_tasks:
+            progress["tasks"] = [{"task_id": row["task_id"], "fileName": row["file_name"], "status": row["status"] or "expired"} for row in rows]
+        return progress
@@ -0,0 +1,466 @@
+# backend/utils/upload_ingest.py
+import hashlib
+import json
+import os
+import struct
+import tarfile
+import time
+import zipfile
+
+from python_multipart.multipart import MultipartParser, parse_options_header
+
+from utils.db import SQLiteDatabase
+
+PROBE_HEAD_BYTES = 64 * 1024 # header bytes buffered before the first probe attempt
+MAX_PROBE_HEAD_BYTES = 4 * 1024 * 1024 # e.g. MP3s with large ID3 cover art
+MIN_SAMPLE_RATE, MAX_SAMPLE_RATE = 8000, 192000
+MAX_CHANNELS = 8
+
+
+class UploadRejected(Exception):
+    def __init__(self, status_code, detail):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+class _NeedMore(Exception):
+    pass
+
+
+# --- Header probing ---
+# Each prober takes the buffered head and returns {"format", "sampleRate", "channels", ...};
+# raises _NeedMore when the head is too short to decide and ValueError when it isn't that format.
+def _id3_size(head):
+    if head[:3] != b"ID3": return 0
+    if len(head) < 10: raise _NeedMore()
+    size = (head[6] & 0x7F) << 21 | (head[7] & 0x7F) << 14 | (head[8] & 0x7F) << 7 | (head[9] & 0x7F)
+    return 10 + size + (10 if head[5] & 0x10 else 0)
+
+
+def _probe_wav(head):
+    if len(head) < 12: raise _NeedMore()
+    if head[:4] not in (b"RIFF", b"RF64") or head[8:12] != b"WAVE": raise ValueError("not RIFF/WAVE")
+    pos, fmt = 12, None
+    while pos + 8 <= len(head):
+        chunk_id, size = head[pos:pos + 4], struct.unpack_from("<I", head, pos + 4)[0]
+        if chunk_id == b"fmt ":
+            if pos + 24 > len(head): raise _NeedMore()
+            _, channels, sample_rate, byte_rate, _, bits = struct.unpack_from("<HHIIHH", head, pos + 8)
+            fmt = {"format": "wav", "sampleRate": sample_rate, "channels": channels, "bitsPerSample": bits, "byteRate": byte_rate}
+        elif chunk_id == b"data":
+            if fmt is None: raise ValueError("WAV data chunk before fmt chunk")
+            # 0xFFFFFFFF / 0 mark streamed or RF64 files whose length lives elsewhere
+            if size not in (0, 0xFFFFFFFF) and fmt["byteRate"]:
+                fmt["durationS"] = round(size / fmt["byteRate"], 3)
+            fmt["dataOffset"] = pos + 8
+            return fmt
+        pos += 8 + size + (size & 1)
+    raise _NeedMore()
+
+
+def _probe_flac(head):
+    offset = _id3_size(head)
+    if len(head) < offset + 26: raise _NeedMore()
+    if head[offset:offset + 4] != b"fLaC" or head[offset + 4] & 0x7F != 0: raise ValueError("not FLAC")
+    info = int.from_bytes(head[offset + 18:offset + 26], "big")
+    sample_rate, total_samples = info >> 44, info & ((1 << 36) - 1)
+    probe = {"format": "flac", "sampleRate": sample_rate, "channels": ((info >> 41) & 0x7) + 1,
+             "bitsPerSample": ((info >> 36) & 0x1F) + 1}
+    if sample_rate and total_samples: probe["durationS"] = round(total_samples / sample_rate, 3)
+    return probe
+
+
+def _probe_ogg(head):
+    if len(head) < 27: raise _NeedMore()
+    if head[:4] != b"OggS": raise ValueError("not Ogg")
+    packet_start = 27 + head[26]
+    if len(head) < packet_start + 19: raise _NeedMore()
+    packet = head[packet_start:]
+    if packet[:7] == b"\x01vorbis":
+        return {"format": "ogg", "codec": "vorbis", "channels": packet[11], "sampleRate": struct.unpack_from("<I", packet, 12)[0]}
+    if packet[:8] == b"OpusHead":
+        # Opus always decodes at 48 kHz; the input rate is informational only
+        return {"format": "ogg", "codec": "opus", "channels": packet[9], "sampleRate": 48000}
+    if packet[:5] == b"\x7fFLAC":
+        return {"format": "ogg", "codec": "flac", "channels": None, "sampleRate": None}
+    raise ValueError("unsupported Ogg codec")
+
+
+MP3_SAMPLE_RATES = {3: (44100, 48000, 32000), 2: (22050, 24000, 16000), 0: (11025, 12000, 8000)}
+MP3_BITRATES_KBPS = {
+    3: (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320), # MPEG-1 Layer III
+    2: (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160), # MPEG-2/2.5 Layer III
+}
+ADTS_SAMPLE_RATES = (96000, 88200, 64000, 48000, 44100, 32000, 24000, 22050, 16000, 12000, 11025, 8000, 7350)
+
+
+def _mpeg_frame(head, pos):
+    # (probe, frame length, fields every frame of the stream repeats) for an MP3/ADTS frame header at pos, or None
+    b0, b1, b2, b3 = head[pos:pos + 4]
+    if b0 != 0xFF: return None
+    if b1 & 0xF6 == 0xF0: # ADTS
+        rate_index = (b2 >> 2) & 0xF
+        if rate_index >= len(ADTS_SAMPLE_RATES): return None
+        if len(head) < pos + 6: raise _NeedMore()
+        frame_length = ((b3 & 0x3) << 11) | (head[pos + 4] << 3) | (head[pos + 5] >> 5)
+        if frame_length < 7: return None
+        probe = {"format": "aac", "sampleRate": ADTS_SAMPLE_RATES[rate_index], "channels": ((b2 & 1) << 2) | (b3 >> 6)}
+        return probe, frame_length, (b1 & 0xF6, rate_index)
+    version, layer = (b1 >> 3) & 0x3, (b1 >> 1) & 0x3
+    bitrate_index, rate_index = b2 >> 4, (b2 >> 2) & 0x3
+    if b1 & 0xE0 != 0xE0 or version == 1 or layer != 1 or bitrate_index in (0, 15) or rate_index == 3: return None
+    bitrate = MP3_BITRATES_KBPS[3 if version == 3 else 2][bitrate_index] * 1000
+    sample_rate = MP3_SAMPLE_RATES[version][rate_index]
+    frame_length = (144 if version == 3 else 72) * bitrate // sample_rate + ((b2 >> 1) & 1)
+    probe = {"format": "mp3", "sampleRate": sample_rate, "channels": 1 if b3 >> 6 == 3 else 2, "bitrate": bitrate, "dataOffset": pos}
+    return probe, frame_length, (version, layer, rate_index)
+
+
+def _probe_mpeg(head):
+    # MP3 (Layer III) or raw AAC (ADTS): first frame header after an optional ID3v2 tag that is followed by a
+    # matching header where its frame ends (a lone sync pattern turns up in arbitrary binary data all the time)
+    offset = _id3_size(head)
+    if len(head) < offset + 4: raise _NeedMore()
+    for pos in range(offset, min(len(head) - 3, offset + 4096)):
+        frame = _mpeg_frame(head, pos)
+        if frame is None: continue
+        probe, frame_length, fields = frame
+        following = pos + frame_length
+        if len(head) < following + 6: raise _NeedMore()
+        second = _mpeg_frame(head, following)
+        if second is None or second[2] != fields: continue
+        return probe
+    if len(head) < offset + 4096: raise _NeedMore()
+    raise ValueError("no MPEG audio frame found")
+
+
+def _probe_mp4(head):
+    if len(head) < 12: raise _NeedMore()
+    if head[4:8] != b"ftyp": raise ValueError("not MP4")
+    probe = {"format": "mp4", "sampleRate": None, "channels": None}
+    # With the moov box up front (faststart), the audio track's mdhd timescale is its sample rate
+    pos = head.find(b"mdhd")
+    # version 1 boxes carry 64-bit creation/modification times and duration
+    if pos != -1 and len(head) >= pos + (36 if head[pos + 4] == 1 else 24):
+        if head[pos + 4] == 1:
+            timescale, duration = struct.unpack_from(">IQ", head, pos + 24)
+        else:
+            timescale, duration = struct.unpack_from(">II", head, pos + 16)
+        if timescale:
+            probe["sampleRate"] = timescale
+            probe["durationS"] = round(duration / timescale, 3)
+    return probe
+
+
+PROBERS = (_probe_wav, _probe_flac, _probe_ogg, _probe_mp4, _probe_mpeg)
+
+
+def probe_audio_header(head, complete=False):
+    """Identifies the container/codec of an upload from its first bytes.
+
+    Returns the probe dict, or None if more bytes are needed (only when `complete` is False).
+    Raises UploadRejected for content that isn't a supported audio format.
+    """
+    need_more = False
+    for prober in PROBERS:
+        try:
+            return prober(head)
+        except _NeedMore:
+            need_more = True
+        except (ValueError, struct.error, IndexError, KeyError):
+            continue
+    if need_more and not complete: return None
+    raise UploadRejected(415, "File content is not a supported audio format (WAV, FLAC, OGG, MP3, M4A/AAC).")
+
+
+def validate_probe(probe, total_bytes=None, max_duration_s=None):
+    """Fills in size-based duration estimates and rejects implausible or too long audio."""
+    if probe.get("durationS") is None and total_bytes and probe.get("bitrate"):
+        # CBR estimate; VBR files come out approximate, which is enough for a limit check
+        probe["durationS"] = round((total_bytes - probe.get("dataOffset", 0)) * 8 / probe["bitrate"], 3)
+        probe["durationEstimated"] = True
+    sample_rate, channels, duration = probe.get("sampleRate"), probe.get("channels"), probe.get("durationS")
+    if sample_rate is not None and not MIN_SAMPLE_RATE <= sample_rate <= MAX_SAMPLE_RATE:
+        raise UploadRejected(415, f"Unsupported sample rate {sample_rate} Hz.")
+    if channels is not None and not 1 <= channels <= MAX_CHANNELS:
+        raise UploadRejected(415, f"Unsupported channel count {channels}.")
+    if duration is not None and duration <= 0:
+        raise UploadRejected(422, "Audio file contains no samples.")
+    if duration is not None and max_duration_s and duration > max_duration_s:
+        raise UploadRejected(413, f"Audio is {duration / 60:.1f} minutes long; the limit is {max_duration_s / 60:.1f} minutes.")
+    return probe
+
+
+# --- Streaming writer ---
+class StreamingUpload:
+    """Writes an upload chunk by chunk to `<path>.part`, hashing and probing as bytes arrive.
+
+    Oversized or non-audio content raises UploadRejected as soon as it is detected, before the
+    rest of the body is written; finish() renames the file into place. With `resume`, an
+    existing .part file is picked up (rehashed once) so chunked uploads can continue after a restart.
+    """
+
+    def __init__(self, path, max_bytes, max_duration_s=None, expected_bytes=None, resume=False):
+        self.path = path
+        self.part_path = path + ".part"
+        self.max_bytes = max_bytes
+        self.max_duration_s = max_duration_s
+        self.expected_bytes = expected_bytes
+        self.hasher = hashlib.sha256()
+        self.received = 0
+        self.head = bytearray()
+        self.probe = None
+        if resume and os.path.exists(self.part_path):
+            with open(self.part_path, "rb") as f:
+                while chunk := f.read(1024 * 1024):
+                    self._account(chunk)
+            self._file = open(self.part_path, "ab")
+        else:
+            self._file = open(self.part_path, "wb")
+
+    def _account(self, chunk):
+        self.hasher.update(chunk)
+        self.received += len(chunk)
+        if self.probe is None and len(self.head) < MAX_PROBE_HEAD_BYTES:
+            self.head += chunk[:MAX_PROBE_HEAD_BYTES - len(self.head)]
+
+    def _try_probe(self, complete=False):
+        if self.probe is not None: return
+        if not complete and len(self.head) < PROBE_HEAD_BYTES: return
+        probe = probe_audio_header(bytes(self.head), complete=complete or len(self.head) >= MAX_PROBE_HEAD_BYTES)
+        if probe is None: return
+        self.probe = validate_probe(probe, self.expected_bytes, self.max_duration_s)
+        self.head = bytearray()
+
+    def write(self, chunk):
+        if self.received + len(chunk) > self.max_bytes:
+            raise UploadRejected(413, f"File exceeds the {self.max_bytes // (1024 * 1024)} MB upload limit.")
+        if self.expected_bytes is not None and self.received + len(chunk) > self.expected_bytes:
+            raise UploadRejected(400, "More data than the declared upload size.")
+        self._account(chunk)
+        self._try_probe()
+        self._file.write(chunk)
+
+    def finish(self):
+        """Completes the upload; returns {"bytes", "sha256", "audio"}."""
+        if self.expected_bytes is not None and self.received != self.expected_bytes:
+            raise UploadRejected(400, f"Upload incomplete: {self.received} of {self.expected_bytes} bytes received.")
+        if self.received == 0: raise UploadRejected(400, "Empty upload.")
+        self._try_probe(complete=True)
+        if self.probe.get("durationEstimated"): del self.probe["durationS"] # re-estimate from the actual size
+        if self.probe.get("durationS") is None:
+            self.probe = validate_probe(self.probe, self.received, self.max_duration_s)
+        self._file.close()
+        os.replace(self.part_path, self.path)
+        return {"bytes": self.received, "sha256": self.hasher.hexdigest(), "audio": self.audio}
+
+    @property
+    def audio(self):
+        # Probe result without the parser's internal offsets; None until the header has been probed
+        if self.probe is None: return None
+        return {k: v for k, v in self.probe.items() if k not in ("dataOffset", "byteRate")}
+
+    def flush(self):
+        if not self._file.closed: self._file.flush()
+
+    def close(self):
+        if not self._file.closed: self._file.close()
+
+    def abort(self):
+        self.close()
+        if os.path.exists(self.part_path): os.remove(self.part_path)
+
+
+# --- Multipart bodies ---
+class MultipartFileReceiver:
+    """Streams the `field` file of a multipart/form-data body into a writer as the body arrives.
+
+    `open_writer(filename)` is called once that part's headers are in and returns what its bytes
+    are written to (e.g. a StreamingUpload), so size limits and probing apply from the first chunk
+    instead of after the whole body was spooled. Other fields are ignored.
+
+    With `on_file_end(writer)`, every file part of `field` is received the same way (bulk uploads)
+    and the callback runs as each one ends. A part whose open_writer returns None is skipped; one
+    whose open_writer, writes or on_file_end raise UploadRejected is aborted and listed in
+    `rejected` as {"file", "error"}, and the rest of the body is still read.
+    """
+
+    def __init__(self, content_type, open_writer, field="file", on_file_end=None):
+        mime, options = parse_options_header(content_type or "")
+        if mime != b"multipart/form-data" or not options.get(b"boundary"):
+            raise UploadRejected(400, "Expected a multipart/form-data body with a file field.")
+        self.field = field.encode("latin-1")
+        self.open_writer = open_writer
+        self.on_file_end = on_file_end
+        self.writer = None
+        self.writers = []
+        self.rejected = []
+        self._filename = None
+        self._headers, self._header_field, self._header_value, self._active = {}, b"", b"", False
+        self._parser = MultipartParser(options[b"boundary"], {
+            "on_part_begin": self._on_part_begin,
+            "on_header_field": lambda data, start, end: self._append_header("_header_field", data[start:end]),
+            "on_header_value": lambda data, start, end: self._append_header("_header_value", data[start:end]),
+            "on_header_end": self._on_header_end,
+            "on_headers_finished": self._on_headers_finished,
+            "on_part_data": self._on_part_data,
+            "on_part_end": self._on_part_end,
+        })
+
+    def _append_header(self, name, data):
+        setattr(self, name, getattr(self, name) + data)
+
+    def _on_part_begin(self):
+        self._headers, self._active = {}, False
+
+    def _on_header_end(self):
+        self._headers[self._header_field.lower()] = self._header_value
+        self._header_field, self._header_value = b"", b""
+
+    def _on_headers_finished(self):
+        _, options = parse_options_header(self._headers.get(b"content-disposition", b""))
+        if options.get(b"name") != self.field or b"filename" not in options: return
+        if self.on_file_end is None and self.writer is not None: return
+        self._filename = options[b"filename"].decode("utf-8", "replace")
+        writer = self._guarded(self.open_writer, self._filename)
+        if writer is None: return
+        self.writer = self.writer or writer
+        self.writers.append(writer)
+        self._active = True
+
+    def _on_part_data(self, data, start, end):
+        if self._active: self._guarded(self.writers[-1].write, data[start:end])
+
+    def _on_part_end(self):
+        if self._active and self.on_file_end: self._guarded(self.on_file_end, self.writers[-1])
+        self._active = False
+
+    def _guarded(self, fn, *args):
+        # Single-file bodies fail as a whole; in bulk mode only the current part is dropped
+        try:
+            return fn(*args)
+        except UploadRejected as e:
+            if self.on_file_end is None: raise
+            if self._active:
+                abort = getattr(self.writers[-1], "abort", None)
+                if abort: abort()
+                self.writers.pop()
+            self._active = False
+            self.rejected.append({"file": self._filename, "error": e.detail})
+
+    def feed(self, chunk):
+        self._parser.write(chunk)
+
+    def finish(self):
+        """Returns the writer of the file field (all of them with on_file_end); raises UploadRejected
+        if the body had none."""
+        self._parser.finalize()
+        if self.writer is None and not self.rejected:
+            raise UploadRejected(400, f"The form data has no '{self.field.decode()}' file field.")
+        return self.writers if self.on_file_end else self.writer
+
+
+# --- Archives ---
+ARCHIVE_SUFFIXES = (".zip", ".tar", ".tar.gz", ".tgz", ".tar.bz2", ".tar.xz")
+
+
+def is_archive(filename):
+    return filename.lower().endswith(ARCHIVE_SUFFIXES)
+
+
+def iter_archive_members(fileobj, filename):
+    """Yields (member name, readable stream) for the regular files in a zip or tar archive.
+
+    Members are decompressed as they are read; tar archives are read strictly sequentially
+    ("r|*"), so each stream must be consumed before advancing to the next member.
+    Hidden files and macOS resource forks are skipped.
+    """
+    def wanted(name):
+        parts = name.replace("\\", "/").split("/")
+        return not any(part.startswith(".") or part == "__MACOSX" for part in parts)
+
+    if filename.lower().endswith(".zip"):
+        with zipfile.ZipFile(fileobj) as archive:
+            for info in archive.infolist():
+                if info.is_dir() or not wanted(info.filename): continue
+                with archive.open(info) as member:
+                    yield info.filename, member
+    else:
+        with tarfile.open(fileobj=fileobj, mode="r|*") as archive:
+            for info in archive:
+                if not info.isfile() or not wanted(info.name): continue
+                member = archive.extractfile(info)
+                yield info.name, member
+
+
+# --- Resumable upload sessions ---
+UPLOAD_SESSION_SCHEMA = """
+CREATE TABLE IF NOT EXISTS upload_sessions (
+    upload_id TEXT PRIMARY KEY, -- becomes the task id once the upload completes
+    file_name TEXT NOT NULL,
+    extension TEXT NOT NULL,
+    expected_bytes INTEGER, -- declared total size, if known
+    options TEXT NOT NULL, -- JSON, e.g. {"priority": "interactive"}
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_upload_sessions_updated ON upload_sessions(updated_at);
+"""
+
+
+class UploadSessionStore:
+    """Metadata of in-progress chunked uploads, shared by every API process.
+
+    The received offset is the size of the session's .part file, so it never disagrees with
+    what is actually on disk.
+    """
+
+    def __init__(self, db_path):
+        self.db = SQLiteDatabase(db_path, UPLOAD_SESSION_SCHEMA)
+
+    def create(self, upload_id, file_name, extension, expected_bytes=None, options=None):
+        now = time.time()
+        self.db.execute(
+            "INSERT INTO upload_sessions (upload_id, file_name, extension, expected_bytes, options, created_at, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)", (upload_id, file_name, extension, expected_bytes, json.dumps(options or {}), now, now),
+        )
+
+    def get(self, upload_id):
+        row = self.db.query_one("SELECT * FROM upload_sessions WHERE upload_id = ?", (upload_id,))
+        if not row: return None
+        session = dict(row)
+        session["options"] = json.loads(session["options"])
+        return session
+
+    def touch(self, upload_id):
+        self.db.execute("UPDATE upload_sessions SET updated_at = ? WHERE upload_id = ?", (time.time(), upload_id))
+
+    def delete(self, upload_id):
+        return self.db.execute("DELETE FROM upload_sessions WHERE upload_id = ?", (upload_id,)).rowcount > 0
+
+    def stale(self, max_idle_s):
+        rows = self.db.query("SELECT upload_id, extension FROM upload_sessions WHERE updated_at < ?", (time.time() - max_idle_s,))
+        return [dict(row) for row in rows]
+
+
+class UploadSizeLimitMiddleware:
+    """ASGI middleware answering 413 for upload requests whose Content-Length is over the limit,
+    before any of the body is read. Bodies without a Content-Length are capped by their endpoint."""
+
+    def __init__(self, app, max_bytes, paths=("/upload",)):
+        self.app = app
+        self.max_bytes = max_bytes
+        self.paths = frozenset(path.rstrip("/") for path in paths)
+
+    async def __call__(self, scope, receive, send):
+        # Exact paths: "/upload" must not also cover "/uploads/..." (resumable chunks have their own checks)
+        if scope["type"] == "http" and scope["path"].rstrip("/") in self.paths:
+            length = dict(scope["headers"]).get(b"content-length")
+            if length and length.isdigit() and int(length) > self.max_bytes:
+                body = json.dumps({"detail": f"Request exceeds the {self.max_bytes // (1024 * 1024)} MB upload limit."}).encode()
+                await send({"type": "http.response.start", "status": 413,
+                            "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())]})
+                await send({"type": "http.response.body", "body": body})
+                return
+        await self.app(scope, receive, send)
@@ -0,0 +1,121 @@
+# backend/utils/vad.py
+from bisect import bisect_left, bisect_right
+
+import numpy as np
+
+SPEECH_BAND_HZ = (300, 3400)
+FRAME_BLOCK = 4096 # frames per FFT block, keeps the spectra of a multi-hour call from being held at once
+STEP_CAP_DB = 10.0 # largest frame-to-frame energy change counted towards modulation
+
+
+def _frame_features(audio, sr, frame_s):
+    """Per-frame log energy (dBFS), share of energy in the speech band and spectral flatness."""
+    frame = max(1, int(sr * frame_s))
+    count = len(audio) // frame
+    frames = audio[:count * frame].reshape(count, frame)
+    window = np.hanning(frame).astype(np.float32)
+    freqs = np.fft.rfftfreq(frame, 1 / sr)
+    band = (freqs >= SPEECH_BAND_HZ[0]) & (freqs <= SPEECH_BAND_HZ[1])
+    energy_db = np.empty(count, dtype=np.float32)
+    band_ratio = np.empty(count, dtype=np.float32)
+    flatness = np.empty(count, dtype=np.float32)
+    for lo in range(0, count, FRAME_BLOCK):
+        block = frames[lo:lo + FRAME_BLOCK]
+        energy_db[lo:lo + len(block)] = 10 * np.log10(np.mean(np.square(block, dtype=np.float32), axis=1) + 1e-10)
+        power = np.square(np.abs(np.fft.rfft(block * window, axis=1))) + 1e-12
+        total = power.sum(axis=1)
+        band_ratio[lo:lo + len(block)] = power[:, band].sum(axis=1) / total
+        flatness[lo:lo + len(block)] = np.exp(np.mean(np.log(power), axis=1)) / (total / power.shape[1])
+    return energy_db, band_ratio, flatness
+
+
+def _energy_flux(energy_db, width, cap_db):
+    # Mean frame-to-frame energy change over a centered window of `width` frames, each change capped
+    # at cap_db so a single on/off edge (a gated tone) can't pass for the constant rise and fall of syllables
+    steps = np.minimum(np.abs(np.diff(energy_db.astype(np.float64), prepend=float(energy_db[0]))), cap_db)
+    half = width // 2
+    sums = np.concatenate(([0.0], np.cumsum(np.pad(steps, (half, width - half - 1), mode="edge"))))
+    return (sums[width:] - sums[:-width]) / width
+
+
+def _noise_floor_db(energy_db, width, max_floor_db):
+    # Quietest frame of each `width`-frame block, 10th percentile over the blocks: one short pause
+    # per block is enough to reach the background level, even when the call is almost all speech.
+    # Calls with no pauses at all can't pull the floor above max_floor_db.
+    width = max(1, min(width, len(energy_db)))
+    blocks = len(energy_db) // width
+    minima = energy_db[:blocks * width].reshape(blocks, width).min(axis=1)
+    return min(float(np.percentile(minima, 10)), max_floor_db)
+
+
+def detect_speech_regions(audio, sr, frame_s=0.02, energy_margin_db=12.0, min_energy_db=-55.0, max_noise_floor_db=-45.0,
+                          noise_window_s=1.5, min_band_ratio=0.4, max_flatness=0.5, min_modulation_db=1.0,
+                          min_speech_s=0.25, min_silence_s=0.5, pad_s=0.2):
+    """Speech regions of a mono buffer as sorted, non-overlapping (start_sample, end_sample).
+
+    A frame counts as speech when it is `energy_margin_db` above the call's noise floor (10th
+    percentile of the quietest frame in each `noise_window_s` block, at most `max_noise_floor_db`)
+    and above `min_energy_db`, has at least `min_band_ratio` of its energy in the 300-3400 Hz band
+    (rejects hum and rumble), is not noise-like (spectral flatness <= max_flatness) and its energy changes by `min_modulation_db` per frame on average over the
+    surrounding second, which steady tones, hiss and most hold music don't. Speech runs closer than
+    `min_silence_s` are joined, runs shorter than `min_speech_s` dropped and the rest padded by `pad_s`.
+    """
+    frame = max(1, int(sr * frame_s))
+    if len(audio) < frame: return []
+    energy_db, band_ratio, flatness = _frame_features(np.asarray(audio, dtype=np.float32), sr, frame_s)
+    noise_floor = _noise_floor_db(energy_db, int(round(noise_window_s / frame_s)), max_noise_floor_db)
+    threshold = max(noise_floor + energy_margin_db, min_energy_db)
+    modulation = _energy_flux(energy_db, max(1, int(round(1.0 / frame_s))), STEP_CAP_DB)
+    active = (energy_db > threshold) & (band_ratio >= min_band_ratio) & (flatness <= max_flatness) & (modulation >= min_modulation_db)
+
+    # Runs of active frames as [start, end) frame indices
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], active.astype(np.int8), [0]))))
+    runs = edges.reshape(-1, 2).tolist()
+    min_gap, min_run, pad = min_silence_s / frame_s, min_speech_s / frame_s, int(round(pad_s * sr))
+    joined = []
+    for start, end in runs:
+        if joined and start - joined[-1][1] < min_gap: joined[-1][1] = end
+        else: joined.append([start, end])
+    regions = []
+    for start, end in joined:
+        if end - start < min_run: continue
+        start, end = max(0, start * frame - pad), min(len(audio), end * frame + pad)
+        if regions and start <= regions[-1][1]: regions[-1] = (regions[-1][0], end)
+        else: regions.append((start, end))
+    return regions
+
+
+def clip_regions(regions, start, end):
+    """The parts of `regions` inside [start, end)."""
+    clipped = []
+    for region_start, region_end in regions[max(0, bisect_right(regions, (start, float("inf"))) - 1):]:
+        if region_start >= end: break
+        if region_end > start: clipped.append((max(region_start, start), min(region_end, end)))
+    return clipped
+
+
+class SpeechTimeMap:
+    """Concatenates speech regions into one compact buffer and maps its times back to the original timeline."""
+
+    def __init__(self, regions, sr):
+        self.regions = regions
+        self.sr = sr
+        self._compact_starts, total = [], 0
+        for start, end in regions:
+            self._compact_starts.append(total)
+            total += end - start
+        self.samples = total
+
+    def gather(self, audio):
+        if len(self.regions) == 1: return audio[self.regions[0][0]:self.regions[0][1]] # a view, no copy
+        if not self.regions: return audio[:0]
+        return np.concatenate([audio[start:end] for start, end in self.regions])
+
+    def to_original(self, t, end=False):
+        """Original time of compact time t (seconds). With end=True, a time on a join maps to the
+        end of the earlier region instead of the start of the later one."""
+        if not self.regions: return t
+        sample = t * self.sr
+        find = bisect_left if end else bisect_right
+        i = min(max(0, find(self._compact_starts, sample) - 1), len(self.regions) - 1)
+        return (self.regions[i][0] + sample - self._compact_starts[i]) / self.sr
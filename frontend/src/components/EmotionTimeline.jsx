@@ -16,6 +16,7 @@ const getEmotionColorClass = (emotion) => {
         case 'neutral': return 'bg-emotion-neutral text-black';
         case 'other': return 'bg-emotion-other text-black';
         case 'unknown': return 'bg-emotion-unknown text-gray-600';
+        case 'no speech': return 'bg-emotion-unknown text-gray-600'; // silence / hold music, not scored
         case 'oom error': return 'bg-emotion-oom-error text-red-700'; // Example for error
         default: return 'bg-gray-300 text-black'; // Fallback
     }
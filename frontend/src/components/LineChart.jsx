@@ -25,7 +25,7 @@ const emotionToLevel = (emotion) => {
     Sad: 1,
     Angry: 0,
   };
-  return map[emotion] ?? 0;
+  return map[emotion] ?? null; // "No Speech", "Unknown", errors: not an emotion level
 };
 
 // Helper: reverse map for Y-axis ticks
@@ -59,7 +59,8 @@ function EmotionLineGraph({ speechEmotionTimeline }) {
   const speakers = [...new Set(sortedTimeline.map(item => item.speaker))];
 
   const datasets = speakers.map(speaker => {
-    const speakerData = sortedTimeline.filter(item => item.speaker === speaker);
+    // Turns without a plottable emotion (silence, hold music, failed inference) are left out instead of showing as Angry
+    const speakerData = sortedTimeline.filter(item => item.speaker === speaker && emotionToLevel(item.emotion) !== null);
 
     return {
       label: speaker,